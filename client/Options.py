@@ -20,6 +20,7 @@ import getopt
 broc_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
 sys.path.insert(0, broc_dir)
 from util import Log
+from util import Function
 
 def Help(bin_name, subcommand=None):
     """
@@ -40,6 +41,8 @@ def Help(bin_name, subcommand=None):
         Log.colorprint("DEFAULT", "    test       : Build and runs the specified targets",
                 False)
         Log.colorprint("DEFAULT", "    show-deps  : Print the dependency graph", False)
+        Log.colorprint("DEFAULT", "    stats      : Print the slowest objects and targets of recent builds",
+                False)
         Log.colorprint("DEFAULT", "    clean      : Remove output files", False)
         Log.colorprint("DEFAULT", "    scratch    : Create a BROC template", False)
         Log.colorprint("DEFAULT", "    version    : Display the version", False)
@@ -58,9 +61,48 @@ def Help(bin_name, subcommand=None):
             "\t--mode=[release|debug]  : Set build mode, default mode is debug",
             False)
         Log.colorprint("DEFAULT",
-            "\t--jobs=num\t\t: Set the number of build threads",
+            "\t--jobs=num\t\t: Set the number of threads compiling source files",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--check-jobs=num\t: Set the number of threads checking build cache, default is %d"
+            % Function.CHECK_JOBS, False)
+        Log.colorprint("DEFAULT",
+            "\t--archive-jobs=num\t: Set the number of threads building static libraries, default is 2",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--link-jobs=num\t\t: Set the number of threads linking applications, default is 2",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--max-load=num\t\t: Start no new build task when load average is not less than num",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--max-mem=MB\t\t: Limit the memory of build tasks estimated by their last builds",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--hash=[md5|sha1|blake2b]: Set the hash method of file content, default is md5",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--objcache-dir=path\t: Set the directory of object cache, default is ~/.broc/objcache",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--objcache-size=MB\t: Enable object cache shared by workspaces with max size, default is 0(disabled)",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--remote-cache=url\t: Share build results by remote cache, like http://host:port",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--cache-engine=[pickle|sqlite]: Set the storage of build cache, default is pickle",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--header-scan=[builtin|compiler]: Set the way calculating header files, default is builtin",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--deps-format=[text|json|dot|none]: Set the format of .BROC.FILE.DEPS, default is text, none on CI",
             False)
         Log.colorprint("DEFAULT", "\t --all-log\t\t: Show all build log infomation", False)
+        Log.colorprint("DEFAULT",
+            "\t--keep-going\t\t: Build all targets not depending on failed ones after failure",
+            False)
         return 0
 
     if subcommand == "show-deps":
@@ -68,6 +110,18 @@ def Help(bin_name, subcommand=None):
         Log.colorprint("DEFAULT", "Usage: %s %s <path>" % (bin_name, subcommand), False)
         return 0
 
+    if subcommand == "stats":
+        Log.colorprint("DEFAULT", "stats: Print the slowest objects and targets of recent builds", False)
+        Log.colorprint("DEFAULT", "Usage: %s %s [option] <path>" % (bin_name, subcommand), False)
+        Log.colorprint("DEFAULT", "Valid options:", False)
+        Log.colorprint("DEFAULT",
+            "\t--builds=num\t\t: Set the number of recent builds, default is 10",
+            False)
+        Log.colorprint("DEFAULT",
+            "\t--top=num\t\t: Set the number of slowest objects and targets, default is 20",
+            False)
+        return 0
+
     if subcommand == "clean":
         Log.colorprint("DEFAULT", "clean: Remove output files", False)
         Log.colorprint("DEFAULT", "Usage: %s clean" % (bin_name), False)
@@ -92,27 +146,66 @@ def Help(bin_name, subcommand=None):
     return 0
 
 
-def OptionBuild(argv):
+def OptionBuild(argv, subcommand=None):
     """
     Get build or test options.
     Args:
         argv : command line argv
+        subcommand : the subcommand of broc, --builds and --top are only valid for stats
     Return:
         None : fail
         options : build or test options
         options["all_log"] : show all build log
+        options["keep_going"] : build all targets not depending on failed ones after failure
         options["mode"] : debug or release
         options["path"] : modular path
-        options["jobs"] : the number of build threads
+        options["jobs"] : the number of threads compiling source files
+        options["archive_jobs"] : the number of threads building static libraries
+        options["link_jobs"] : the number of threads linking applications
+        options["check_jobs"] : the number of threads checking build cache
+        options["max_load"] : no new build task starts when load average is not less than it, 0 means no limit
+        options["max_mem"] : the max memory(MB) of running build tasks, 0 means no limit
+        options["hash"] : the hash method of file content
+        options["objcache_dir"] : the directory of object cache
+        options["objcache_size"] : the max size(MB) of object cache, 0 means disabling object cache
+        options["remote_cache"] : the url of remote cache, None means no remote cache
+        options["cache_engine"] : the storage of build cache, pickle or sqlite
+        options["header_scan"] : the way calculating header files, builtin or compiler
+        options["deps_format"] : the format of dependency relation file, none means not saving it
+        options["builds"] : the number of recent builds shown by stats
+        options["top"] : the number of slowest objects and targets shown by stats
     """
     options = dict()
     options["all_log"] = False
+    options["keep_going"] = False
     options["path"] = ""
     options["mode"] = "debug"
     options["jobs"] = 4
+    options["check_jobs"] = Function.CHECK_JOBS
+    options["archive_jobs"] = 2
+    options["link_jobs"] = 2
+    options["max_load"] = 0
+    options["max_mem"] = 0
+    options["hash"] = "MD5"
+    options["objcache_dir"] = os.path.join(os.path.expanduser('~'), '.broc', 'objcache')
+    options["objcache_size"] = 0
+    options["remote_cache"] = None
+    options["cache_engine"] = "pickle"
+    options["header_scan"] = "builtin"
+    # dependency relation file is useless on CI
+    options["deps_format"] = "none" if os.environ.get("CI") else "text"
+    options["builds"] = 10
+    options["top"] = 20
 
     try:
-        opts, args = getopt.gnu_getopt(argv, "", ["all-log", "mode=", "jobs="])
+        opts, args = getopt.gnu_getopt(argv, "", ["all-log", "mode=", "jobs=", "check-jobs=", "hash=",
+                                                  "keep-going",
+                                                  "archive-jobs=", "link-jobs=",
+                                                  "max-load=", "max-mem=",
+                                                  "objcache-dir=", "objcache-size=",
+                                                  "remote-cache=", "cache-engine=",
+                                                  "header-scan=", "deps-format=",
+                                                  "builds=", "top="])
     except getopt.GetoptError as ex:
         Log.colorprint("DEFAULT", "%s\nType '%s help' for usage" % \
                 (str(ex), os.path.basename(sys.argv[0])), False)
@@ -131,6 +224,9 @@ def OptionBuild(argv):
         if opt == "--all-log":
             options["all_log"] = True
             continue
+        if opt == "--keep-going":
+            options["keep_going"] = True
+            continue
         if opt == "--mode":
             if arg != "debug" and arg != "release":
                 Log.colorprint("RED", "invalid mode %s. Please use debug or release" % arg, False)
@@ -140,6 +236,69 @@ def OptionBuild(argv):
         if opt == "--jobs":
             options["jobs"] = int(arg)
             continue
+        if opt == "--check-jobs":
+            options["check_jobs"] = int(arg)
+            continue
+        if opt == "--archive-jobs":
+            options["archive_jobs"] = int(arg)
+            continue
+        if opt == "--link-jobs":
+            options["link_jobs"] = int(arg)
+            continue
+        if opt == "--max-load":
+            try:
+                options["max_load"] = float(arg)
+            except ValueError:
+                Log.colorprint("RED", "invalid max load %s. Please use a number" % arg, False)
+                return None
+            continue
+        if opt == "--max-mem":
+            try:
+                options["max_mem"] = int(arg)
+            except ValueError:
+                Log.colorprint("RED", "invalid max mem %s. Please use MB" % arg, False)
+                return None
+            continue
+        if opt == "--hash":
+            options["hash"] = arg.upper()
+            continue
+        if opt == "--objcache-dir":
+            options["objcache_dir"] = os.path.abspath(arg)
+            continue
+        if opt == "--objcache-size":
+            options["objcache_size"] = int(arg)
+            continue
+        if opt == "--remote-cache":
+            options["remote_cache"] = arg
+            continue
+        if opt == "--cache-engine":
+            if arg != "pickle" and arg != "sqlite":
+                Log.colorprint("RED", "invalid cache engine %s. Please use pickle or sqlite" % arg, False)
+                return None
+            options["cache_engine"] = arg
+            continue
+        if opt == "--header-scan":
+            if arg != "builtin" and arg != "compiler":
+                Log.colorprint("RED", "invalid header scan %s. Please use builtin or compiler" % arg, False)
+                return None
+            options["header_scan"] = arg
+            continue
+        if opt == "--deps-format":
+            if arg not in ["text", "json", "dot", "none"]:
+                Log.colorprint("RED", "invalid deps format %s. Please use text, json, dot or none" % arg,
+                               False)
+                return None
+            options["deps_format"] = arg
+            continue
+        if opt in ["--builds", "--top"] and subcommand != "stats":
+            Log.colorprint("RED", "option %s is only valid for stats" % opt, False)
+            return None
+        if opt == "--builds":
+            options["builds"] = int(arg)
+            continue
+        if opt == "--top":
+            options["top"] = int(arg)
+            continue
         return None
 
     return options
@@ -13,12 +13,16 @@ Date:    2015/10/26 10:50:06
 
 import os
 import sys
+import time
 import Queue
+import itertools
+import threading
 
 broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, broc_dir)
 
 import TaskWorker
+from util import Function
 from dependency import BrocObject
 
 class TaskMaster(object):
@@ -26,25 +30,65 @@ class TaskMaster(object):
     TaskMaster object is a thread object master
     dispatching build task
     """
-    def __init__(self, num, cache_master, changed_list, all_log, logger):
+    REPORT_INTERVAL = 5         # seconds between progress reports
+    ADMISSION_INTERVAL = 1      # seconds between checks of the task held back
+    # the pool of threads building BrocObject of each type, the others are built by compile pool
+    POOLS = {BrocObject.BrocObjectType.BROC_LIB : 'archive',
+             BrocObject.BrocObjectType.BROC_APP : 'link'}
+
+    def __init__(self, num, cache_master, changed_list, all_log, logger,
+                 object_cache=None, remote_cache=None, history=None, max_load=0, max_mem=0,
+                 archive_jobs=2, link_jobs=2, keep_going=False):
         """
         Args:
-            num : the number of build threads
+            num : the number of threads compiling source files
             cache_master : the BrocObjectMaster object
             changed_list : the changed file list of BrocObject
             all_log : show all build log
             logger : the Log.Log() object
+            object_cache : the ObjectCache.ObjectCache object, None means no object cache
+            remote_cache : the RemoteCache.RemoteCache object, None means no remote cache
+            history : the BuildHistory.BuildHistory object recording build tasks, None means no history
+            max_load : no new task starts when load average is not less than it, 0 means no limit
+            max_mem : the max memory(MB) of tasks running at the same time, estimated by the peak
+                      RSS recorded in history, 0 means no limit
+            archive_jobs : the number of threads building static libraries
+            link_jobs : the number of threads linking applications
+            keep_going : whether building the tasks not depending on failed tasks after failure
         """
         self._logger = logger
         self._cache_master = cache_master
         self._changed_list = changed_list 
-        self._queue = Queue.Queue()             # request queue
+        # request queue of each pool, the longest path first
+        self._queues = {'compile' : Queue.PriorityQueue(),
+                        'archive' : Queue.PriorityQueue(),
+                        'link' : Queue.PriorityQueue()}
         self._response_queue = Queue.Queue()    # response queue
         self._running = True
         self._workers = list()
         self._build_ok = True
-        for i in xrange(0, num):
-            self._workers.append(TaskWorker.TaskWorker(self, all_log, logger))
+        self._object_cache = object_cache
+        self._remote_cache = remote_cache
+        self._skipped = 0
+        self._history = history
+        self._durations = dict()                # {file path : seconds of last build}
+        self._report_time = 0                   # the time of last progress report
+        self._estimated = dict()                # {file path : estimated seconds to build}
+        self._priority = dict()                 # {file path : seconds of critical path}
+        self._sequence = itertools.count()      # FIFO order of tasks with the same priority
+        self._max_load = max_load
+        self._max_mem = max_mem * 1024          # in KB like peak RSS
+        self._memory = dict()                   # {file path : estimated peak RSS in KB}
+        self._admitted = dict()                 # {file path : estimated peak RSS} of running tasks
+        self._admission = threading.Condition()
+        self._held = 0                          # the number of tasks held back
+        self._keep_going = keep_going
+        self._failed = list()                   # the responses of failed tasks
+        self._blocked = 0                       # the number of tasks depending on failed tasks
+        for pool, jobs in [('compile', num), ('archive', archive_jobs), ('link', link_jobs)]:
+            for i in xrange(0, max(jobs, 1)):
+                self._workers.append(TaskWorker.TaskWorker(self, all_log, logger, object_cache,
+                                                            remote_cache, pool))
 
     def DisableBuildOK(self):
         """
@@ -52,69 +96,328 @@ class TaskMaster(object):
         """
         self._build_ok = False
 
+    def KeepGoing(self):
+        """
+        return whether building the tasks not depending on failed tasks after failure
+        """
+        return self._keep_going
+
     def BuildOK(self):
         """
         return whether all build tasks have  done successfully
         """
         return self._build_ok
 
+    def _prefetch(self):
+        """
+        download object files of changed SourceCache objects from remote cache in parallel,
+        the object files existing in object cache are skipped
+        """
+        items = list()
+        for broc_object in self._changed_list:
+            if broc_object.TYPE != BrocObject.BrocObjectType.BROC_SOURCE:
+                continue
+            key = broc_object.ArtifactKey()
+            if not key or (self._object_cache and self._object_cache.Has(key)):
+                continue
+            items.append((key, broc_object.Pathname()))
+        self._remote_cache.Prefetch(items)
+
+    def _report(self, all_tasks, pending):
+        """
+        show the number of tasks done and the estimated time left, at most one report every
+        REPORT_INTERVAL seconds. The time left is the larger one of the sum of durations left
+        divided by the number of threads and the longest critical path left
+        Args:
+            all_tasks : the number of all tasks
+            pending : the set of file paths not done
+        """
+        now = time.time()
+        if now - self._report_time < self.REPORT_INTERVAL:
+            return
+        self._report_time = now
+        total = sum(self._estimated[x] for x in pending)
+        critical = max([0.0] + [self._priority[x] for x in pending])
+        eta = int(max(total / max(len(self._workers), 1), critical))
+        self._logger.LevPrint("MSG", "%d/%d tasks, ETA %02d:%02d" 
+                              % (all_tasks - len(pending), all_tasks, eta / 60, eta % 60))
+
+    def _calc_memory(self, changed_dict):
+        """
+        estimate the peak RSS of every BrocObject to build by its last build, the files
+        never built are estimated by the average of files of the same type
+        Args:
+            changed_dict : the dict of {file path : BrocObject} to build
+        """
+        peak = self._history.PeakRSS() if self._history else dict()
+        totals = dict()
+        for pathname, broc_object in changed_dict.iteritems():
+            if pathname in peak:
+                total = totals.setdefault(broc_object.TYPE, [0, 0])
+                total[0] += peak[pathname]
+                total[1] += 1
+        self._memory = dict()
+        for pathname, broc_object in changed_dict.iteritems():
+            if pathname in peak:
+                self._memory[pathname] = peak[pathname]
+            elif broc_object.TYPE in totals:
+                self._memory[pathname] = totals[broc_object.TYPE][0] / totals[broc_object.TYPE][1]
+
+    def _can_admit(self, task):
+        """
+        whether task can start now, one task can always run if no other task is running
+        Args:
+            task : the BrocObject.BrocObject object
+        Returns:
+            return (True, '') if task can start, otherwise return (False, the reason)
+        """
+        if not self._admitted:
+            return (True, '')
+        if self._max_load > 0:
+            load = Function.GetLoadAverage()
+            if load is not None and load >= self._max_load:
+                return (False, "load average %.2f" % load)
+        if self._max_mem > 0:
+            memory = self._memory.get(task.Pathname(), 0)
+            running = sum(self._admitted.values())
+            if running + memory > self._max_mem:
+                return (False, "estimated memory %dMB of running tasks" % ((running + memory) / 1024))
+            available = Function.GetAvailableMemory()
+            if available is not None and memory > available:
+                return (False, "available memory %dMB" % (available / 1024))
+        return (True, '')
+
+    def _admit(self, task):
+        """
+        block until task is allowed to start by --max-load and --max-mem
+        Args:
+            task : the BrocObject.BrocObject object
+        Returns:
+            return True if task can start, return False if TaskMaster stops
+        """
+        held = False
+        with self._admission:
+            while self._running:
+                ret, reason = self._can_admit(task)
+                if ret:
+                    self._admitted[task.Pathname()] = self._memory.get(task.Pathname(), 0)
+                    return True
+                if not held:
+                    held = True
+                    self._held += 1
+                    self._logger.LevPrint("MSG", "hold back %s, %s" % (task.Pathname(), reason))
+                self._admission.wait(self.ADMISSION_INTERVAL)
+        return False
+
+    def _calc_priority(self, changed_dict):
+        """
+        calculate the critical path of every BrocObject to build, it is the longest sum of
+        durations along the path from BrocObject to the last reverse dependent one. The files
+        never built are estimated by the average duration of files of the same type
+        Args:
+            changed_dict : the dict of {file path : BrocObject} to build
+        """
+        totals = dict()
+        for pathname, broc_object in changed_dict.iteritems():
+            if pathname in self._durations:
+                total = totals.setdefault(broc_object.TYPE, [0.0, 0])
+                total[0] += self._durations[pathname]
+                total[1] += 1
+        estimated = dict()
+        for _type, (seconds, num) in totals.iteritems():
+            estimated[_type] = seconds / num
+
+        self._estimated = dict()
+        self._priority = dict()
+        for pathname in changed_dict:
+            if pathname in self._priority:
+                continue
+            # DFS in post order, the critical paths of reverse dependent objects are calculated first
+            stack = [(pathname, False)]
+            while stack:
+                now, expanded = stack.pop()
+                if now in self._priority:
+                    continue
+                redeps = filter(lambda x: x in changed_dict, 
+                                map(lambda x: x.Pathname(), changed_dict[now].ReverseDeps()))
+                if not expanded:
+                    stack.append((now, True))
+                    stack.extend((x, False) for x in redeps if x not in self._priority)
+                    continue
+                duration = self._durations.get(now, 
+                                               estimated.get(changed_dict[now].TYPE, 1.0))
+                self._estimated[now] = duration
+                self._priority[now] = duration + max([0.0] + [self._priority[x] for x in redeps])
+
+    def _record(self, response):
+        """
+        record the duration and resource usage of build task done
+        Args:
+            response : the response of TaskWorker
+        """
+        if 'duration' not in response:
+            return
+        broc_object = response['object']
+        self._durations[broc_object.Pathname()] = response['duration']
+        if self._history:
+            self._history.AddTask(broc_object.Pathname(), broc_object.TYPE,
+                                  response['duration'], response.get('usage'))
+
+    def _can_cutoff(self, broc_object, changed_dict):
+        """
+        whether the building of BrocObject can be skipped when its dependent files are not 
+        changed after rebuilt, all of its dependent files to build must be built by TaskMaster
+        Args:
+            broc_object : the BrocObject object
+            changed_dict : the dict of {file path : BrocObject} to build
+        """
+        if not broc_object.cutoff:
+            return False
+        deps = filter(lambda x: x.Build(), broc_object.Deps())
+        if not deps:
+            return False
+        for dep in deps:
+            if dep.Pathname() not in changed_dict:
+                return False
+        return True
+
+    def _skip(self, broc_object):
+        """
+        skip building BrocObject, because none of its dependent files changed after rebuilt
+        Args:
+            broc_object : the BrocObject object
+        """
+        self._skipped += 1
+        self._logger.LevPrint("MSG", "skip %s, its dependent files are not changed" 
+                              % broc_object.Pathname())
+        self.UpdateCache(broc_object.Pathname())
+
+    def _fail(self, response, pending):
+        """
+        handle failed task in keep going mode, the tasks depending on it are not built
+        Args:
+            response : the response of failed task
+            pending : the set of file paths not done
+        """
+        self._failed.append(response)
+        pending.discard(response['object'].Pathname())
+        # the reverse dependent tasks never become ready, because failed task is not done
+        stack = [response['object']]
+        while stack:
+            now = stack.pop()
+            for redeps in now.ReverseDeps():
+                if redeps.Pathname() in pending:
+                    pending.discard(redeps.Pathname())
+                    self._blocked += 1
+                    stack.append(redeps)
+
     def Start(self):
         """
         run build thread 
         """
-        self._logger.LevPrint("MSG", "%d threads to build ..." % len(self._workers))
+        if self._remote_cache:
+            self._prefetch()
+        pools = map(lambda x: x.Pool(), self._workers)
+        self._logger.LevPrint("MSG", "%d threads to build(compile %d, archive %d, link %d) ..." 
+                              % (len(self._workers), pools.count('compile'), 
+                                 pools.count('archive'), pools.count('link')))
 
         all_tasks = 0
-        add_tasks = 0
         degree = dict()              #key is file path,value is number of deps in changed list
         changed_dict = dict()        #key is file path,value is BrocObject
+        cutoff = set()               #file paths of BrocObject skipped if no dependent file changed
+        dirty = set()                #file paths of BrocObject whose dependent files changed
         #get degree of module
         for broc_object in self._changed_list:
             degree[broc_object.Pathname()] = 0
             changed_dict[broc_object.Pathname()] = broc_object
+        if self._history:
+            self._durations = self._history.Durations()
+        self._calc_priority(changed_dict)
+        if self._max_mem > 0:
+            self._calc_memory(changed_dict)
+        pending = set(degree)        #file paths of BrocObject not done
 
         for broc_object in self._changed_list:
-            for redeps in broc_object.reverse_deps:
+            for redeps in broc_object.ReverseDeps():
                 if redeps.Pathname() in degree:
                     degree[redeps.Pathname()] += 1
+            if self._can_cutoff(broc_object, changed_dict):
+                cutoff.add(broc_object.Pathname())
         #add no deps object
         for file_path in degree:
             all_tasks += 1
             broc_object = changed_dict[file_path]
             if degree[file_path] == 0:
                 self.AddTask(broc_object)
-                add_tasks += 1
 
         for worker in self._workers:
             worker.start()
 
-        while add_tasks < all_tasks:
+        # wait for all tasks done to record them and report progress
+        while pending:
             response = self.FetchResponse()
-            if response == -1 or not response['result']:
+            if response == -1:
                 break
-            now = response['object']
-            for redeps in now.reverse_deps:
-                if redeps.Pathname() in degree:
-                    degree[redeps.Pathname()] -= 1
-                    if degree[redeps.Pathname()] == 0:
-                        self.AddTask(redeps)
-                        add_tasks = add_tasks + 1
+            if not response['result']:
+                if not self._keep_going:
+                    break
+                self._fail(response, pending)
+                continue
+            self._record(response)
+            # the skipped objects are handled as done without changing
+            done = [(response['object'], response['changed'])]
+            while done:
+                now, changed = done.pop()
+                pending.discard(now.Pathname())
+                for redeps in now.ReverseDeps():
+                    if redeps.Pathname() in degree:
+                        if changed:
+                            dirty.add(redeps.Pathname())
+                        degree[redeps.Pathname()] -= 1
+                        if degree[redeps.Pathname()] == 0:
+                            if redeps.Pathname() in cutoff and redeps.Pathname() not in dirty:
+                                self._skip(redeps)
+                                done.append((redeps, False))
+                            else:
+                                self.AddTask(redeps)
+            self._report(all_tasks, pending)
         self.Wait()
+        if self._skipped:
+            self._logger.LevPrint("MSG", "%d targets skipped, their dependent files are not changed"
+                                  % self._skipped)
+        if self._held:
+            self._logger.LevPrint("MSG", "%d tasks held back by load average or memory" % self._held)
+        if self._failed:
+            for response in self._failed:
+                self._logger.LevPrint("ERROR", "%s" % response['msg'])
+            self._logger.LevPrint("ERROR", "%d tasks failed: %s" 
+                                  % (len(self._failed), 
+                                     ", ".join(map(lambda x: x['object'].Pathname(), self._failed))))
+            if self._blocked:
+                self._logger.LevPrint("ERROR", "%d tasks not built, their dependent files failed"
+                                      % self._blocked)
     
     def Wait(self):
         """
         wait all tasks have been done
         """
-        self._queue.join()
+        for queue in self._queues.itervalues():
+            queue.join()
         for worker in self._workers:
             worker.Stop()
             worker.join()
 
-    def TaskDone(self):
+    def TaskDone(self, task):
         """
         notity queue the task has been done
+        Args:
+            task : the BrocObject.BrocObject object done, the tasks held back are notified
         """
-        self._queue.task_done()
+        with self._admission:
+            self._admitted.pop(task.Pathname(), None)
+            self._admission.notify_all()
+        self._queues[self.POOLS.get(task.TYPE, 'compile')].task_done()
 
     def Stop(self):
         """
@@ -123,11 +426,15 @@ class TaskMaster(object):
         self._running = False
         for worker in self._workers:
             worker.Stop()
+        # wake up the tasks held back
+        with self._admission:
+            self._admission.notify_all()
 
         # release left task and to release thread blocking at Wait()
-        while not self._queue.empty():
-            self._queue.get()
-            self._queue.task_done()
+        for queue in self._queues.itervalues():
+            while not queue.empty():
+                queue.get()
+                queue.task_done()
 
     def AddTask(self, task):
         """
@@ -136,7 +443,9 @@ class TaskMaster(object):
             task : the BrocObject.BrocObject object
         """
         if self._running:
-            self._queue.put(task)
+            priority = self._priority.get(task.Pathname(), 0.0)
+            self._queues[self.POOLS.get(task.TYPE, 'compile')].put((-priority, 
+                                                                    next(self._sequence), task))
 
     def AddResponse(self, response):
         """
@@ -149,9 +458,11 @@ class TaskMaster(object):
         if self._running:
             self._response_queue.put(response)
 
-    def FetchTask(self):
+    def FetchTask(self, pool='compile'):
         """
         fetch a build task
+        Args:
+            pool : the pool of thread fetching task, compile, archive or link
         Returns:
             return a task if fetch successfully
             return None if fetch timeout
@@ -163,10 +474,14 @@ class TaskMaster(object):
 
         task = None
         try:
-            task = self._queue.get(True, 0.1)
+            task = self._queues[pool].get(True, 0.1)[2]
         except Queue.Empty:
             pass
 
+        if task and (self._max_load > 0 or self._max_mem > 0) and not self._admit(task):
+            # TaskMaster stops when task is held back
+            self._queues[pool].task_done()
+            return -1
         return task 
     
     def FetchResponse(self):
@@ -182,10 +497,11 @@ class TaskMaster(object):
         response = self._response_queue.get(True)
         return response
 
-    def UpdateCache(self, pathname):
+    def UpdateCache(self, pathname, headers=None):
         """
         update cache 
         Args:
             pathname : the cvs path of cache
+            headers : the set of header files harvested from depfile of source file
         """
-        self._cache_master.UpdateCache(pathname)
+        self._cache_master.UpdateCache(pathname, headers)
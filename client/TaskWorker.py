@@ -13,6 +13,7 @@ Date:    2015/10/26 10:50:06
 
 import os
 import sys
+import time
 import threading
 
 broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -25,19 +26,92 @@ class TaskWorker(threading.Thread):
     """
     to run build task
     """
-    def __init__(self, master, all_log, logger):
+    def __init__(self, master, all_log, logger, object_cache=None, remote_cache=None,
+                 pool='compile'):
         """
         Args:
             master : the TaskMaster object
             all_log : show all build log
             logger : the Log.Log() object 
+            object_cache : the ObjectCache.ObjectCache object, None means no object cache
+            remote_cache : the RemoteCache.RemoteCache object, None means no remote cache
+            pool : the pool of tasks fetched, compile, archive or link, see TaskMaster
         """
         threading.Thread.__init__(self)
         self._master = master
         self._all_log = all_log
         self._logger = logger
+        self._object_cache = object_cache
+        self._remote_cache = remote_cache
+        self._pool = pool
         self._running = True
 
+    def _fetch(self, key, task):
+        """
+        install the result of task from object cache or remote cache
+        Args:
+            key : the key of result
+            task : the BrocObject.BrocObject object
+        Returns:
+            return True if result has been installed
+        """
+        pathname = task.Pathname()
+        if self._remote_cache and self._remote_cache.Fetched(key):
+            if self._object_cache:
+                self._object_cache.Store(key, pathname)
+            return True
+        if self._object_cache and self._object_cache.Fetch(key, pathname):
+            return True
+        # the object files have been prefetched, only fetch lib file whose key is known now
+        if self._remote_cache and task.TYPE == BrocObject.BrocObjectType.BROC_LIB \
+                and self._remote_cache.Get(key, pathname):
+            if self._object_cache:
+                self._object_cache.Store(key, pathname)
+            return True
+        return False
+
+    def _do_build(self, task):
+        """
+        build task, the result of SourceCache and LibCache is fetched from object cache
+        or remote cache if it exists
+        Args:
+            task : the BrocObject.BrocObject object
+        Returns:
+            return the result of BrocObject.DoBuild()
+        """
+        if task.TYPE not in [BrocObject.BrocObjectType.BROC_SOURCE,
+                             BrocObject.BrocObjectType.BROC_LIB]:
+            return task.DoBuild()
+        # result may be a hard link of the file in object cache installed by older versions,
+        # remove it before building, otherwise ar would write into the cached file
+        key = None
+        if self._object_cache or self._remote_cache:
+            key = task.ArtifactKey()
+        if not key:
+            Function.DelFiles(task.Pathname())
+            return task.DoBuild()
+
+        if self._fetch(key, task):
+            task.DisableBuild()
+            # the depfile left by last compiling is stale, header files are not harvested
+            if task.TYPE == BrocObject.BrocObjectType.BROC_SOURCE:
+                Function.DelFiles(task.DepFile())
+            return {'ret' : True, 'msg' : ''}
+        Function.DelFiles(task.Pathname())
+        result = task.DoBuild()
+        if result['ret']:
+            if self._object_cache:
+                self._object_cache.Store(key, task.Pathname())
+            if self._remote_cache:
+                self._remote_cache.Put(key, task.Pathname())
+        return result
+
+    def Pool(self):
+        """
+        return the pool of tasks fetched
+        """
+        return self._pool
+
     def Stop(self):
         """
         to stop build thread 
@@ -49,7 +123,7 @@ class TaskWorker(threading.Thread):
         fetch one task and handle it
         """
         while self._running:
-            task = self._master.FetchTask()
+            task = self._master.FetchTask(self._pool)
             if isinstance(task, int) and task == -1:
                 # master encounter error, break
                 break
@@ -60,21 +134,32 @@ class TaskWorker(threading.Thread):
             response = dict()
             response['result'] = True
             response['object'] = task
+            response['changed'] = True
             # task whose type is LibCache and build cmd is empty, the lib is specified in Libs
             if task.TYPE == BrocObject.BrocObjectType.BROC_LIB and task.BuildCmd() is None:
                 self._master.UpdateCache(task.Pathname())
                 self._master.AddResponse(response)
-                self._master.TaskDone()
+                self._master.TaskDone(task)
                 continue
             else:
-                result = task.DoBuild() 
+                last_hash = task.Hash()
+                begin = time.time()
+                result = self._do_build(task)
+                response['duration'] = time.time() - begin
+                response['usage'] = result.get('usage')
 
-            self._master.TaskDone()
+            self._master.TaskDone(task)
             if not result['ret']:
                 response['result'] = False
+                response['msg'] = result['msg']
+                self._master.DisableBuildOK()
+                # the error is reported by master after all independent tasks done
+                if self._master.KeepGoing():
+                    self._logger.LevPrint("ERROR", "compile %s [FAILED]" % task.Pathname())
+                    self._master.AddResponse(response)
+                    continue
                 self._master.AddResponse(response)
                 self._logger.LevPrint("ERROR", "%s" % result['msg'])
-                self._master.DisableBuildOK()
                 self._master.Stop()
                 break
             else:
@@ -90,6 +175,13 @@ class TaskWorker(threading.Thread):
                 self._logger.LevPrint(log_level, info)
                 if result['msg']:
                     self._logger.LevPrint(log_level, result['msg'])
-                self._master.UpdateCache(task.Pathname())
+                # harvest header files from depfile written by compiler
+                headers = None
+                if task.TYPE == BrocObject.BrocObjectType.BROC_SOURCE:
+                    headers = task.DepHeaders()
+                self._master.UpdateCache(task.Pathname(), headers)
+                # the reverse dependent tasks can be skipped if the result is not changed
+                response['changed'] = last_hash is None \
+                                      or Function.GetFileHash(task.Pathname()) != last_hash
                 self._master.AddResponse(response)
 
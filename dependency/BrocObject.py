@@ -10,7 +10,9 @@ Date:    2015/10/13 14:50:06
 """
 
 import os
+import re
 import sys
+import threading
 
 broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, broc_dir)
@@ -28,11 +30,49 @@ class BrocObjectType(object):
     BROC_APP = 4    # exe
 
 
+# the number of times the stat fingerprint of file matched(hit) or not(miss)
+FINGERPRINT_STATS = {'hit' : 0, 'miss' : 0}
+_fingerprint_lock = threading.Lock()
+
+def _count_fingerprint(hit):
+    """
+    count a fingerprint comparison
+    Args:
+        hit : True if fingerprint not changed, False if file content needs to be hashed
+    """
+    _fingerprint_lock.acquire()
+    if hit:
+        FINGERPRINT_STATS['hit'] += 1
+    else:
+        FINGERPRINT_STATS['miss'] += 1
+    _fingerprint_lock.release()
+
+
+def _intern(pathname):
+    """
+    intern cvs path, all caches and dependency records share one string object
+    """
+    if isinstance(pathname, str):
+        return intern(pathname)
+    return pathname
+
+
+def _cmd_hash(cmd):
+    """
+    return the fingerprint of build cmd, None if cmd is None
+    """
+    if cmd is None:
+        return None
+    return Function.CalcHash(cmd)
+
+
 class BrocObject(object):
     """
     base cache class
     """
     TYPE = BrocObjectType.BROC_UNKNOW
+    __slots__ = ('pathname', 'initialized', 'deps', 'reverse_deps', 'hash', 'fingerprint',
+                 'build_cmd', 'build_argv', 'cmd_hash', 'build', 'modified', 'notify', 'cutoff')
     def __init__(self, pathname, initialized=True):
         """
         Args:
@@ -40,22 +80,25 @@ class BrocObject(object):
             initialized : to mark whether BrocObject need initialized, default is True,
                           if initialized is False, create a empty BrocObject object
         """
-        self.pathname = pathname
+        self.pathname = _intern(pathname)
         self.initialized = initialized # initialized flag
-        self.deps = set()              # dependent BrocObject
-        self.reverse_deps = set()      # reversed dependent BrocObject
+        self.deps = dict()             # dependent BrocObject, {cvs path : BrocObject}
+        self.reverse_deps = dict()     # reversed dependent BrocObject, {cvs path : BrocObject}
         self.hash = None               # hash value of content
-        self.modify_time = 0           # the last modify time of BrocObject file
-        self.build_cmd = ""            # the commond of BrocObject to build
+        self.fingerprint = None        # the stat fingerprint of BrocObject file, see Function.GetFileFingerprint()
+        self.build_cmd = ""            # the commond of BrocObject to build, it is not saved in cache file
+        self.build_argv = None         # the argument list of build cmd, None means running build cmd by shell
+        self.cmd_hash = None           # the fingerprint of build cmd
         if self.initialized:
             try:
-                self.hash = Function.GetFileHash(pathname)
-                if self.hash:
-                    self.modify_time = os.stat(self.pathname.st_mtime) 
+                self.fingerprint = Function.GetFileFingerprint(self.pathname)
+                self.hash = Function.GetFileHash(self.pathname)
             except BaseException:
                 pass
         self.build = True              # build flag, if build is True, the BrocObject need to compiled
         self.modified = False          # to mark whether the file has been modified since last build
+        self.notify = False            # whether reversed dependent BrocObject need to build, see PropagateBuild()
+        self.cutoff = False            # whether building can be skipped if dependent files not changed after built
 
     def __eq__(self, other):
         """
@@ -70,6 +113,62 @@ class BrocObject(object):
         return build_cmd
         """
         return self.build_cmd
+
+    def __setstate__(self, state):
+        """
+        BrocObject of cache version 0.1 was pickled with its __dict__,
+        this method is used to migrate them
+        Args:
+            state : the __dict__ of BrocObject of version 0.1
+        """
+        self.notify = False
+        self.cutoff = False
+        self.build_argv = None
+        for k, v in state.iteritems():
+            if k == 'build_cmd':
+                self.cmd_hash = _cmd_hash(v)
+                self.build_cmd = None
+            elif k == 'pathname':
+                self.pathname = _intern(v)
+            elif k == 'modify_time':
+                self.fingerprint = v
+            else:
+                setattr(self, k, v)
+
+    def Record(self):
+        """
+        return a compact tuple saved into cache file,
+        dependent caches are represented by their cvs paths
+        """
+        return (self.TYPE, 
+                self.pathname,
+                self.initialized, 
+                self.hash,
+                self.fingerprint,
+                self.cmd_hash,
+                self.build,
+                tuple(self.deps))
+
+    def LoadRecord(self, record):
+        """
+        initialize BrocObject with the record returned by Record(), 
+        the dependency relation is restored by BrocObjectMaster
+        Args:
+            record : the tuple returned by Record()
+        """
+        self.pathname = _intern(record[1])
+        self.initialized = record[2]
+        self.hash = record[3]
+        self.fingerprint = record[4]
+        self.cmd_hash = record[5]
+        self.build = record[6]
+        self.deps = dict()
+        self.reverse_deps = dict()
+        self.build_cmd = None    # build cmd is set again in check stage
+        self.build_argv = None
+        self.modified = False
+        self.notify = False
+        self.cutoff = False
         
     def Initialize(self, target):
         """
@@ -89,11 +188,27 @@ class BrocObject(object):
         """
         return self.build_cmd
 
-    def UpdateBuildCmd(self, cmd):
+    def UpdateBuildCmd(self, cmd, argv=None):
        '''
        update bulild cmd
+       Args:
+           cmd : the build cmd
+           argv : the argument list of build cmd executed without shell, None means running
+                  cmd by shell
        '''
        self.build_cmd = cmd
+       self.build_argv = argv
+       self.cmd_hash = _cmd_hash(cmd)
+
+    def BuildCmdChanged(self, cmd):
+        """
+        to check whether build cmd changed, only the fingerprint of build cmd is saved in cache file
+        Args:
+            cmd : the new build cmd
+        Returns:
+            return True if cmd is different from the cmd of last build
+        """
+        return self.cmd_hash != _cmd_hash(cmd)
 
     def Hash(self):
         """
@@ -103,28 +218,23 @@ class BrocObject(object):
 
     def Deps(self):
         """
-        return all dependent caches 
+        return the list of all dependent caches 
         """
-        return self.deps
+        return self.deps.values()
 
     def ReverseDeps(self):
         """
-        return all reverse dependent cache
+        return the list of all reverse dependent cache
         """
-        return self.reverse_deps
+        return self.reverse_deps.values()
 
     def AddReverseDep(self, obj):
         """
-        add reverse dependent BrocObject
+        add reverse dependent BrocObject, if obj has existed already, do nothing
         Args:
             obj : the BrocObject object
         """
-        for item in self.reverse_deps:
-            # obj has existed already
-            if item == obj:
-                return
-
-        self.reverse_deps.add(obj)
+        self.reverse_deps.setdefault(obj.pathname, obj)
 
     def DelReverseDep(self, pathname):
         """
@@ -132,22 +242,15 @@ class BrocObject(object):
         Args:
             pathname : the name of reversed dependent cache 
         """
-        for item in self.reverse_deps:
-            if item.Pathname() == pathname:
-                self.reverse_deps.remove(item)
-                return
+        self.reverse_deps.pop(pathname, None)
 
     def AddDep(self, obj):
         """
-        add dep file
+        add dep file, if obj has existed already, do nothing
         Args:
             obj : the BrocObject object
         """
-        for item in self.deps:
-            # obj has exist already
-            if item == obj:
-                return
-        self.deps.add(obj)
+        self.deps.setdefault(obj.pathname, obj)
 
     def DelDep(self, pathname):
         """
@@ -155,18 +258,15 @@ class BrocObject(object):
         Args:
             pathname : the name of dependent cache 
         """
-        for item in self.deps:
-            if item.Pathname() == pathname:
-                self.deps.remove(item)
-                return
+        self.deps.pop(pathname, None)
 
     def EnableBuild(self):
         """
-        enable build flag
+        enable build flag, all reversed dependent BrocObject are set to build later 
+        by PropagateBuild() at the end of check stage
         """
         self.build = True
-        # set all reversed dependent BrocObject to build
-        self.NotifyReverseDeps()
+        self.notify = True
 
     def EnableBuildNoReverse(self):
         '''
@@ -207,7 +307,7 @@ class BrocObject(object):
         if not self.build:
             return -1
 
-        for dep in self.deps:
+        for dep in self.deps.itervalues():
             if not dep.IsBuilt():
                 return 0
 
@@ -219,9 +319,10 @@ class BrocObject(object):
         Returns:
             return (True, '') if build successfully
             return (False, 'error msg') if fail to build   
+            result['usage'] is the resource usage of build cmd, see Function.RunCommandWithUsage()
         """
         result = dict()
-        ret, msg = Function.RunCommand(self.build_cmd, ignore_stderr_when_ok = False)
+        ret, msg, result['usage'] = Function.RunCommandWithUsage(self.build_argv or self.build_cmd)
         if ret != 0:
             result['ret'] = False
         else:
@@ -235,9 +336,7 @@ class BrocObject(object):
         """
         to notify all reversed dependent BrocObject objects to build
         """
-        for obj in self.reverse_deps:
-            #Log.Log().LevPrint("MSG", "%s nofity reverse cache dep(%s) build" % (self.pathname, obj.Pathname()))
-            obj.EnableBuild()
+        PropagateBuild([self])
 
     def IsChanged(self, target=None):
         """
@@ -252,20 +351,20 @@ class BrocObject(object):
         if self.build:
             #Log.Log().LevPrint('MSG', 'cache %s build mark is true' % self.pathname)
             return True
-        # check mtime
-        modify_time = None
+        # check stat fingerprint
+        fingerprint = None
         try:
-            modify_time = os.stat(self.pathname).st_mtime
+            fingerprint = Function.GetFileFingerprint(self.pathname)
         except BaseException:
-            Log.Log().LevPrint('MSG', 'get %s modify_time failed' % self.pathname)
+            Log.Log().LevPrint('MSG', 'get %s fingerprint failed' % self.pathname)
             self.build = True
-            self.modify_time = 0
+            self.fingerprint = None
             return True
 
-        if modify_time == self.modify_time:
+        if self._fingerprint_matched(fingerprint):
             return False
         else:
-            self.modify_time = modify_time
+            self.fingerprint = fingerprint
             ret = False
             # check hash
             _hash = Function.GetFileHash(self.pathname)
@@ -287,19 +386,19 @@ class BrocObject(object):
         if not os.path.exists(self.pathname):
             return -1
 
-        # check mtime
-        modify_time = None
+        # check stat fingerprint
+        fingerprint = None
         try:
-            modify_time = os.stat(self.pathname).st_mtime
+            fingerprint = Function.GetFileFingerprint(self.pathname)
         except BaseException:
-            Log.Log().LevPrint('MSG', 'get %s modify_time failed' % self.pathname)
-            self.modify_time = 0
+            Log.Log().LevPrint('MSG', 'get %s fingerprint failed' % self.pathname)
+            self.fingerprint = None
             return 1
 
-        if modify_time == self.modify_time:
+        if self._fingerprint_matched(fingerprint):
             return 0
         else:
-            self.modify_time = modify_time
+            self.fingerprint = fingerprint
             ret = 0
             # check hash
             _hash = Function.GetFileHash(self.pathname)
@@ -310,24 +409,37 @@ class BrocObject(object):
             return ret
 
 
+    def _fingerprint_matched(self, fingerprint):
+        """
+        an unchanged stat fingerprint means the content of file is not changed,
+        and there is no need to hash file
+        Args:
+            fingerprint : the fingerprint returned by Function.GetFileFingerprint()
+        Returns:
+            return True if fingerprint equals to the fingerprint of last build
+        """
+        hit = fingerprint == self.fingerprint
+        _count_fingerprint(hit)
+        return hit
+
     def Update(self):
         """
-        Update modify time and hash value of cache object
+        Update stat fingerprint and hash value of cache object
         """
-        # update modify time
-        modify_time = None
+        # update stat fingerprint
+        fingerprint = None
         try:
-            modify_time = os.stat(self.pathname).st_mtime
+            fingerprint = Function.GetFileFingerprint(self.pathname)
         except BaseException as err:
             Log.Log().LevPrint("ERROR", "update cache(%s) failed: %s" % (self.pathname, err))
             return 
 
-        if self.modify_time == modify_time:
+        if self._fingerprint_matched(fingerprint):
             self.modified = False
             self.build = False
             return 
         
-        self.modify_time = modify_time
+        self.fingerprint = fingerprint
         # update hash
         _hash = Function.GetFileHash(self.pathname)
         # Log.Log().LevPrint("MSG", "update %s hash id(%s) %s --> %s" % (self.pathname, id(self), self.hash, _hash))
@@ -335,6 +447,37 @@ class BrocObject(object):
         self.modified = False
         self.build = False
 
+    def State(self):
+        """
+        return the state changed by Update(), it is saved into cache journal
+        """
+        return (self.fingerprint, self.hash)
+
+    def Restore(self, state):
+        """
+        restore the state saved by State(), it is used when replaying cache journal
+        Args:
+            state : the object returned by State()
+        """
+        self.fingerprint, self.hash = state
+        self.modified = False
+        self.build = False
+
+    def Rehash(self):
+        """
+        recalculate hash value with the current hash method(Function.HASH_METHOD),
+        if file was modified since last build, hash value is cleared and file is regarded as changed
+        """
+        try:
+            fingerprint = Function.GetFileFingerprint(self.pathname)
+        except BaseException:
+            self.hash = None
+            return
+        if fingerprint == self.fingerprint:
+            self.hash = Function.GetFileHash(self.pathname)
+        else:
+            self.hash = None
+
     def DisableBuild(self):
         """
         disable build flag
@@ -353,6 +496,7 @@ class HeaderCache(BrocObject):
     .h cache
     """
     TYPE = BrocObjectType.BROC_HEADER
+    __slots__ = ()
 
     
 class SourceCache(BrocObject):
@@ -360,14 +504,41 @@ class SourceCache(BrocObject):
     .cpp .c cache
     """
     TYPE = BrocObjectType.BROC_SOURCE
-    def __init__(self, source):
+    __slots__ = ('src_obj', 'headers_known')
+    def __init__(self, source, headers_known=True):
         """
         Args:
             source  : the Souce.Source object
+            headers_known : whether header files of source are known, if not, they are
+                            harvested from depfile after compiling
         """
         BrocObject.__init__(self, source.OutFile(), False)
-        self.build_cmd = source.GetBuildCmd()
+        self.UpdateBuildCmd(source.GetBuildCmd(), source.GetBuildArgv())
         self.src_obj = BrocObject(source.InFile())
+        self.headers_known = headers_known
+
+    def Record(self):
+        """
+        return a compact tuple saved into cache file, the source file is inlined into it
+        """
+        return BrocObject.Record(self) + (self.src_obj.pathname,
+                                          self.src_obj.hash,
+                                          self.src_obj.fingerprint,
+                                          self.src_obj.build)
+
+    def LoadRecord(self, record):
+        """
+        initialize SourceCache with the record returned by Record()
+        Args:
+            record : the tuple returned by Record()
+        """
+        BrocObject.LoadRecord(self, record)
+        self.src_obj = BrocObject(record[8], False)
+        self.src_obj.hash = record[9]
+        self.src_obj.fingerprint = record[10]
+        self.src_obj.build = record[11]
+        # header files are harvested from depfile after compiling successfully
+        self.headers_known = not self.build
             
     def IsChanged(self, target):
         """"
@@ -382,22 +553,22 @@ class SourceCache(BrocObject):
         # to check source file 
         if self.src_obj.IsChanged(None):
             #Log.Log().LevPrint('MSG', "%s changed" % self.pathname)
-            self.build_cmd = target.GetBuildCmd()
+            self.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
             self.build = True
             return True
 
         # to check build option
-        if self.build_cmd != target.GetBuildCmd():
+        if self.BuildCmdChanged(target.GetBuildCmd()):
             #Log.Log().LevPrint('INFO', "cache(%s, type:%s) build cmd changed" % (self.pathname, self.TYPE))
             #Log.Log().LevPrint('MSG', "%s -- > %s" % (self.build_cmd, target.GetBuildCmd()))
-            self.build_cmd = target.GetBuildCmd()
+            self.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
             self.build = True
             return True
 
         # to check obj file
         if BrocObject.IsChanged(self, target.InFile()):
             #Log.Log().LevPrint('MSG', "obj %s changed" % targetg.InFile())
-            self.build_cmd = target.GetBuildCmd()
+            self.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
             self.build = True
             return True
 
@@ -424,14 +595,91 @@ class SourceCache(BrocObject):
     def Update(self):
         """
         update source cache, this function update object file's cache
-        source file's modify time and hash value are updated in IsChanged()
+        source file's fingerprint and hash value are updated in IsChanged()
         """
         # update head files
-        for head_cache in self.deps:
+        for head_cache in self.deps.itervalues():
             head_cache.DisableBuild()
         # update source file
         self.src_obj.Update() 
         BrocObject.Update(self)
+
+    def ArtifactKey(self):
+        """
+        return the key of object file in ObjectCache, it is the hash of build cmd without
+        the path of object file, the hash of source file and the hashes of all header files
+        Returns:
+            return None if header files or the hash value of some existing file is unknown
+        """
+        if not self.headers_known or self.build_cmd is None or self.src_obj.hash is None:
+            return None
+        items = [self.build_cmd.replace(self.pathname, ''), self.src_obj.hash]
+        for pathname in sorted(self.deps):
+            _hash = self.deps[pathname].hash
+            if _hash is None:
+                # the header file absent, like the one included in #if block for other platforms,
+                # is marked in key instead of disabling cache of the whole source file
+                if os.path.exists(pathname):
+                    return None
+                _hash = '-'
+            items.append("%s %s" % (pathname, _hash))
+        return Function.CalcHash("\n".join(items))
+
+    def DepFile(self):
+        """
+        return the path of depfile written by compiler, see Builder.ObjBuilder
+        """
+        return self.pathname + '.d'
+
+    def DepHeaders(self):
+        """
+        parse depfile written by compiler when compiling
+        Returns:
+            return the set of header files, the header files in workspace are cvs paths.
+            return None if depfile is missing
+        """
+        try:
+            with open(self.DepFile(), 'r') as f:
+                content = f.read()
+        except IOError:
+            return None
+        # the format is 'object: source header header \\\n header ...', space in path is escaped
+        content = content.replace('\\\n', ' ')
+        content = content[content.find(': ') + 1:]
+        prefix = os.getcwd() + '/'
+        headers = set()
+        for path in re.findall(r'(?:\\.|[^\s\\])+', content):
+            path = path.replace('\\ ', ' ')
+            if path.startswith(prefix):
+                path = path[len(prefix):]
+            path = os.path.normpath(path)
+            if path != self.src_obj.pathname:
+                headers.add(path)
+        return headers
+
+    def Rehash(self):
+        """
+        recalculate hash value of object file and source file
+        """
+        self.src_obj.Rehash()
+        BrocObject.Rehash(self)
+
+    def State(self):
+        """
+        return the state of object file and source file
+        """
+        return (BrocObject.State(self), self.src_obj.State())
+
+    def Restore(self, state):
+        """
+        restore the state of object file and source file
+        Args:
+            state : the object returned by State()
+        """
+        for head_cache in self.deps.itervalues():
+            head_cache.DisableBuild()
+        self.src_obj.Restore(state[1])
+        BrocObject.Restore(self, state[0])
         
 
         
@@ -440,6 +688,7 @@ class LibCache(BrocObject):
     .a cache
     """
     TYPE = BrocObjectType.BROC_LIB
+    __slots__ = ()
     def __init__(self, pathname, target, initialized=True):
         """
         Args:
@@ -449,9 +698,9 @@ class LibCache(BrocObject):
         """
         BrocObject.__init__(self, pathname, initialized)
         if initialized:
-            self.build_cmd = target.GetBuildCmd()
+            self.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
         else:
-            self.build_cmd = None
+            self.UpdateBuildCmd(None)
 
     def Initialize(self, target):
         """
@@ -461,12 +710,11 @@ class LibCache(BrocObject):
         """
         if not self.initialized:
             try:
+                self.fingerprint = Function.GetFileFingerprint(self.pathname)
                 self.hash = Function.GetFileHash(self.pathname)
-                if self.hash:
-                    self.modify_time = os.stat(self.pathname.st_mtime) 
             except BaseException:
                 pass
-            self.build_cmd = target.GetBuildCmd()
+            self.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
             self.initialized = True
 
     def IsChanged(self, target):
@@ -480,26 +728,45 @@ class LibCache(BrocObject):
             if file is not modified, return False
         """
         # to check build option
-        if self.build_cmd != target.GetBuildCmd():
-            self.build_cmd = target.GetBuildCmd()
-            Log.Log.LevPrint("MSG", "%s build cmd changed" % self.pathname)
+        if self.BuildCmdChanged(target.GetBuildCmd()):
+            self.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
+            Log.Log().LevPrint("MSG", "%s build cmd changed" % self.pathname)
             self.build = True
             return True
         else:
             return BrocObject.IsChanged(self, target.OutFile())
 
+    def ArtifactKey(self):
+        """
+        return the key of lib file in ObjectCache, it is the hash of build cmd without
+        the path of lib file and the hashes of all input files. The input files are
+        hashed freshly because they may have been rebuilt just now
+        Returns:
+            return None if lib is specified in Libs or some input file is missing
+        """
+        if self.build_cmd is None:
+            return None
+        items = [self.build_cmd.replace(self.pathname, '')]
+        for pathname in sorted(self.deps):
+            try:
+                items.append("%s %s" % (pathname, Function.GetFileHash(pathname)))
+            except BaseException:
+                return None
+        return Function.CalcHash("\n".join(items))
+
 
 class AppCache(BrocObject):
     """
     bin file cache
     """
     TYPE = BrocObjectType.BROC_APP
+    __slots__ = ()
     def __init__(self, target):
         """
             target : the Target.Target object
         """
         BrocObject.__init__(self, target.OutFile())
-        self.build_cmd = target.GetBuildCmd()
+        self.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
 
     def IsChanged(self, target):
         """
@@ -511,8 +778,8 @@ class AppCache(BrocObject):
             if file is not modified, return False
         """
         # to check build option
-        if self.build_cmd != target.GetBuildCmd():
-            self.build_cmd = target.GetBuildCmd()
+        if self.BuildCmdChanged(target.GetBuildCmd()):
+            self.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
             self.build = True
             return True
         elif BrocObject.IsChanged(self, target):
@@ -522,3 +789,48 @@ class AppCache(BrocObject):
             return False
 
 
+
+
+CACHE_CLASSES = {BrocObjectType.BROC_HEADER : HeaderCache,
+                 BrocObjectType.BROC_SOURCE : SourceCache,
+                 BrocObjectType.BROC_LIB : LibCache,
+                 BrocObjectType.BROC_APP : AppCache}
+
+def PropagateBuild(caches):
+    """
+    set all BrocObject depending on caches directly or indirectly to build. Each BrocObject
+    is visited once, so the cost is linear in the number of dependency edges, however many
+    paths lead to it. The BrocObject set to build only by propagation can be cut off,
+    it is not built if none of its dependent files changes after they are rebuilt
+    Args:
+        caches : the iterable of BrocObject objects whose reversed dependent caches need to build
+    Returns:
+        return the number of BrocObject objects visited
+    """
+    stack = list(caches)
+    visited = set(map(lambda x: x.pathname, stack))
+    while stack:
+        cache = stack.pop()
+        cache.notify = False
+        for obj in cache.reverse_deps.itervalues():
+            if not obj.build:
+                obj.build = True
+                obj.cutoff = True
+            if obj.pathname not in visited:
+                visited.add(obj.pathname)
+                stack.append(obj)
+    return len(visited)
+
+
+def CreateFromRecord(record):
+    """
+    create a BrocObject object from the record saved in cache file
+    Args:
+        record : the tuple returned by BrocObject.Record()
+    Returns:
+        return the BrocObject object, its dependency relation is empty
+    """
+    cls = CACHE_CLASSES[record[0]]
+    obj = cls.__new__(cls)
+    obj.LoadRecord(record)
+    return obj
@@ -13,7 +13,9 @@ Date:    2015/10/13 14:50:06
 
 import os
 import sys
+import time
 import threading
+import json
 import Queue
 import cPickle
 
@@ -23,6 +25,13 @@ import BrocObject
 broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, broc_dir)
 from util import Function
+from dependency import Builder
+
+# the type names of caches in dependency relation file, see BrocObjectMaster.Dump()
+TYPE_NAMES = {BrocObject.BrocObjectType.BROC_HEADER : 'header',
+              BrocObject.BrocObjectType.BROC_SOURCE : 'source',
+              BrocObject.BrocObjectType.BROC_LIB : 'lib',
+              BrocObject.BrocObjectType.BROC_APP : 'app'}
 
 
 class BrocObjectMaster(threading.Thread):
@@ -30,23 +39,34 @@ class BrocObjectMaster(threading.Thread):
     cache Manager class
     BrocObjectMaster object is a thread object
     """
-    def __init__(self, cache_file, root, logger):
+    def __init__(self, cache_file, root, logger, check_jobs=Function.CHECK_JOBS):
         """
         Args:
             cache_file : the path of cache file
             root : the root path of main module
             logger : the Log.Log() object
+            check_jobs : the number of threads checking whether caches have been modified
         """
         threading.Thread.__init__(self)
+        self._check_jobs = max(1, check_jobs)
         self._cache_file = cache_file
+        self._journal_file = cache_file + '.journal'
         self._root = root
         self._logger = logger
         self._queue = Queue.Queue()  # request queue
-        self._version = 0.1
+        self._version = 0.3
+        self._rehash = False        # whether hash method of cache file is different from current one
         self._cache = dict()        # {cvs path : BrocObject} 
         self._changed_cache = set() # set(BrocObject)
+        self._targets = list()      # the targets to check
+        self._scanned = dict()      # {out file of source : whether its header files have been calculated}
         self._event = threading.Event()
-        self._dumped_str = ""
+        self._journal = None        # file object of cache journal
+        self._journal_records = 0   # the number of records appended into journal
+        self._pending = list()      # journal records not flushed
+        self._flush_count = 64      # flush journal when the number of pending records reaches it
+        self._flush_interval = 2    # flush journal when pending records wait longer than it(seconds)
+        self._last_flush = time.time()
     
     def WaitCheckDone(self):
         """
@@ -63,15 +83,32 @@ class BrocObjectMaster(threading.Thread):
         """
         self._queue.put(('stop', None))
         self.join()
+        self._close_journal()
 
     def SelfCheck(self):
         '''
         After BrocObjectMaster loading caches, to check whether all caches have been modified,
         this step must be execute before run BROC files
         '''
-        missing = list()
+        # stat and hash files in thread pool, each cache only touches itself
+        if self._rehash:
+            self._logger.LevPrint("MSG", "hash method changed, rehash all caches with %s" 
+                                  % Function.HASH_METHOD)
+        queue = Queue.Queue()
         for cvs, cache in self._cache.iteritems():
-            ret = cache.IsModified()
+            queue.put((cvs, cache))
+        results = list()
+        lock = threading.Lock()
+        workers = list()
+        for i in xrange(0, min(self._check_jobs, queue.qsize())):
+            t = threading.Thread(target=self._self_check, args=(queue, results, lock))
+            workers.append(t)
+            t.start()
+        for t in workers:
+            t.join()
+
+        missing = list()
+        for cvs, cache, ret in results:
             # not change
             if ret == 0:
                 continue
@@ -94,6 +131,26 @@ class BrocObjectMaster(threading.Thread):
         #   print('(%s): %s' % (self._cache[k].pathname, self._cache[k].build))
 
 
+    def _self_check(self, queue, results, lock):
+        """
+        thread function of SelfCheck, fetch one cache from queue and check whether it has been modified
+        Args:
+            queue : the queue of (cvs path, BrocObject)
+            results : the list of (cvs path, BrocObject, return value of BrocObject.IsModified())
+            lock : the lock of results
+        """
+        while True:
+            try:
+                cvs, cache = queue.get_nowait()
+            except Queue.Empty:
+                break
+            if self._rehash:
+                cache.Rehash()
+            ret = cache.IsModified()
+            lock.acquire()
+            results.append((cvs, cache, ret))
+            lock.release()
+
     def IsModified(self, outpath):
         """
         whether a file has been modified since last build
@@ -110,27 +167,146 @@ class BrocObjectMaster(threading.Thread):
         Returns:
         """
         while True:
-            action, obj = self._queue.get()
+            try:
+                action, obj = self._queue.get(True, self._flush_interval)
+            except Queue.Empty:
+                self._flush_journal()
+                continue
             if action == 'check':
                 self._handle_check(obj)
                 continue
             elif action == 'update':
-                self._handle_update(obj)
+                self._handle_update(*obj)
                 continue
             elif action == 'check_done':     
                 self._handle_check_done()
                 continue
             elif action == 'stop':
+                self._flush_journal()
                 break
 
     def _handle_check(self, obj):
         """
         used by BrocObjectMaster thread
-        to check whether cache is changed
+        targets are checked together at check_done, after header files of new sources 
+        have been calculated in thread pool
         Args:
             obj : target.Target object
         """
-        self._check_target(obj)
+        self._targets.append(obj)
+
+    def _scan_headers(self):
+        """
+        calculate header files of sources not in cache or to build in thread pool, each one
+        only touches its source object, the dependency graph is modified in BrocObjectMaster 
+        thread later. The sources builtin scanner can't handle are calculated by compiler
+        with -MM -MG, the sources with the same compiler and include paths share one command
+        """
+        queue = Queue.Queue()
+        queued = dict()
+        for target in self._targets:
+            for source in target.Sources():
+                outfile = source.OutFile()
+                if outfile in queued:
+                    continue
+                if outfile in self._cache and not self._cache[outfile].Build():
+                    continue
+                queued[outfile] = source
+                queue.put(source)
+        self._run_pool(self._scan_worker, queue)
+
+        if not Builder.USE_INCLUDE_SCANNER:
+            return
+        failed = dict()
+        for outfile, source in queued.iteritems():
+            if not self._scanned.get(outfile):
+                failed[source.builder] = source
+        queue = Queue.Queue()
+        for batch in Builder.GroupHeaderBuilders(failed.keys()):
+            queue.put([(builder, failed[builder]) for builder in batch])
+        self._run_pool(self._batch_worker, queue)
+
+    def _run_pool(self, worker, queue):
+        """
+        run worker in check_jobs threads until queue is empty
+        Args:
+            worker : the thread function whose argument is queue
+            queue : the Queue object
+        """
+        workers = list()
+        for i in xrange(0, min(self._check_jobs, queue.qsize())):
+            t = threading.Thread(target=worker, args=(queue,))
+            workers.append(t)
+            t.start()
+        for t in workers:
+            t.join()
+
+    def _scan_worker(self, queue):
+        """
+        thread function of _scan_headers, fetch one source from queue and calculate its header files
+        Args:
+            queue : the queue of Source.Source object
+        """
+        while True:
+            try:
+                source = queue.get_nowait()
+            except Queue.Empty:
+                break
+            self._scanned[source.OutFile()] = self._calc_headers(source)
+
+    def _calc_headers(self, source):
+        """
+        calculate header files of source by builtin scanner, the error is logged and the header
+        files are regarded as unknown, so one bad source never stops the check stage
+        Args:
+            source : the Source.Source object
+        Returns:
+            return True if header files of source are known
+        """
+        try:
+            return source.CalcHeaderFiles(False)
+        except BaseException as err:
+            self._logger.LevPrint("WARNING", "calculate header files of %s failed(%s)"
+                                  % (source.InFile(), err))
+            return False
+
+    def _batch_worker(self, queue):
+        """
+        thread function of _scan_headers, fetch one batch from queue and calculate header files
+        of its sources by one compiler command
+        Args:
+            queue : the queue of list of (Builder.ObjBuilder object, Source.Source object)
+        """
+        while True:
+            try:
+                batch = queue.get_nowait()
+            except Queue.Empty:
+                break
+            try:
+                results = Builder.CalcHeaderFilesBatch(map(lambda x: x[0], batch))
+            except BaseException as err:
+                self._logger.LevPrint("WARNING", "calculate header files of %s failed(%s)"
+                                      % (", ".join(map(lambda x: x[1].InFile(), batch)), err))
+                continue
+            for (builder, source), result in zip(batch, results):
+                if result['ret']:
+                    source.SetHeaderFiles(result['headers'])
+                    self._scanned[source.OutFile()] = True
+                else:
+                    self._logger.LevPrint("WARNING", result['msg'])
+
+    def _scan(self, source):
+        """
+        calculate header files of source by builtin scanner, compiler is not run for it 
+        because the header files are harvested from depfile after compiling
+        Args:
+            source : the Source.Source object
+        Returns:
+            return True if header files of source are known
+        """
+        if source.OutFile() not in self._scanned:
+            self._scanned[source.OutFile()] = self._calc_headers(source)
+        return self._scanned[source.OutFile()]
 
     def _check_head_cache(self, pathname, source_cache):
         """
@@ -153,6 +329,54 @@ class BrocObjectMaster(threading.Thread):
         else:
             return False
 
+    def _link_headers(self, source, source_cache, last_headers):
+        """
+        replace the header caches source cache depends with the header files of source
+        Args:
+            source : the Source.Source object
+            source_cache : the BrocObject.SourceCache object
+            last_headers : the set of cvs paths of header files source cache depends now
+        Returns:
+            return True if some header file changed or is new
+        """
+        now_headers = source.GetHeaderFiles()
+        for f in last_headers - now_headers:
+            source_cache.DelDep(f)
+            self._cache[f].DelReverseDep(source_cache.Pathname())
+        ret = False
+        for f in now_headers:
+            # the header cache created for other sources is not depended by this one yet
+            if f in self._cache and f not in last_headers:
+                source_cache.AddDep(self._cache[f])
+                self._cache[f].AddReverseDep(source_cache)
+            if self._check_head_cache(f, source_cache):
+                ret = True
+        return ret
+
+    def _rescan_headers(self):
+        """
+        scan the sources set to build only because their header files changed again in thread pool,
+        the header files harvested from depfile of last build miss the ones newly included by
+        changed headers, and ArtifactKey() can't trust them
+        """
+        queue = Queue.Queue()
+        queued = dict()
+        for target in self._targets:
+            for source in target.Sources():
+                outfile = source.OutFile()
+                if outfile in queued or outfile in self._scanned or outfile not in self._cache:
+                    continue
+                if not self._cache[outfile].Build():
+                    continue
+                queued[outfile] = source
+                queue.put(source)
+        self._run_pool(self._scan_worker, queue)
+        for outfile, source in queued.iteritems():
+            source_cache = self._cache[outfile]
+            if self._scanned.get(outfile):
+                self._link_headers(source, source_cache, set(source_cache.deps))
+            source_cache.headers_known = bool(self._scanned.get(outfile))
+
     def _check_source_cache(self, source, target_cache):
         """
         to check source object's cache
@@ -162,8 +386,7 @@ class BrocObjectMaster(threading.Thread):
         """
         # source infile no exists in cache
         if source.OutFile() not in self._cache:
-            source.CalcHeaderFiles()
-            self._add_source_cache(source, target_cache)
+            self._add_source_cache(source, target_cache, self._scan(source))
             return True
 
         # check header files
@@ -171,35 +394,34 @@ class BrocObjectMaster(threading.Thread):
         last_headers = set(map(lambda x: x.Pathname(), source_cache.Deps()))
         # source file content changed
         if source_cache.Modified():
-            source_cache.UpdateBuildCmd(source.GetBuildCmd())
+            source_cache.UpdateBuildCmd(source.GetBuildCmd(), source.GetBuildArgv())
             source_cache.EnableBuild()
         else:
-            if source.GetBuildCmd() != source_cache.BuildCmd():
-                source_cache.UpdateBuildCmd(source.GetBuildCmd())
+            if source_cache.BuildCmdChanged(source.GetBuildCmd()):
                 source_cache.EnableBuild()
+            # build cmd is not saved in cache file, set it every time
+            source_cache.UpdateBuildCmd(source.GetBuildCmd(), source.GetBuildArgv())
+        # source file changed may include other header files, scan it again, otherwise
+        # header files are harvested from depfile after compiling
+        if source_cache.Build():
+            source_cache.headers_known = self._scan(source)
+        # the header files of last build are kept, but they can't be trusted by ArtifactKey()
+        # if scanning failed
+        if not source_cache.Build() or not source_cache.headers_known:
             source.SetHeaderFiles(last_headers)
-             
-        now_headers = source.GetHeaderFiles()
-        missing_headers = last_headers - now_headers
-        for f in missing_headers:
-            source_cache.DelDep(f)
-            self._cache[f].DelReverseDep(source_cache.Pathname())
 
         # check head files source object depended
-        ret = False
-        for f in source.GetHeaderFiles():
-            if self._check_head_cache(f, source_cache):
-                ret = True
+        ret = self._link_headers(source, source_cache, last_headers)
 
         # head files changed
         if ret:
-            self._cache[source.OutFile()].UpdateBuildCmd(source.GetBuildCmd())
+            self._cache[source.OutFile()].UpdateBuildCmd(source.GetBuildCmd(), source.GetBuildArgv())
             self._cache[source.OutFile()].EnableBuild()
             return ret
 
         # head files no changed, check itself
         if source_cache.IsChanged(source):
-            source_cache.UpdateBuildCmd(source.GetBuildCmd())
+            source_cache.UpdateBuildCmd(source.GetBuildCmd(), source.GetBuildArgv())
             source_cache.EnableBuild()
             return True
 
@@ -225,6 +447,11 @@ class BrocObjectMaster(threading.Thread):
             # self._logger.LevPrint("MSG", "Initialize target %s" % target.OutFile())
             target_cache.Initialize(target)
             target_cache.EnableBuild()
+        # build cmd is not saved in cache file, only its fingerprint is compared
+        cmd_changed = target_cache.BuildCmdChanged(target.GetBuildCmd())
+        if cmd_changed:
+            ret = True
+        target_cache.UpdateBuildCmd(target.GetBuildCmd(), target.GetBuildArgv())
 
         # 3. check all source object, remove uesless source cache
         #self._logger.LevPrint("MSG", "check target %s Source" % target.OutFile())
@@ -261,6 +488,11 @@ class BrocObjectMaster(threading.Thread):
 
         # if there is source or .a has changed, tareget need to rebuild
         if ret:
+            # target needs to rebuild only because its dependent files may change, the building
+            # is skipped if they are not changed after rebuilt, see TaskMaster
+            if not cmd_changed and last_sources == now_sources and last_libs == now_lib_files \
+                    and not target_cache.Build() and not target_cache.IsChanged(target):
+                target_cache.cutoff = True
             target_cache.EnableBuild()
             # self._logger.LevPrint("MSG", 'some deps change, target %s nee to rebuild' % target.OutFile())
             return True
@@ -292,15 +524,16 @@ class BrocObjectMaster(threading.Thread):
         self._cache[pathname].AddReverseDep(target_cache)
         target_cache.AddDep(self._cache[pathname]) 
 
-    def _add_source_cache(self, source, target_cache):
+    def _add_source_cache(self, source, target_cache, headers_known=True):
         """
         add a new source cache, and create header cache
         Args:
             source : the Source.Source object
             target_cache : the BrocObject object that dependeds on the source file
+            headers_known : whether header files of source are known
         """
         # self._logger.LevPrint('MSG', 'add source cache %s' % source.InFile())
-        source_cache = BrocObject.SourceCache(source)
+        source_cache = BrocObject.SourceCache(source, headers_known)
         self._cache[source.OutFile()] = source_cache
         source_cache.AddReverseDep(target_cache)
         target_cache.AddDep(source_cache)
@@ -340,7 +573,7 @@ class BrocObjectMaster(threading.Thread):
                 target_cache.AddDep(self._cache[source.OutFile()])
                 self._check_source_cache(source, target_cache)
             else:
-                self._add_source_cache(source, target_cache)
+                self._add_source_cache(source, target_cache, self._scan(source))
 
         # handle dependent lib cache
         for lib in target.Libs():
@@ -386,28 +619,50 @@ class BrocObjectMaster(threading.Thread):
 
     def _handle_check_done(self):
         """
-        find all changed cache whose type in [BROC_SOURCE, BROC_LIB, BROC_APP]
-        """
+        check all targets, and find all changed cache whose type in [BROC_SOURCE, BROC_LIB, BROC_APP]
+        """
+        self._scan_headers()
+        for target in self._targets:
+            self._check_target(target)
+        # caches changed in check stage only marked themselves, set their reversed dependent
+        # caches to build in one pass
+        BrocObject.PropagateBuild(filter(lambda x: x.notify, self._cache.values()))
+        self._rescan_headers()
+        self._targets = list()
+        self._scanned = dict()
         for k, cache in self._cache.iteritems():
             if not cache.IsBuilt() and cache.TYPE in [BrocObject.BrocObjectType.BROC_SOURCE,
                                                       BrocObject.BrocObjectType.BROC_LIB,
                                                       BrocObject.BrocObjectType.BROC_APP]:
+                # the cache loaded from cache file whose build cmd was not set in check stage,
+                # it belongs to a target no longer existing 
+                if cache.initialized and cache.BuildCmd() is None:
+                    continue
                 self._changed_cache.add(cache)
+        self._logger.LevPrint("MSG", "checking targets done, stat fingerprint hit %d, miss %d" 
+                              % (BrocObject.FINGERPRINT_STATS['hit'], 
+                                 BrocObject.FINGERPRINT_STATS['miss']))
+        # dependency relation may be changed in check stage, save a new snapshot
+        # and the journal records appended later are based on it
+        if self._changed_cache:
+            self._save_cache()
         self._event.set()
 
-    def UpdateCache(self, pathname):
+    def UpdateCache(self, pathname, headers=None):
         """
         update cache whose key is pathname, this method is used after build
         Args:
            pathname : the cvs path of file 
+           headers : the set of header files harvested from depfile of source file
         """
-        self._queue.put(('update', pathname))
+        self._queue.put(('update', (pathname, headers)))
 
-    def _handle_update(self, pathname):
+    def _handle_update(self, pathname, headers=None):
         """
         update cache whose key is pathname, this method is used after build
         Args:
            pathname : the cvs path of file 
+           headers : the set of header files harvested from depfile of source file
         """
         # self._logger.LevPrint("MSG", "save cache %s" % pathname)
         if pathname not in self._cache:
@@ -421,10 +676,47 @@ class BrocObjectMaster(threading.Thread):
             return
         else:
             # self._logger.LevPrint("MSG", "update cache %s, hash is %s" % (cache.Pathname(), cache.Hash()))
+            created = list()
+            if headers is not None and cache.TYPE == BrocObject.BrocObjectType.BROC_SOURCE:
+                created = self._set_headers(cache, headers, True)
             cache.Update()
-            # save cache into file 
+            # append cache into journal
             # self._logger.LevPrint("MSG", "save cache %s, id(%s), hash is %s, build %s" % (cache.Pathname(), id(cache), cache.Hash(), cache.build ))
-            self._save_cache()
+            self._append_journal(cache)
+            # the header caches created are restored after source cache when replaying journal
+            for header_cache in created:
+                self._append_journal(header_cache)
+            if len(self._pending) >= self._flush_count \
+               or time.time() - self._last_flush >= self._flush_interval:
+                self._flush_journal()
+
+    def _set_headers(self, source_cache, headers, initialized):
+        """
+        replace the header caches that source cache depends on
+        Args:
+            source_cache : the BrocObject.SourceCache object
+            headers : the set of cvs paths of header files
+            initialized : whether calculate hash of header caches created
+        Returns:
+            return the list of header caches created
+        """
+        pathname = source_cache.Pathname()
+        last_headers = set(source_cache.deps)
+        for f in last_headers - headers:
+            source_cache.DelDep(f)
+            if f in self._cache:
+                self._cache[f].DelReverseDep(pathname)
+        created = list()
+        for f in headers - last_headers:
+            if f not in self._cache:
+                header_cache = BrocObject.HeaderCache(f, initialized)
+                header_cache.DisableBuild()
+                self._cache[f] = header_cache
+                created.append(header_cache)
+            source_cache.AddDep(self._cache[f])
+            self._cache[f].AddReverseDep(source_cache)
+        source_cache.headers_known = True
+        return created
 
     def GetChangedCache(self):
         """
@@ -447,63 +739,278 @@ class BrocObjectMaster(threading.Thread):
         try:
             with open(self._cache_file, 'rb') as f:
                 caches = cPickle.load(f)
-                if caches[0] != self._version:
+                if caches[0] == 0.1:
+                    self._logger.LevPrint("MSG", "migrate cache version(%s) to %s" 
+                                          % (caches[0], self._version))
+                    self._migrate_cache(caches[1:])
+                elif caches[0] == 0.2:
+                    # the cache file of version 0.2 has no hash method, its hash method is MD5
+                    self._load_records(caches[1:])
+                    self._replay_journal()
+                    self._rehash = Function.HASH_METHOD != 'MD5'
+                elif caches[0] != self._version:
                     self._logger.LevPrint("MSG", "cache version(%s) no match system(%s)" 
                                           % (caches[0], self._version))
                 else:
-                    for cache in caches[1:]:
-                        self._cache[cache.Pathname()] = cache
-                        #self._logger.LevPrint("MSG", 'cache %s , %d hash is %s, build %s, Modified %s' % (cache.Pathname(), id(cache), cache.Hash(), cache.Build(), cache.Modified()))
+                    self._load_records(caches[2:])
+                    self._replay_journal()
+                    self._rehash = caches[1] != Function.HASH_METHOD
         except BaseException as err:
             self._logger.LevPrint("MSG", "load broc cache(%s) faild(%s), create a empty cache"
                                  % (self._cache_file, str(err)))
         self._logger.LevPrint("MSG", "loading cache success")
         self._logger.LevPrint("MSG", "checking cache ...")
         self.SelfCheck()
-        self._logger.LevPrint("MSG", "checking cache done")
+        self._logger.LevPrint("MSG", "checking cache done, stat fingerprint hit %d, miss %d" 
+                              % (BrocObject.FINGERPRINT_STATS['hit'], 
+                                 BrocObject.FINGERPRINT_STATS['miss']))
+
+    def _load_records(self, records):
+        """
+        create cache objects from records, and then restore the dependency relation
+        Args:
+            records : the list of tuple returned by BrocObject.Record()
+        """
+        for record in records:
+            cache = BrocObject.CreateFromRecord(record)
+            self._cache[cache.Pathname()] = cache
+        for record in records:
+            cache = self._cache[record[1]]
+            for pathname in record[7]:
+                if pathname in self._cache:
+                    cache.AddDep(self._cache[pathname])
+                    self._cache[pathname].AddReverseDep(cache)
+
+    def _migrate_cache(self, caches):
+        """
+        migrate caches of version 0.1, which were pickled BrocObject objects
+        Args:
+            caches : the list of BrocObject objects
+        """
+        for cache in caches:
+            self._cache[cache.Pathname()] = cache
+        # dependent caches of version 0.1 were kept in set
+        for cache in caches:
+            objs = [cache]
+            if cache.TYPE == BrocObject.BrocObjectType.BROC_SOURCE:
+                objs.append(cache.src_obj)
+            for obj in objs:
+                obj.deps = dict(map(lambda x: (x.Pathname(), x), obj.deps))
+                obj.reverse_deps = dict(map(lambda x: (x.Pathname(), x), obj.reverse_deps))
+            if cache.TYPE == BrocObject.BrocObjectType.BROC_SOURCE:
+                cache.headers_known = not cache.build
+
+    def _replay_journal(self):
+        """
+        apply the records of cache journal to the caches loaded from snapshot
+        the journal is a sequence of pickled records (cvs path, state, header files), a broken
+        record at the tail of journal means broc was killed when appending it, ignore it
+        """
+        if not os.path.exists(self._journal_file):
+            return
+        records = 0
+        with open(self._journal_file, 'rb') as f:
+            while True:
+                try:
+                    record = cPickle.load(f)
+                except EOFError:
+                    break
+                except BaseException as err:
+                    self._logger.LevPrint("WARNING", "ignore broken record of cache journal(%s): %s"
+                                          % (self._journal_file, str(err)))
+                    break
+                records += 1
+                pathname, state = record[:2]
+                if pathname not in self._cache:
+                    continue
+                # the records appended by old version have no header files
+                if len(record) > 2 and record[2] is not None:
+                    self._set_headers(self._cache[pathname], set(record[2]), False)
+                self._cache[pathname].Restore(state)
+        self._journal_records = records
+
+    def _append_journal(self, cache):
+        """
+        append the state of cache into pending records of journal, compact journal into snapshot 
+        when the number of records is larger than the number of caches
+        Args:
+            cache : the BrocObject object updated
+        """
+        if self._journal_records + len(self._pending) >= max(len(self._cache), 1024):
+            self._save_cache()
+            return
+        headers = None
+        if cache.TYPE == BrocObject.BrocObjectType.BROC_SOURCE:
+            headers = tuple(cache.deps)
+        self._pending.append((cache.Pathname(), cache.State(), headers))
+
+    def _flush_journal(self):
+        """
+        write pending records into journal and sync it to disk
+        """
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        try:
+            if self._journal is None:
+                Function.Mkdir(os.path.dirname(self._journal_file))
+                self._journal = open(self._journal_file, 'ab')
+            for record in self._pending:
+                cPickle.dump(record, self._journal, cPickle.HIGHEST_PROTOCOL)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal_records += len(self._pending)
+        except Exception as err:
+            self._logger.LevPrint("ERROR", "append cache journal(%s) failed(%s)" 
+                                  % (self._journal_file, str(err)))
+        self._pending = list()
+
+    def _close_journal(self):
+        """
+        close the file object of journal
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
 
     def _save_cache(self):
         """
         save cache objects into file
-        and content of file is a list and its format is [ version, cache, cache, ...].
-        the first item is cache version, and the 2th, 3th ... item is cache object
+        and content of file is a list and its format is [ version, hash method, record, record, ...].
+        the first item is cache version, the second item is the hash method of file content(Function.HASH_METHOD),
+        and the 3th, 4th ... item is the record of cache object, see BrocObject.Record()
+        the snapshot is written into a temporary file and renamed to cache file, so cache file
+        is always complete even if broc is killed. The snapshot contains all records of journal, 
+        so journal is truncated after saving, and the directory is synced before that to make
+        the rename durable
         """
         dir_name = os.path.dirname(self._cache_file)
         Function.Mkdir(dir_name)
+        tmp_file = self._cache_file + '.tmp'
         try:
-            caches = [self._version]
-            caches.extend(map(lambda x: self._cache[x], self._cache))
-            with open(self._cache_file, 'wb') as f:
-                cPickle.dump(caches, f)
+            caches = [self._version, Function.HASH_METHOD]
+            caches.extend(map(lambda x: x.Record(), self._cache.itervalues()))
+            with open(tmp_file, 'wb') as f:
+                cPickle.dump(caches, f, cPickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_file, self._cache_file)
+            self._sync_dir(dir_name)
         except Exception as err:
             self._logger.LevPrint("ERROR", "save cache(%s) failed(%s)" 
                                   % (self._cache_file, str(err)))
+            Function.DelFiles(tmp_file)
+            return
+        self._close_journal()
+        Function.DelFiles(self._journal_file)
+        self._journal_records = 0
+        self._pending = list()
+        self._last_flush = time.time()
 
-    def _dump(self, pathname, level):
+    def _sync_dir(self, dir_name):
         """
-        dump dependecy relationship into file, DFS
+        sync the entries of directory to disk, some file systems don't support it
+        Args:
+            dir_name : the path of directory
         """
-        if self._cache[pathname].build is True:
-            infos = "\t" * level + "[" + pathname + "]\n"          #need to build
-        else:
-            infos = "\t" * level + pathname + "\n"
-        self._dumped_str += infos
-        for deps_pathname in self._cache[pathname].deps:
-            self._dump(deps_pathname.Pathname(), level + 1)
+        try:
+            fd = os.open(dir_name or '.', os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def _roots(self):
+        """
+        return the sorted cvs paths of caches which no cache depends on,
+        they are applications or libs of main module
+        """
+        return sorted(pathname for pathname, cache in self._cache.iteritems()
+                      if not cache.reverse_deps)
 
-    def Dump(self):
+    def _dump_text(self, f):
         """
-        save dependency relation of files
+        write dependency tree into file by DFS from every root, the caches needing to build are
+        written in []. The dependent caches of a cache are written only at its first occurrence,
+        the later occurrences are followed by ...
+        Args:
+            f : the file object
+        """
+        dumped = set()
+        for root in self._roots():
+            stack = [(self._cache[root], 0)]
+            while stack:
+                cache, level = stack.pop()
+                name = cache.Pathname()
+                if cache.Build():
+                    name = "[%s]" % name
+                if cache.Pathname() in dumped:
+                    if cache.deps:
+                        name += " ..."
+                    f.write("%s%s\n" % ("\t" * level, name))
+                    continue
+                f.write("%s%s\n" % ("\t" * level, name))
+                dumped.add(cache.Pathname())
+                for pathname in sorted(cache.deps, reverse=True):
+                    stack.append((cache.deps[pathname], level + 1))
+
+    def _dump_json(self, f):
+        """
+        write every cache with its dependent cvs paths into file as a JSON list
+        Args:
+            f : the file object
+        """
+        f.write("[")
+        sep = "\n"
+        for pathname in sorted(self._cache.keys()):
+            cache = self._cache[pathname]
+            node = {'path' : pathname,
+                    'type' : TYPE_NAMES.get(cache.TYPE, 'unknown'),
+                    'build' : bool(cache.Build()),
+                    'deps' : sorted(cache.deps)}
+            f.write(sep + json.dumps(node, sort_keys=True))
+            sep = ",\n"
+        f.write("\n]\n")
+
+    def _dump_dot(self, f):
+        """
+        write dependency graph into file in DOT language of graphviz, the caches needing to
+        build are red
+        Args:
+            f : the file object
+        """
+        f.write("digraph broc {\n")
+        for pathname in sorted(self._cache.keys()):
+            cache = self._cache[pathname]
+            attrs = "shape=%s" % ("ellipse" if cache.TYPE == BrocObject.BrocObjectType.BROC_HEADER 
+                                  else "box")
+            if cache.Build():
+                attrs += ", color=red"
+            f.write("    %s [%s];\n" % (json.dumps(pathname), attrs))
+            for dep in sorted(cache.deps):
+                f.write("    %s -> %s;\n" % (json.dumps(pathname), json.dumps(dep)))
+        f.write("}\n")
+
+    def Dump(self, fmt='text'):
+        """
+        save dependency relation of files, it is written into file streamingly 
+        and every cache is written once
+        Args:
+            fmt : the format of file, text, json, dot or none, none means not saving
         """
+        if fmt == 'none':
+            return
         dumped_file = os.path.join(self._root, ".BROC.FILE.DEPS")
-        for pathname in self._cache:
-            # the length of reverse deps is 0 means it is application or libs of main module
-            if len(self._cache[pathname].reverse_deps) <= 0:
-                self._dump(pathname, 0)
+        if fmt != 'text':
+            dumped_file += '.' + fmt
+        writer = {'text' : self._dump_text,
+                  'json' : self._dump_json,
+                  'dot' : self._dump_dot}[fmt]
         try:
-            dir_name = os.path.dirname(dumped_file)
-            Function.Mkdir(dir_name)
+            Function.Mkdir(os.path.dirname(dumped_file))
             with open(dumped_file, "w") as f:
-                f.write("" + self._dumped_str)
+                writer(f)
         except IOError as err:
             self._logger.LevPrint("ERROR", "save file dependency failed(%s)" % err)
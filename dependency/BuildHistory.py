@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2016 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+the history of builds saved in SQLite database, including phase timings and the wall time,
+cpu time and peak RSS of every build task
+"""
+
+import os
+import sys
+import time
+import sqlite3
+
+broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, broc_dir)
+from util import Function
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    module TEXT,
+    start NUMERIC,
+    wall NUMERIC,
+    ok INTEGER
+);
+CREATE TABLE IF NOT EXISTS phases (
+    build INTEGER,
+    name TEXT,
+    seconds NUMERIC
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    build INTEGER,
+    pathname TEXT,
+    type INTEGER,
+    wall NUMERIC,
+    cpu NUMERIC,
+    max_rss INTEGER
+);
+CREATE INDEX IF NOT EXISTS tasks_build ON tasks (build);
+CREATE INDEX IF NOT EXISTS tasks_pathname ON tasks (pathname);
+"""
+
+
+class BuildHistory(object):
+    """
+    BuildHistory records one build in memory and writes it into database at Finish(),
+    only the latest MAX_BUILDS builds are kept
+    """
+    MAX_BUILDS = 100
+
+    def __init__(self, db_file, logger):
+        """
+        Args:
+            db_file : the path of database file
+            logger : the Log.Log() object
+        """
+        self._db_file = db_file
+        self._logger = logger
+        self._module = None
+        self._start = None
+        self._phases = list()       # [(phase name, seconds)]
+        self._tasks = list()        # [(cvs path, type, wall, cpu, max_rss)]
+
+    def _connect(self):
+        """
+        open database and create tables
+        """
+        Function.Mkdir(os.path.dirname(self._db_file))
+        db = sqlite3.connect(self._db_file)
+        db.text_factory = str
+        db.executescript(SCHEMA)
+        return db
+
+    def Start(self, module):
+        """
+        start recording a build
+        Args:
+            module : the cvs path of main module
+        """
+        self._module = module
+        self._start = time.time()
+        self._phases = list()
+        self._tasks = list()
+
+    def AddPhase(self, name, seconds):
+        """
+        record the timing of a build phase
+        Args:
+            name : the name of phase
+            seconds : the wall time of phase
+        """
+        self._phases.append((name, seconds))
+
+    def AddTask(self, pathname, _type, wall, usage):
+        """
+        record a build task
+        Args:
+            pathname : the cvs path of file built
+            _type : the type of BrocObject
+            wall : the wall time of task in seconds
+            usage : the resource usage returned by Function.RunCommandWithUsage(), may be None
+        """
+        usage = usage or dict()
+        self._tasks.append((pathname, _type, wall, usage.get('cpu'), usage.get('max_rss')))
+
+    def Finish(self, ok):
+        """
+        write the build recorded into database, and delete the old builds
+        Args:
+            ok : whether build successfully
+        """
+        if self._start is None:
+            return
+        try:
+            db = self._connect()
+            try:
+                with db:
+                    cursor = db.execute("INSERT INTO builds (module, start, wall, ok) "
+                                        "VALUES (?, ?, ?, ?)", (self._module, self._start,
+                                                                time.time() - self._start, ok))
+                    build = cursor.lastrowid
+                    db.executemany("INSERT INTO phases VALUES (?, ?, ?)",
+                                   [(build, name, seconds) for name, seconds in self._phases])
+                    db.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(build,) + task for task in self._tasks])
+                    oldest = build - self.MAX_BUILDS
+                    for table, column in [('builds', 'id'), ('phases', 'build'), ('tasks', 'build')]:
+                        db.execute("DELETE FROM %s WHERE %s <= ?" % (table, column), (oldest,))
+            finally:
+                db.close()
+        except sqlite3.Error as err:
+            self._logger.LevPrint("WARNING", "save build history(%s) failed(%s)"
+                                  % (self._db_file, err))
+        self._start = None
+
+    def Durations(self):
+        """
+        return the wall time of the latest build of every file
+        Returns:
+            return dict of {cvs path : seconds}
+        """
+        if not os.path.exists(self._db_file):
+            return dict()
+        try:
+            db = self._connect()
+            try:
+                rows = db.execute("SELECT pathname, wall FROM tasks WHERE rowid IN "
+                                  "(SELECT MAX(rowid) FROM tasks GROUP BY pathname)").fetchall()
+            finally:
+                db.close()
+        except sqlite3.Error as err:
+            self._logger.LevPrint("WARNING", "load build history(%s) failed(%s)"
+                                  % (self._db_file, err))
+            return dict()
+        return dict(rows)
+
+    def PeakRSS(self):
+        """
+        return the peak RSS of the latest build of every file whose resource usage is known
+        Returns:
+            return dict of {cvs path : peak RSS in KB}
+        """
+        if not os.path.exists(self._db_file):
+            return dict()
+        try:
+            db = self._connect()
+            try:
+                rows = db.execute("SELECT pathname, max_rss FROM tasks WHERE rowid IN "
+                                  "(SELECT MAX(rowid) FROM tasks WHERE max_rss IS NOT NULL "
+                                  "GROUP BY pathname)").fetchall()
+            finally:
+                db.close()
+        except sqlite3.Error as err:
+            self._logger.LevPrint("WARNING", "load build history(%s) failed(%s)"
+                                  % (self._db_file, err))
+            return dict()
+        return dict(rows)
+
+    def Builds(self, num):
+        """
+        return the latest builds
+        Args:
+            num : the number of builds
+        Returns:
+            return list of (id, module, start, wall, ok, [(phase name, seconds)]), the latest first
+        """
+        if not os.path.exists(self._db_file):
+            return list()
+        try:
+            db = self._connect()
+            try:
+                builds = list()
+                for row in db.execute("SELECT id, module, start, wall, ok FROM builds "
+                                      "ORDER BY id DESC LIMIT ?", (num,)).fetchall():
+                    phases = db.execute("SELECT name, seconds FROM phases WHERE build = ? "
+                                        "ORDER BY rowid", (row[0],)).fetchall()
+                    builds.append(tuple(row) + (phases,))
+                return builds
+            finally:
+                db.close()
+        except sqlite3.Error as err:
+            self._logger.LevPrint("WARNING", "load build history(%s) failed(%s)"
+                                  % (self._db_file, err))
+            return list()
+
+    def Slowest(self, types, builds, num):
+        """
+        return the files taking the longest average wall time in the latest builds
+        Args:
+            types : the list of types of BrocObject
+            builds : the number of latest builds
+            num : the number of files
+        Returns:
+            return list of (cvs path, times built, average wall, max wall, average cpu, max peak RSS)
+        """
+        if not os.path.exists(self._db_file):
+            return list()
+        try:
+            db = self._connect()
+            try:
+                return db.execute("SELECT pathname, COUNT(*), AVG(wall), MAX(wall), AVG(cpu), "
+                                  "MAX(max_rss) FROM tasks "
+                                  "WHERE build > (SELECT MAX(id) FROM builds) - ? AND type IN (%s) "
+                                  "GROUP BY pathname ORDER BY AVG(wall) DESC LIMIT ?"
+                                  % ", ".join("?" * len(types)),
+                                  [builds] + list(types) + [num]).fetchall()
+            finally:
+                db.close()
+        except sqlite3.Error as err:
+            self._logger.LevPrint("WARNING", "load build history(%s) failed(%s)"
+                                  % (self._db_file, err))
+            return list()
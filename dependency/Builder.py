@@ -13,10 +13,17 @@ Date:    2015-09-23 13:33:49
 """
 import os
 import sys
+import shlex
 broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, broc_dir)
 from util import Function
 from util import Log
+from dependency import IncludeScanner
+
+# calculate header files by IncludeScanner, otherwise by running compiler with -MM -MG
+USE_INCLUDE_SCANNER = True
+# the max number of source files in one -MM -MG command
+HEADER_BATCH_SIZE = 64
 
 class Builder(object):
     """
@@ -34,7 +41,8 @@ class Builder(object):
         self.obj_dir = os.path.dirname(obj)
         self.compiler = compiler
         self.workspace = workspace
-        self.build_cmd = None      # build cmd
+        self.build_cmd = None      # build cmd, for display and fingerprint of build cmd
+        self.build_argv = None     # the argument list of build cmd executed without shell
         self.error = "OK"
 
     def __str__(self):
@@ -48,6 +56,13 @@ class Builder(object):
         """
         return self.build_cmd
 
+    def GetBuildArgv(self):
+        """
+        return the argument list of build cmd, the directory of output file
+        is created before building, see TaskMaster
+        """
+        return self.build_argv
+
     def Error(self):
         """
         return the error message
@@ -55,6 +70,20 @@ class Builder(object):
         return self.error
 
 
+def _split_args(args):
+    """
+    split compiler, compile options or link options into arguments like shell
+    Args:
+        args : a list of strings, one string may contain many arguments
+    Returns:
+        return the list of arguments
+    """
+    argv = list()
+    for arg in args:
+        argv.extend(shlex.split(arg))
+    return argv
+
+
 class ObjBuilder(Builder):
     """
     object file(.o) builder
@@ -75,20 +104,33 @@ class ObjBuilder(Builder):
         self._opts = None
         self._infile = infile
         self._header_cmd = None
+        self._include_paths = list()
+        if opts:
+            self._include_paths.extend(map(lambda x: x[2:], 
+                                           filter(lambda x: x.startswith('-I') and len(x) > 2, opts)))
         if includes:
+            self._include_paths.extend(includes)
             self._includes += "\t".join(map(lambda x: "-I%s \\\n" % os.path.normpath(x), includes))
         if opts: 
             self._opts = " \\\n\t".join(map(lambda x: x, opts))
 
-        self.build_cmd = "mkdir -p %s && %s \\\n\t-c \\\n\t%s \\\n\t%s\t-o \\\n\t%s \\\n\t%s" % \
-                         (self.obj_dir, self.compiler, self._opts, self._includes, self.obj, infile)
+        # compiler writes header files into depfile(obj.d) when compiling, see BrocObject.SourceCache
+        self.build_cmd = "%s \\\n\t-c \\\n\t-MMD -MF %s.d \\\n\t%s \\\n\t%s\t-o \\\n\t%s \\\n\t%s" % \
+                         (self.compiler, self.obj, self._opts, self._includes, self.obj, infile)
+        self.build_argv = _split_args([self.compiler]) + ['-c', '-MMD', '-MF', self.obj + '.d'] \
+                          + _split_args(opts or []) \
+                          + map(lambda x: "-I%s" % os.path.normpath(x), includes or []) \
+                          + ['-o', self.obj, infile]
 
-        self._header_cmd = "%s \\\n\t-MM -MG\\\n\t%s\t%s" % \
-                            (self.compiler, self._includes, self._infile)
+        self._header_group = "%s \\\n\t-MM -MG\\\n\t%s" % (self.compiler, self._includes)
+        self._header_cmd = "%s\t%s" % (self._header_group, self._infile)
 
-    def CalcHeaderFiles(self):
+    def CalcHeaderFiles(self, fallback=True):
         """
         calculate the header files that source file dependends
+        Args:
+            fallback : whether running compiler with -MM -MG when IncludeScanner is disabled
+                       or can't handle the source file
         Returns:
             { ret : True | False, headers : set(), msg : 'error message' }
             calculate successfully ret is True; otherwise ret is False and msg contains error message
@@ -97,19 +139,44 @@ class ObjBuilder(Builder):
         result['ret'] = False
         result['headers'] = set()
         result['msg'] = ''
+        if USE_INCLUDE_SCANNER:
+            headers = IncludeScanner.INCLUDE_SCANNER.Scan(self._infile, self._include_paths,
+                                                          self.compiler, self.workspace)
+            # scanner can't handle computed #include, fall back to compiler
+            if headers is not None:
+                result['headers'] = headers
+                result['ret'] = True
+                return result
+        if not fallback:
+            result['msg'] = 'header files of %s are unknown' % self._infile
+            return result
+
         retcode, msg = Function.RunCommand(self._header_cmd, ignore_stderr_when_ok=True)
         if retcode != 0:
             result['msg'] = '%s:%s' % (msg, self._header_cmd)
             return result
 
-        files = msg.split()
+        return self.ParseHeaderRule(msg)
+
+    def ParseHeaderRule(self, rule):
+        """
+        parse the make rule printed by compiler with -MM -MG
+        Args:
+            rule : the make rule of source file
+        Returns:
+            { ret : True, headers : set(), msg : '' }
+        """
+        result = dict()
+        result['ret'] = True
+        result['headers'] = set()
+        result['msg'] = ''
+        files = rule.split()
         for f in files:
             if f.endswith(".h"):
                 if self.workspace in f:
                     result['headers'].add(f[len(self.workspace)+1:])
                 else:
                     result['headers'].add(f)
-        result['ret'] = True
         return result
 
     def GetHeaderCmd(self):
@@ -118,6 +185,85 @@ class ObjBuilder(Builder):
         """
         return self._header_cmd
 
+    def HeaderGroup(self):
+        """
+        return the -MM -MG command without source file, the source files having the same
+        group can be calculated by one command, see CalcHeaderFilesBatch()
+        """
+        return self._header_group
+
+    def InFile(self):
+        """
+        return the cvs path of source file
+        """
+        return self._infile
+
+
+def GroupHeaderBuilders(builders):
+    """
+    split ObjBuilder objects into batches, the builders in one batch have the same compiler
+    and include paths, and the size of batch is not larger than HEADER_BATCH_SIZE
+    Args:
+        builders : the list of ObjBuilder objects
+    Returns:
+        return the list of batches, a batch is a list of ObjBuilder objects
+    """
+    groups = dict()
+    batches = list()
+    for builder in builders:
+        group = groups.setdefault(builder.HeaderGroup(), list())
+        group.append(builder)
+        if len(group) >= HEADER_BATCH_SIZE:
+            batches.append(group)
+            groups[builder.HeaderGroup()] = list()
+    batches.extend(filter(None, groups.values()))
+    return batches
+
+
+def _split_header_rules(msg):
+    """
+    split the output of compiler with -MM -MG into make rules, one rule for each source file
+    """
+    rules = list()
+    for line in msg.replace("\\\n", " ").splitlines():
+        if not line.strip():
+            continue
+        if line.startswith((' ', '\t')) and rules:
+            rules[-1] += line
+        else:
+            rules.append(line)
+    return rules
+
+
+def CalcHeaderFilesBatch(builders):
+    """
+    calculate the header files of many source files by running compiler with -MM -MG once,
+    compiler prints one make rule for each source file in order of source files.
+    If the command failed, the header files of each source file are calculated one by one,
+    so that the failure is reported for the source file causing it
+    Args:
+        builders : the list of ObjBuilder objects having the same HeaderGroup()
+    Returns:
+        return the list of results of ObjBuilder.CalcHeaderFiles(), in order of builders
+    """
+    if len(builders) > 1:
+        cmd = "%s\t%s" % (builders[0].HeaderGroup(),
+                           " \\\n\t".join(map(lambda x: x.InFile(), builders)))
+        retcode, msg = Function.RunCommand(cmd, ignore_stderr_when_ok=True)
+        if retcode == 0:
+            rules = _split_header_rules(msg)
+            if len(rules) == len(builders):
+                return map(lambda x: x[0].ParseHeaderRule(x[1]), zip(builders, rules))
+    results = list()
+    for builder in builders:
+        retcode, msg = Function.RunCommand(builder.GetHeaderCmd(), ignore_stderr_when_ok=True)
+        if retcode != 0:
+            results.append({'ret' : False, 'headers' : set(),
+                            'msg' : '%s:%s' % (msg, builder.GetHeaderCmd())})
+        else:
+            results.append(builder.ParseHeaderRule(msg))
+    return results
+
 class LibBuilder(Builder):
     """
     static library builder
@@ -131,12 +277,14 @@ class LibBuilder(Builder):
             compiler : the abs path of compiler
         """
         Builder.__init__(self, obj, compiler, workspace)
-        self.build_cmd = "mkdir -p %s && %s \\\n\trcs \\\n\t%s" \
-                         % (self.obj_dir, self.compiler, self.obj)
+        self.build_cmd = "%s \\\n\trcs \\\n\t%s" % (self.compiler, self.obj)
+        self.build_argv = _split_args([self.compiler]) + ['rcs', self.obj]
         if dep_objs:
             self.build_cmd += " \\\n\t" + " \\\n\t".join(sorted(dep_objs))
+            self.build_argv.extend(sorted(dep_objs))
         if dep_libs:
             self.build_cmd += " \\\n\t" + " \\\n\t".join(sorted(dep_libs))
+            self.build_argv.extend(sorted(dep_libs))
 
 class BinBuilder(Builder):
     """
@@ -152,16 +300,20 @@ class BinBuilder(Builder):
             compiler : the abs path of compiler
         """
         Builder.__init__(self, obj, compiler, workspace)
-        # mkdir -p broc_out/et/tools/app/output/bin && g++ -DBROC -o broc_out/et/tools/app/output/bin/hello broc_out/et/tools/app/2_hello_hello.o -Xlinker "-(" broc_out/et/tools/app/output/lib/libperson.a /home/zss/zeus/protobuf/lib/libprotobuf.a  -Xlinker "-)"
-        self.build_cmd = "mkdir -p %s && %s \\\n\t-DBROC \\\n\t-o \\\n\t%s \\\n\t" \
-                         % (self.obj_dir, self.compiler, self.obj)
+        # g++ -DBROC -o broc_out/et/tools/app/output/bin/hello broc_out/et/tools/app/2_hello_hello.o -Xlinker "-(" broc_out/et/tools/app/output/lib/libperson.a /home/zss/zeus/protobuf/lib/libprotobuf.a  -Xlinker "-)"
+        self.build_cmd = "%s \\\n\t-DBROC \\\n\t-o \\\n\t%s \\\n\t" % (self.compiler, self.obj)
+        self.build_argv = _split_args([self.compiler]) + ['-DBROC', '-o', self.obj]
         if dep_objs:
             self.build_cmd += " \\\n\t".join(map(lambda x: x.strip(), sorted(dep_objs)))
+            self.build_argv.extend(map(lambda x: x.strip(), sorted(dep_objs)))
         if dep_links:
             self.build_cmd += " \\\n\t"
             self.build_cmd += " \\\n\t".join(map(lambda x: x.strip(), sorted(dep_links)))
+            self.build_argv.extend(_split_args(sorted(dep_links)))
         if dep_libs:
             self.build_cmd += " \\\n\t-Xlinker \\\n\t\"-(\" \\\n\t\t"
             self.build_cmd += " \\\n\t\t".join(map(lambda x: x.strip(), sorted(dep_libs)))
             self.build_cmd += " \\\n\t-Xlinker \\\n\t\"-)\""
+            self.build_argv.extend(['-Xlinker', '-('] + map(lambda x: x.strip(), sorted(dep_libs))
+                                   + ['-Xlinker', '-)'])
         #TODO Add WholeArchive 
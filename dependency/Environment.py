@@ -83,6 +83,7 @@ class Environment(object):
 
         # for tag PUBLISH
         self._publish_cmd = []
+        self._publish_dirs = set()  # the destination directories of PUBLISH
 
         self._sources = []
         self._targets = []
@@ -322,8 +323,15 @@ class Environment(object):
         srcs = src.split()
         for s in srcs:
             _src = os.path.normpath(os.path.join(self.BrocCVSDir(), s))
-            cmd = "mkdir -p %s && cp -rf %s %s" % (_dst, _src, _dst)
+            cmd = "cp -rf %s %s" % (_src, _dst)
             self._publish_cmd.append(cmd)
+        self._publish_dirs.add(_dst)
+
+    def PublishDirs(self):
+        """
+        return the set of destination directories of PUBLISH
+        """
+        return self._publish_dirs
 
     def AppendSource(self, v):
         """
@@ -354,6 +362,7 @@ class Environment(object):
         """
         do publish cmd
         """
+        Function.MakeDirs(self._publish_dirs)
         for cmd in self._publish_cmd:
             ret, msg = Function.RunCommand(cmd)
             if ret != 0:
@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2016 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+calculate the header files of source file by parsing #include directives, instead of
+running compiler with -MM -MG for every source file
+"""
+
+import os
+import re
+import sys
+import cPickle
+import threading
+
+broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, broc_dir)
+from util import Function
+
+INCLUDE_PATTERN = re.compile(r'^\s*#\s*include(_next)?\s*([<"])([^>"]+)[>"]')
+COMPUTED_PATTERN = re.compile(r'^\s*#\s*include(?:_next)?\s+[A-Za-z_]')
+C_EXTS = ('.c',)
+
+
+class IncludeScanner(object):
+    """
+    IncludeScanner follows #include directives like compiler with -MM -MG:
+    1. "file" is searched in the directory of including file, then in -I paths, <file> is
+       searched in -I paths only, both are searched in system directories at last
+    2. the headers found in system directories are omitted, and the headers included by them
+       are not scanned. -I paths which are system directories are treated as system directories
+    3. the headers which can't be found are regarded as generated files, they are returned as written
+    4. #include_next searches the -I paths after the one containing including file, then system
+       directories
+    All #include directives are followed even if they are in #if block, so the result may contain
+    more headers than compiler's. The parsed directives and the header files included by each
+    header are memoized and shared by all source files. The header files included by each header
+    can be saved into file and loaded by next build, see Load() and Save(), only the closures
+    used by the build are saved again, so the closures of removed headers and old search paths
+    are dropped.
+    Scan() is called by the threads of BrocObjectMaster, the memoized results of one header are
+    published after all of them are ready, and the saved closures are guarded by lock
+    """
+    VERSION = 0.3
+
+    def __init__(self):
+        """
+        """
+        self._directives = dict()   # {file path : [(quote, name, next)], None means computed #include}
+        self._resolved = dict()     # {(quote, name, dir, next, include paths, system dirs) : (kind, path)}
+        self._closures = dict()     # {(header path, include paths, system dirs) : frozenset or None}
+        self._lookups = dict()      # {(header path, include paths, system dirs) : {(quote, name, dir, next) : result}}
+        self._system_dirs = dict()  # {(compiler, language) : tuple of system directories or None}
+        self._exists = dict()       # {file path : whether file exists}
+        self._saved = dict()        # {(header path, fingerprint of search paths) : (members, lookups, frozenset)}
+        self._paths_fp = dict()     # {(include paths, system dirs) : fingerprint of search paths}
+        self._members = dict()      # {file path : (stat fingerprint, hash) of file, None if missing}
+        self._valid = dict()        # {file path : whether file not changed since saved}
+        self._used = set()          # the keys of saved closures reused or computed by this build
+        self._changed = False       # whether some closure is computed by this build
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock() # the lock of saved closures and statistics
+
+    def _count(self, name):
+        """
+        count hits or misses
+        """
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def Load(self, path):
+        """
+        load the header files included by each header saved by last build
+        Args:
+            path : the path of file
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = cPickle.load(f)
+            if data[0] == self.VERSION and data[1] == Function.HASH_METHOD:
+                self._saved = data[2]
+        except BaseException:
+            self._saved = dict()
+        self._used = set()
+        self._changed = False
+
+    def Save(self, path):
+        """
+        save the header files included by each header into file, the closures not used by this
+        build are dropped. The file is not rewritten if no closure is computed and all loaded
+        closures are reused, or nothing is scanned at all
+        Args:
+            path : the path of file
+        """
+        with self._lock:
+            if not self._used or (not self._changed and len(self._used) == len(self._saved)):
+                return
+            saved = dict((key, self._saved[key]) for key in self._used)
+        Function.Mkdir(os.path.dirname(path))
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                cPickle.dump([self.VERSION, Function.HASH_METHOD, saved], f,
+                             cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, path)
+        except BaseException:
+            Function.DelFiles(tmp)
+
+    def Stats(self):
+        """
+        return the statistics string of saved header closures
+        """
+        return "include scanner: %d saved closures hit, %d miss" % (self._hits, self._misses)
+
+    def _member(self, path):
+        """
+        return (stat fingerprint, hash) of file, None if file is missing
+        """
+        if path not in self._members:
+            try:
+                self._members[path] = (Function.GetFileFingerprint(path), Function.GetFileHash(path))
+            except BaseException:
+                self._members[path] = None
+        return self._members[path]
+
+    def _unchanged(self, path, saved):
+        """
+        whether file has not been changed since saved, the file whose stat fingerprint changed
+        is unchanged if its content hash is not changed
+        Args:
+            path : the path of file
+            saved : (stat fingerprint, hash) saved, None if file was missing
+        """
+        if path not in self._valid:
+            try:
+                fingerprint = Function.GetFileFingerprint(path)
+            except BaseException:
+                fingerprint = None
+            if saved is None or fingerprint is None:
+                self._valid[path] = saved is None and fingerprint is None
+            elif fingerprint == saved[0]:
+                self._valid[path] = True
+            else:
+                self._valid[path] = self._member(path)[1] == saved[1]
+        return self._valid[path]
+
+    def _load_closure(self, header, include_paths, system_dirs):
+        """
+        return the saved closure of header if header and all files included by it are unchanged,
+        and every #include directive in them still resolves to the same file, otherwise return None.
+        The latter catches generated headers and headers added into earlier search paths
+        """
+        key = (include_paths, system_dirs)
+        if key not in self._paths_fp:
+            self._paths_fp[key] = Function.CalcHash("\n".join(include_paths + ('',) + system_dirs))
+        saved_key = (header, self._paths_fp[key])
+        saved = self._saved.get(saved_key)
+        if saved is None:
+            return None
+        members, lookups, closure = saved
+        for path, state in members.iteritems():
+            if not self._unchanged(path, state):
+                return None
+        for (quote, name, cur_dir, _next), result in lookups.iteritems():
+            if self._resolve(quote, name, cur_dir, _next, include_paths, system_dirs) != result:
+                return None
+        self._lookups[(header, include_paths, system_dirs)] = lookups
+        with self._lock:
+            self._used.add(saved_key)
+        return closure
+
+    def _save_closure(self, header, include_paths, system_dirs, closure):
+        """
+        save closure of header with the states of header and all files included by it,
+        and the results of all #include directives in them
+        """
+        members = dict()
+        for path in closure | set([header]):
+            members[path] = self._member(path)
+        fp = self._paths_fp[(include_paths, system_dirs)]
+        lookups = self._lookups[(header, include_paths, system_dirs)]
+        with self._lock:
+            self._saved[(header, fp)] = (members, lookups, closure)
+            self._used.add((header, fp))
+            self._changed = True
+
+    def SystemDirs(self, compiler, language):
+        """
+        return the system include directories of compiler
+        Args:
+            compiler : the path of compiler
+            language : c or c++
+        Returns:
+            return tuple of directories, None if failed to ask compiler
+        """
+        key = (compiler, language)
+        if key not in self._system_dirs:
+            dirs = None
+            ret, msg = Function.RunCommand("%s -x%s -E -Wp,-v - < /dev/null" % (compiler, language))
+            if ret == 0 and '#include <...> search starts here:' in msg:
+                dirs = list()
+                lines = msg.split('#include <...> search starts here:')[1].splitlines()
+                for line in lines:
+                    if line.startswith('End of search list'):
+                        break
+                    if line.startswith(' '):
+                        dirs.append(os.path.realpath(line.strip()))
+                dirs = tuple(dirs)
+            self._system_dirs[key] = dirs
+        return self._system_dirs[key]
+
+    def _parse(self, path):
+        """
+        return the list of (quote, name, whether #include_next) of #include directives in file
+        Returns:
+            return None if file contains computed #include, like #include MACRO
+        """
+        if path not in self._directives:
+            directives = list()
+            try:
+                with open(path, 'r') as f:
+                    for line in f:
+                        if '#' not in line:
+                            continue
+                        m = INCLUDE_PATTERN.match(line)
+                        if m:
+                            directives.append((m.group(2), m.group(3), bool(m.group(1))))
+                        elif COMPUTED_PATTERN.match(line):
+                            directives = None
+                            break
+            except IOError:
+                pass
+            self._directives[path] = directives
+        return self._directives[path]
+
+    def _isfile(self, path):
+        """
+        memoized os.path.isfile
+        """
+        if path not in self._exists:
+            self._exists[path] = os.path.isfile(path)
+        return self._exists[path]
+
+    def _resolve(self, quote, name, cur_dir, _next, include_paths, system_dirs):
+        """
+        find the header file of #include directive
+        Args:
+            quote : " or <
+            name : the file name in directive
+            cur_dir : the directory of including file
+            _next : whether the directive is #include_next
+            include_paths : the tuple of -I paths
+            system_dirs : the tuple of system directories
+        Returns:
+            return ('user', path), ('system', path) or ('missing', name)
+        """
+        key = (quote, name, cur_dir, _next, include_paths, system_dirs)
+        if key not in self._resolved:
+            result = ('missing', name)
+            dirs = list(include_paths)
+            if _next:
+                # the including file is found in the first -I path containing it, if it is
+                # not found in -I paths, #include_next is handled as #include
+                for i, d in enumerate(include_paths):
+                    if (cur_dir + '/').startswith(d.rstrip('/') + '/') or d == '.':
+                        dirs = dirs[i + 1:]
+                        break
+                else:
+                    _next = False
+            if quote == '"' and not _next:
+                dirs.insert(0, cur_dir)
+            for d in dirs:
+                path = os.path.normpath(os.path.join(d, name))
+                if self._isfile(path):
+                    result = ('user', path)
+                    break
+            else:
+                for d in system_dirs:
+                    path = os.path.join(d, name)
+                    if self._isfile(path):
+                        result = ('system', path)
+                        break
+            self._resolved[key] = result
+        return self._resolved[key]
+
+    def _closure(self, header, include_paths, system_dirs):
+        """
+        return the frozenset of all headers included by header directly or indirectly,
+        None if some file contains computed #include
+        """
+        key = (header, include_paths, system_dirs)
+        if key in self._closures:
+            return self._closures[key]
+        closure = self._load_closure(header, include_paths, system_dirs)
+        if closure is not None:
+            self._count('_hits')
+            self._closures[key] = closure
+            return closure
+        self._count('_misses')
+        result = set()
+        lookups = dict()
+        visited = set([header])
+        stack = [header]
+        while stack:
+            path = stack.pop()
+            directives = self._parse(path)
+            if directives is None:
+                self._closures[key] = None
+                return None
+            for quote, name, _next in directives:
+                cur_dir = os.path.dirname(path)
+                kind, inc = self._resolve(quote, name, cur_dir, _next, include_paths, system_dirs)
+                lookups[(quote, name, cur_dir, _next)] = (kind, inc)
+                if kind == 'system':
+                    continue
+                result.add(inc)
+                if kind == 'missing' or inc in visited:
+                    continue
+                visited.add(inc)
+                closure = self._closures.get((inc, include_paths, system_dirs), False)
+                if closure is None:
+                    self._closures[key] = None
+                    return None
+                elif closure is False:
+                    stack.append(inc)
+                else:
+                    result.update(closure)
+                    visited.update(closure)
+                    lookups.update(self._lookups[(inc, include_paths, system_dirs)])
+        # lookups are published first, the threads finding the closure merge them
+        self._lookups[key] = lookups
+        self._closures[key] = frozenset(result)
+        self._save_closure(header, include_paths, system_dirs, self._closures[key])
+        return self._closures[key]
+
+    def Scan(self, infile, include_paths, compiler, workspace):
+        """
+        calculate the header files that source file depends
+        Args:
+            infile : the cvs path of source file
+            include_paths : the list of -I paths
+            compiler : the path of compiler
+            workspace : the abs path of workspace
+        Returns:
+            return set of header files, the header files in workspace are cvs paths.
+            return None if scanner can't handle it, and compiler should be used
+        """
+        language = 'c' if infile.endswith(C_EXTS) else 'c++'
+        system_dirs = self.SystemDirs(compiler, language)
+        if system_dirs is None:
+            return None
+        # -I path which is also system directory is ignored by compiler
+        paths = list()
+        for path in include_paths:
+            path = os.path.normpath(path)
+            if os.path.realpath(path) not in system_dirs and path not in paths:
+                paths.append(path)
+        include_paths = tuple(paths)
+
+        directives = self._parse(infile)
+        if directives is None:
+            return None
+        headers = set()
+        for quote, name, _next in directives:
+            kind, path = self._resolve(quote, name, os.path.dirname(infile), _next,
+                                       include_paths, system_dirs)
+            if kind == 'system':
+                continue
+            headers.add(path)
+            if kind == 'user':
+                closure = self._closure(path, include_paths, system_dirs)
+                if closure is None:
+                    return None
+                headers.update(closure)
+
+        result = set()
+        prefix = workspace.rstrip('/') + '/'
+        for header in headers:
+            if header.startswith(prefix):
+                header = header[len(prefix):]
+            result.add(header)
+        return result
+
+
+INCLUDE_SCANNER = IncludeScanner()
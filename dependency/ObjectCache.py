@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2016 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+content-addressed store of build results shared by all builds and workspaces
+"""
+
+import os
+import sys
+import time
+import shutil
+import threading
+
+broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, broc_dir)
+from util import Function
+
+SIZE_FILE = 'size'          # the file recording the size of store at last build
+
+
+class ObjectCache(object):
+    """
+    ObjectCache keeps build results in directory root, the path of result is root/key[:2]/key,
+    key is calculated by BrocObject.ArtifactKey(). The last access time of result is used to
+    evict the least recently used results when the size of store is larger than max_size.
+    Results are copied between store and workspaces, a hard link shared by workspaces would
+    change the ctime checked by their stat fingerprints whenever it is linked or touched
+    """
+    def __init__(self, root, max_size, logger):
+        """
+        Args:
+            root : the directory of store
+            max_size : the max size of store, in bytes
+            logger : the Log.Log() object
+        """
+        self._root = root
+        self._max_size = max_size
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._stored_size = 0
+
+    def _path(self, key):
+        """
+        return the path of result in store
+        """
+        return os.path.join(self._root, key[:2], key)
+
+    def _count(self, name):
+        """
+        count hits, misses or stores
+        """
+        self._lock.acquire()
+        setattr(self, name, getattr(self, name) + 1)
+        self._lock.release()
+
+    def Has(self, key):
+        """
+        return whether the result of key exists in store
+        """
+        return os.path.exists(self._path(key))
+
+    def Fetch(self, key, pathname):
+        """
+        install the result of key to pathname by copy
+        Args:
+            key : the key of result
+            pathname : the cvs path of result file
+        Returns:
+            return True if result exists in store and installed successfully
+        """
+        src = self._path(key)
+        if not os.path.exists(src):
+            self._count('_misses')
+            return False
+        Function.Mkdir(os.path.dirname(pathname))
+        tmp = "%s.%d.tmp" % (pathname, threading.current_thread().ident)
+        try:
+            shutil.copyfile(src, tmp)
+            os.rename(tmp, pathname)
+            # record the last access time for LRU eviction, result in store is never linked
+            os.utime(src, (time.time(), os.stat(src).st_mtime))
+        except BaseException as err:
+            self._logger.LevPrint("WARNING", "fetch %s from object cache failed(%s)" % (pathname, err))
+            Function.DelFiles(tmp)
+            self._count('_misses')
+            return False
+        self._count('_hits')
+        return True
+
+    def Store(self, key, pathname):
+        """
+        save result file into store
+        Args:
+            key : the key of result
+            pathname : the cvs path of result file
+        """
+        dst = self._path(key)
+        if os.path.exists(dst):
+            return
+        Function.Mkdir(os.path.dirname(dst))
+        tmp = "%s.%d.%d.tmp" % (dst, os.getpid(), threading.current_thread().ident)
+        try:
+            shutil.copyfile(pathname, tmp)
+            size = os.path.getsize(tmp)
+            os.rename(tmp, dst)
+        except BaseException as err:
+            self._logger.LevPrint("WARNING", "save %s into object cache failed(%s)" % (pathname, err))
+            Function.DelFiles(tmp)
+            return
+        self._lock.acquire()
+        self._stores += 1
+        self._stored_size += size
+        self._lock.release()
+
+    def _read_size(self):
+        """
+        return the size of store recorded by last build, None if unknown
+        """
+        try:
+            with open(os.path.join(self._root, SIZE_FILE)) as f:
+                return int(f.read())
+        except (IOError, ValueError):
+            return None
+
+    def _write_size(self, size):
+        """
+        record the size of store for next build
+        """
+        path = os.path.join(self._root, SIZE_FILE)
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            Function.Mkdir(self._root)
+            with open(tmp, 'w') as f:
+                f.write(str(size))
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            Function.DelFiles(tmp)
+
+    def Trim(self):
+        """
+        evict the least recently used results until the size of store is less than 90% of max size.
+        The store is only walked when the size recorded by last build plus the size stored by this
+        build is larger than max size, the temporary files of other builds are left alone
+        """
+        recorded = self._read_size()
+        if recorded is not None and recorded + self._stored_size <= self._max_size:
+            if self._stored_size:
+                self._write_size(recorded + self._stored_size)
+                self._stored_size = 0
+            return
+        files = list()
+        total = 0
+        for dir_path, _, names in os.walk(self._root):
+            for name in names:
+                if name.endswith('.tmp') or dir_path == self._root:
+                    continue
+                path = os.path.join(dir_path, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_atime, st.st_size, path))
+                total += st.st_size
+        if total > self._max_size:
+            files.sort()
+            limit = self._max_size * 0.9
+            evicted = 0
+            for _, size, path in files:
+                if total <= limit:
+                    break
+                Function.DelFiles(path)
+                total -= size
+                evicted += 1
+            self._logger.LevPrint("MSG", "evict %d files from object cache(%s)"
+                                  % (evicted, self._root))
+        self._write_size(total)
+        self._stored_size = 0
+
+    def Stats(self):
+        """
+        return the statistics string of object cache
+        """
+        fetches = self._hits + self._misses
+        rate = 0.0
+        if fetches:
+            rate = self._hits * 100.0 / fetches
+        return "object cache: %d hits, %d misses, hit rate %.1f%%, %d stored" \
+               % (self._hits, self._misses, rate, self._stores)
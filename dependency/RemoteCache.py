@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2016 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+client of remote content-addressed store of build results, the protocol is:
+    GET url/key : return 200 and the content of result, or 404 if result not exists
+    PUT url/key : save the content of result
+the header X-Broc-Digest carries md5 of content in both directions
+"""
+
+import os
+import sys
+import Queue
+import socket
+import hashlib
+import httplib
+import urlparse
+import threading
+
+broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, broc_dir)
+from util import Function
+
+DIGEST_HEADER = 'X-Broc-Digest'
+CHUNK_SIZE = 1024 * 1024
+
+
+class RemoteCache(object):
+    """
+    RemoteCache fetches and saves build results from http server by a pool of connections.
+    The downloaded result is written into a temporary file, it is renamed into the result file
+    only after its length and digest are verified, so partial downloads are never installed
+    """
+    def __init__(self, url, jobs, logger, timeout=30):
+        """
+        Args:
+            url : the url of remote cache, like http://host:port/prefix
+            jobs : the max number of connections, the number of prefetch threads too
+            logger : the Log.Log() object
+            timeout : the timeout in second of connection
+        """
+        parsed = urlparse.urlparse(url)
+        if parsed.scheme != 'http' or not parsed.hostname:
+            raise ValueError("invalid url of remote cache: %s" % url)
+        self._host = parsed.hostname
+        self._port = parsed.port or 80
+        self._prefix = parsed.path.rstrip('/')
+        self._jobs = max(jobs, 1)
+        self._logger = logger
+        self._timeout = timeout
+        self._pool = Queue.Queue()
+        self._lock = threading.Lock()
+        self._fetched = set()
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+        self._stores = 0
+
+    def _count(self, name):
+        """
+        count hits, misses, errors or stores
+        """
+        self._lock.acquire()
+        setattr(self, name, getattr(self, name) + 1)
+        self._lock.release()
+
+    def _acquire(self):
+        """
+        return an idle connection from pool, create a new one if pool is empty
+        """
+        try:
+            return self._pool.get_nowait()
+        except Queue.Empty:
+            return httplib.HTTPConnection(self._host, self._port, timeout=self._timeout)
+
+    def _release(self, conn):
+        """
+        put connection back to pool, the extra connections are closed
+        """
+        if self._pool.qsize() < self._jobs:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    def _request(self, method, key, body=None, headers=None):
+        """
+        send request and return the response, the connection reused from pool may be closed
+        by server, so request is retried once on a new connection
+        Args:
+            method : GET or PUT
+            key : the key of result
+            body : the content of request, string or file object read from the beginning
+            headers : the dict of request headers
+        Returns:
+            return (connection, response)
+        """
+        path = "%s/%s" % (self._prefix, key)
+        for retry in (True, False):
+            conn = self._acquire()
+            try:
+                if hasattr(body, 'seek'):
+                    body.seek(0)
+                conn.request(method, path, body, headers or dict())
+                return (conn, conn.getresponse())
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if not retry:
+                    raise
+
+    def Get(self, key, pathname):
+        """
+        download result of key and install it to pathname
+        Args:
+            key : the key of result
+            pathname : the cvs path of result file
+        Returns:
+            return True if result exists and installed successfully
+        """
+        tmp = "%s.%d.remote.tmp" % (pathname, threading.current_thread().ident)
+        try:
+            conn, response = self._request('GET', key)
+            if response.status != 200:
+                response.read()
+                self._release(conn)
+                self._count('_misses')
+                return False
+            length = int(response.getheader('Content-Length', -1))
+            digest = response.getheader(DIGEST_HEADER)
+            md5 = hashlib.md5()
+            size = 0
+            Function.Mkdir(os.path.dirname(pathname))
+            with open(tmp, 'wb') as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            if size != length or md5.hexdigest() != digest:
+                conn.close()
+                raise IOError("incomplete download(%d of %d bytes)" % (size, length))
+            self._release(conn)
+            os.rename(tmp, pathname)
+        except BaseException as err:
+            Function.DelFiles(tmp)
+            self._logger.LevPrint("WARNING", "fetch %s from remote cache failed(%s)"
+                                  % (pathname, err))
+            self._count('_errors')
+            return False
+        self._count('_hits')
+        return True
+
+    def Put(self, key, pathname):
+        """
+        upload result file to remote cache
+        Args:
+            key : the key of result
+            pathname : the cvs path of result file
+        Returns:
+            return True if uploaded successfully
+        """
+        try:
+            # result file is sent in chunks by httplib, the digest is calculated before sending
+            with open(pathname, 'rb') as f:
+                md5 = hashlib.md5()
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                headers = {DIGEST_HEADER : md5.hexdigest(),
+                           'Content-Type' : 'application/octet-stream',
+                           'Content-Length' : str(os.path.getsize(pathname))}
+                conn, response = self._request('PUT', key, f, headers)
+            response.read()
+            self._release(conn)
+            if response.status not in (200, 201, 204):
+                raise IOError("http status %d" % response.status)
+        except BaseException as err:
+            self._logger.LevPrint("WARNING", "save %s into remote cache failed(%s)"
+                                  % (pathname, err))
+            self._count('_errors')
+            return False
+        self._count('_stores')
+        return True
+
+    def _prefetch(self, queue):
+        """
+        the prefetch thread, download results in queue
+        Args:
+            queue : the Queue object of (key, pathname)
+        """
+        while True:
+            try:
+                key, pathname = queue.get_nowait()
+            except Queue.Empty:
+                return
+            if self.Get(key, pathname):
+                self._lock.acquire()
+                self._fetched.add(key)
+                self._lock.release()
+
+    def Prefetch(self, items):
+        """
+        download results in parallel before building
+        Args:
+            items : the list of (key, pathname)
+        """
+        if not items:
+            return
+        queue = Queue.Queue()
+        for item in items:
+            queue.put(item)
+        workers = list()
+        for i in xrange(0, min(self._jobs, len(items))):
+            worker = threading.Thread(target=self._prefetch, args=(queue,))
+            worker.setDaemon(True)
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        self._logger.LevPrint("MSG", "prefetch %d of %d files from remote cache"
+                              % (len(self._fetched), len(items)))
+
+    def Fetched(self, key):
+        """
+        return whether the result of key has been installed by Prefetch()
+        """
+        return key in self._fetched
+
+    def Stats(self):
+        """
+        return the statistics string of remote cache
+        """
+        return "remote cache: %d hits, %d misses, %d errors, %d stored" \
+               % (self._hits, self._misses, self._errors, self._stores)
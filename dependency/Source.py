@@ -92,6 +92,12 @@ class Source(object):
         """
         return self.builder.GetBuildCmd()
 
+    def GetBuildArgv(self):
+        """
+        return the argument list of build cmd
+        """
+        return self.builder.GetBuildArgv()
+
     def GetHeaderCmd(self):
         """
         return cmd for caulating head files
@@ -197,15 +203,17 @@ class Source(object):
         if not cflags_flag:
             self.cflags = self.env.CFlags().V()
 
-    def CalcHeaderFiles(self):
+    def CalcHeaderFiles(self, fallback=True):
         """
         calculate head file 
+        Args:
+            fallback : whether running compiler with -MM -MG when builtin scanner can't handle it
         Returns:
             True if caculate successfully
             False if failed to caculate
         """
         ret = True
-        res = self.builder.CalcHeaderFiles()
+        res = self.builder.CalcHeaderFiles(fallback)
         if not res['ret']:
             ret = False
         else:
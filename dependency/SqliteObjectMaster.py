@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2016 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+BrocObjectMaster whose caches are stored in SQLite database and loaded lazily
+"""
+
+import os
+import sys
+import time
+import sqlite3
+
+import BrocObject
+import BrocObjectMaster
+
+broc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, broc_dir)
+from util import Function
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    pathname TEXT PRIMARY KEY,
+    type INTEGER,
+    initialized INTEGER,
+    hash TEXT,
+    cmd_hash TEXT,
+    build INTEGER,
+    src_pathname TEXT,
+    src_hash TEXT,
+    src_build INTEGER
+);
+CREATE TABLE IF NOT EXISTS edges (
+    src TEXT,
+    dst TEXT,
+    PRIMARY KEY (src, dst)
+);
+CREATE INDEX IF NOT EXISTS edges_dst ON edges (dst);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    pathname TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime NUMERIC,
+    ino INTEGER,
+    ctime NUMERIC
+);
+"""
+
+
+def _normalize(record):
+    """
+    return the record whose dependent cvs paths are kept in frozenset, so records can be compared
+    """
+    return record[:7] + (frozenset(record[7]),) + record[8:]
+
+
+class LazyCache(dict):
+    """
+    dict of {cvs path : BrocObject}, the BrocObject object missing in dict is loaded by loader
+    """
+    def __init__(self, loader):
+        """
+        Args:
+            loader : the function loading BrocObject object of cvs path,
+                     it returns None if cvs path is not in database
+        """
+        dict.__init__(self)
+        self._loader = loader
+
+    def __missing__(self, key):
+        """
+        load BrocObject object when it is not in dict
+        """
+        obj = self._loader(key)
+        if obj is None:
+            raise KeyError(key)
+        return obj
+
+    def __contains__(self, key):
+        """
+        """
+        return dict.__contains__(self, key) or self._loader(key) is not None
+
+
+class SqliteObjectMaster(BrocObjectMaster.BrocObjectMaster):
+    """
+    the caches are saved in tables nodes, edges and fingerprints of SQLite database.
+    A cache is loaded with its dependent caches only when it is looked up, and checked
+    whether it has been modified at loading, so building one module in a huge workspace
+    only loads and writes the rows of that module
+    """
+    def __init__(self, cache_file, root, logger, check_jobs=Function.CHECK_JOBS):
+        """
+        Args:
+            cache_file : the path of database file
+            root : the root path of main module
+            logger : the Log.Log() object
+            check_jobs : the number of threads checking whether caches have been modified
+        """
+        BrocObjectMaster.BrocObjectMaster.__init__(self, cache_file, root, logger, check_jobs)
+        self._db = None
+        self._cache = LazyCache(self._load)
+        self._records = dict()      # {cvs path : record loaded from or saved into database}
+        self._absent = set()        # cvs paths not in database
+
+    def LoadCache(self):
+        """
+        open database, no cache is loaded until it is looked up. If hash method changed,
+        load and rehash all caches
+        """
+        self._logger.LevPrint("MSG", "opening cache(%s) ..." % self._cache_file)
+        Function.Mkdir(os.path.dirname(self._cache_file))
+        try:
+            self._open()
+        except sqlite3.Error as err:
+            self._logger.LevPrint("MSG", "open broc cache(%s) failed(%s), create a empty cache"
+                                  % (self._cache_file, str(err)))
+            Function.DelFiles(self._cache_file)
+            self._open()
+        self._rehash = self._meta('hash_method', Function.HASH_METHOD) != Function.HASH_METHOD
+        if self._rehash:
+            self._logger.LevPrint("MSG", "hash method changed, rehash all caches with %s"
+                                  % Function.HASH_METHOD)
+            for (pathname,) in self._db.execute("SELECT pathname FROM nodes").fetchall():
+                self._load(pathname)
+            self._save_cache()
+            self._rehash = False
+
+    def _open(self):
+        """
+        open database and create tables, the database of other version is cleared
+        """
+        self._db = sqlite3.connect(self._cache_file, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.executescript(SCHEMA)
+        version = self._meta('version', None)
+        if version is not None and float(version) != self._version:
+            self._logger.LevPrint("MSG", "cache version(%s) no match system(%s)"
+                                  % (version, self._version))
+            with self._db:
+                for table in ['meta', 'nodes', 'edges', 'fingerprints']:
+                    self._db.execute("DELETE FROM %s" % table)
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                             (str(self._version),))
+
+    def _meta(self, key, default):
+        """
+        return the value of key in table meta
+        """
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _fingerprint(self, pathname):
+        """
+        return the fingerprint of file saved in table fingerprints
+        """
+        row = self._db.execute("SELECT size, mtime, ino, ctime FROM fingerprints WHERE pathname = ?",
+                               (pathname,)).fetchone()
+        return tuple(row) if row else None
+
+    def _load(self, pathname):
+        """
+        load cache of pathname and its dependent caches from database, and check whether
+        cache has been modified like SelfCheck()
+        Args:
+            pathname : the cvs path of cache
+        Returns:
+            return the BrocObject object, None if pathname is not in database or its file is missing
+        """
+        if dict.__contains__(self._cache, pathname):
+            return dict.__getitem__(self._cache, pathname)
+        if pathname in self._absent or self._db is None:
+            return None
+        row = self._db.execute("SELECT type, initialized, hash, cmd_hash, build, "
+                               "src_pathname, src_hash, src_build FROM nodes WHERE pathname = ?",
+                               (pathname,)).fetchone()
+        if not row:
+            self._absent.add(pathname)
+            return None
+        deps = tuple(x[0] for x in self._db.execute("SELECT dst FROM edges WHERE src = ?",
+                                                     (pathname,)))
+        record = (row[0], pathname, bool(row[1]), row[2], self._fingerprint(pathname),
+                  row[3], bool(row[4]), deps)
+        if row[0] == BrocObject.BrocObjectType.BROC_SOURCE:
+            record += (row[5], row[6], self._fingerprint(row[5]), bool(row[7]))
+        cache = BrocObject.CreateFromRecord(record)
+
+        if self._rehash:
+            cache.Rehash()
+        ret = cache.IsModified()
+        if ret == -1:
+            # the file that cache representing is missing
+            self._delete(pathname)
+            return None
+        if ret == 1:
+            cache.EnableBuildNoReverse()
+        dict.__setitem__(self._cache, pathname, cache)
+        self._records[pathname] = _normalize(record)
+        for dep in deps:
+            if dep in self._cache:
+                cache.AddDep(self._cache[dep])
+                self._cache[dep].AddReverseDep(cache)
+        return cache
+
+    def _delete(self, pathname):
+        """
+        delete the rows of cache
+        """
+        with self._db:
+            self._db.execute("DELETE FROM nodes WHERE pathname = ?", (pathname,))
+            self._db.execute("DELETE FROM edges WHERE src = ?", (pathname,))
+            self._db.execute("DELETE FROM fingerprints WHERE pathname = ?", (pathname,))
+        self._records.pop(pathname, None)
+        self._absent.add(pathname)
+
+    def _write(self, record):
+        """
+        write a record into database, it must be called in a transaction.
+        If the content of file changed, the caches depending on it but not loaded are
+        marked to build by reverse dependency query
+        Args:
+            record : the tuple returned by BrocObject.Record()
+        """
+        record = _normalize(record)
+        old = self._records.get(record[1])
+        if old == record:
+            return
+        pathname = record[1]
+        src = record[8:] if len(record) > 8 else (None, None, None, False)
+        self._db.execute("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (pathname, record[0], record[2], record[3], record[5], record[6],
+                          src[0], src[1], src[3]))
+        for path, fingerprint in [(pathname, record[4]), (src[0], src[2])]:
+            if path is None:
+                continue
+            if fingerprint is None:
+                self._db.execute("DELETE FROM fingerprints WHERE pathname = ?", (path,))
+            else:
+                self._db.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                                 (path,) + tuple(fingerprint))
+        if old is None or old[7] != record[7]:
+            self._db.execute("DELETE FROM edges WHERE src = ?", (pathname,))
+            self._db.executemany("INSERT INTO edges VALUES (?, ?)",
+                                 [(pathname, dep) for dep in record[7]])
+        if old is None or old[3] != record[3]:
+            srcs = [x[0] for x in self._db.execute("SELECT src FROM edges WHERE dst = ?",
+                                                   (pathname,))]
+            self._db.executemany("UPDATE nodes SET build = 1 WHERE pathname = ?",
+                                 [(x,) for x in srcs if not dict.__contains__(self._cache, x)])
+        self._records[pathname] = record
+        self._absent.discard(pathname)
+
+    def _append_journal(self, cache):
+        """
+        append cache into pending caches, they are written into database by _flush_journal()
+        Args:
+            cache : the BrocObject object updated
+        """
+        self._pending.append(cache)
+
+    def _flush_journal(self):
+        """
+        write pending caches into database in one transaction
+        """
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        try:
+            with self._db:
+                for cache in self._pending:
+                    self._write(cache.Record())
+        except sqlite3.Error as err:
+            self._logger.LevPrint("ERROR", "update cache(%s) failed(%s)"
+                                  % (self._cache_file, str(err)))
+        self._pending = list()
+
+    def _close_journal(self):
+        """
+        close database
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _save_cache(self):
+        """
+        write all loaded caches whose records changed into database in one transaction
+        """
+        try:
+            with self._db:
+                for cache in self._cache.values():
+                    self._write(cache.Record())
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('hash_method', ?)",
+                                 (Function.HASH_METHOD,))
+        except sqlite3.Error as err:
+            self._logger.LevPrint("ERROR", "save cache(%s) failed(%s)"
+                                  % (self._cache_file, str(err)))
+        self._pending = list()
+        self._last_flush = time.time()
@@ -144,6 +144,12 @@ class Target(object):
         """
         return self.builder.GetBuildCmd()
 
+    def GetBuildArgv(self):
+        """
+        return the argument list of build cmd
+        """
+        return self.builder.GetBuildArgv()
+
     def Action(self):
         """
         parse all Source objects
@@ -291,7 +297,8 @@ class StaticLibrary(Target):
         root, _ = os.path.splitext(self.name)
         frm = os.path.join(self.env.ModuleCVSPath(), 'lib', 'lib%s%s' % (root, '.a'))
         to = os.path.join("broc_out", self.env.ModuleCVSPath(), 'output/lib')
-        cmd = "mkdir -p %(to)s && cp -Rp %(frm)s %(to)s" % (locals())
+        Function.Mkdir(to)
+        cmd = "cp -Rp %(frm)s %(to)s" % (locals())
         Log.Log().LevPrint('MSG', '[PreCopy] %s' % cmd)
         ret, msg = Function.RunCommand(cmd)
         if ret != 0:
@@ -360,7 +367,8 @@ class ProtoLibrary(object):
                                         self.env.BrocCVSDir(),
                                         normpath_proto[:pos]) 
             # the current working directory is $WORKSPACE
-            cmd = "mkdir -p %(out)s && %(protoc)s --cpp_out=%(cpp_out)s %(proto_flags)s %(cvs_dirs)s \
+            Function.Mkdir(out)
+            cmd = "%(protoc)s --cpp_out=%(cpp_out)s %(proto_flags)s %(cvs_dirs)s \
 -I=. %(protos)s" % (locals())
             self._proto_cmds.add(cmd)
 
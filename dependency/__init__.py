@@ -20,10 +20,15 @@ from dependency import BrocTree
 from dependency import PlanishUtil
 from dependency import Planish
 from dependency import BrocObjectMaster
+from dependency import SqliteObjectMaster
 from dependency import BrocObject
+from dependency import ObjectCache
+from dependency import RemoteCache
 from dependency import BrocTree
 from dependency import BrocConfig
 from dependency import Builder
+from dependency import IncludeScanner
+from dependency import BuildHistory
 from dependency import Syntax
 from dependency import Target
 from dependency import Environment
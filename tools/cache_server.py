@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2016 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+a small http server of remote cache for local testing, usage:
+    python cache_server.py [--port=8848] [--root=~/.broc/remote_cache]
+then build with broc build --remote-cache=http://localhost:8848
+"""
+
+import os
+import re
+import sys
+import getopt
+import hashlib
+import threading
+import SocketServer
+import BaseHTTPServer
+
+DIGEST_HEADER = 'X-Broc-Digest'
+KEY_PATTERN = re.compile(r'^[0-9a-zA-Z]+$')
+
+
+class CacheHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    handle GET and PUT of results, results are saved in root/key[:2]/key
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _path(self):
+        """
+        return the path of result in store, None if the key is invalid
+        """
+        key = self.path.rstrip('/').split('/')[-1]
+        if not KEY_PATTERN.match(key):
+            return None
+        return os.path.join(self.server.root, key[:2], key)
+
+    def _reply(self, status, body=''):
+        """
+        send a response without result
+        """
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """
+        send the content of result
+        """
+        path = self._path()
+        if path is None:
+            return self._reply(400, 'invalid key')
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except IOError:
+            return self._reply(404, 'not found')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header(DIGEST_HEADER, hashlib.md5(content).hexdigest())
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_PUT(self):
+        """
+        save the content of result, the content is discarded if its digest is wrong
+        """
+        path = self._path()
+        length = int(self.headers.getheader('Content-Length', 0))
+        content = self.rfile.read(length)
+        if path is None:
+            return self._reply(400, 'invalid key')
+        if len(content) != length \
+                or hashlib.md5(content).hexdigest() != self.headers.getheader(DIGEST_HEADER):
+            return self._reply(400, 'digest mismatch')
+        if not os.path.exists(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                pass
+        tmp = "%s.%d.tmp" % (path, threading.current_thread().ident)
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.rename(tmp, path)
+        self._reply(201)
+
+
+class CacheServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    handle every request in a thread
+    """
+    daemon_threads = True
+
+    def __init__(self, address, root):
+        """
+        Args:
+            address : the (host, port) tuple
+            root : the directory of store
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, address, CacheHandler)
+        self.root = root
+
+
+def main(argv):
+    """
+    parse arguments and run server
+    """
+    port = 8848
+    root = os.path.join(os.path.expanduser('~'), '.broc', 'remote_cache')
+    try:
+        opts, args = getopt.gnu_getopt(argv, "", ["port=", "root="])
+    except getopt.GetoptError as ex:
+        sys.stderr.write("%s\n" % ex)
+        return -1
+    for opt, arg in opts:
+        if opt == "--port":
+            port = int(arg)
+        if opt == "--root":
+            root = os.path.abspath(arg)
+    server = CacheServer(('', port), root)
+    sys.stdout.write("serving remote cache %s on port %d\n" % (root, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2015 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+test case for BrocObject
+"""
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+broc_path = os.path.realpath(os.path.join(os.path.realpath(__file__), '..', '..'))
+sys.path.insert(0, broc_path)
+from dependency import BrocObject
+from dependency import BrocObjectMaster
+from util import Function
+from util import Log
+
+class FakeSource(object):
+    """
+    the Source.Source object without BROC file
+    """
+    def __init__(self, infile, headers):
+        """
+        """
+        self._infile = infile
+        self._headers = headers
+
+    def InFile(self):
+        """
+        """
+        return self._infile
+
+    def OutFile(self):
+        """
+        """
+        return os.path.join('broc_out', self._infile + '.o')
+
+    def GetBuildCmd(self):
+        """
+        """
+        return 'g++ -c -o %s %s' % (self.OutFile(), self._infile)
+
+    def GetBuildArgv(self):
+        """
+        """
+        return self.GetBuildCmd().split()
+
+    def GetHeaderFiles(self):
+        """
+        """
+        return self._headers
+
+
+class TestBrocObject(unittest.TestCase):
+    """
+    unit test for BrocObject
+    """
+    def setUp(self):
+        """
+        """
+        self._cwd = os.getcwd()
+        self._tmp_dir = tempfile.mkdtemp()
+        os.chdir(self._tmp_dir)
+
+    def tearDown(self):
+        """
+        """
+        os.chdir(self._cwd)
+        Function.DelFiles(self._tmp_dir)
+
+    def test_Deps(self):
+        """
+        test adding and deleting dependent caches
+        """
+        header = BrocObject.HeaderCache('a.h', False)
+        source = BrocObject.SourceCache(FakeSource('a.cpp', set(['a.h'])))
+        source.AddDep(header)
+        source.AddDep(BrocObject.HeaderCache('a.h', False))
+        header.AddReverseDep(source)
+        header.AddReverseDep(source)
+        self.assertEqual(1, len(source.Deps()))
+        self.assertTrue(source.Deps()[0] is header)
+        self.assertEqual(1, len(header.ReverseDeps()))
+        source.DelDep('b.h')
+        source.DelDep('a.h')
+        header.DelReverseDep(source.Pathname())
+        self.assertEqual(0, len(source.Deps()))
+        self.assertEqual(0, len(header.ReverseDeps()))
+
+    def test_Fingerprint(self):
+        """
+        test skipping hash when stat fingerprint not changed
+        """
+        with open('a.h', 'wb') as f:
+            f.write('#define A 1\n')
+        header = BrocObject.HeaderCache('a.h')
+        header.DisableBuild()
+        self.assertEqual(Function.GetFileFingerprint('a.h'), header.fingerprint)
+        hit = BrocObject.FINGERPRINT_STATS['hit']
+        miss = BrocObject.FINGERPRINT_STATS['miss']
+        self.assertEqual(0, header.IsModified())
+        self.assertFalse(header.IsChanged())
+        self.assertEqual(hit + 2, BrocObject.FINGERPRINT_STATS['hit'])
+        self.assertEqual(miss, BrocObject.FINGERPRINT_STATS['miss'])
+        with open('a.h', 'wb') as f:
+            f.write('#define A 2\n')
+        self.assertTrue(header.IsChanged())
+        self.assertEqual(miss + 1, BrocObject.FINGERPRINT_STATS['miss'])
+
+    def test_ArtifactKey(self):
+        """
+        test the key of object file in object cache
+        """
+        with open('a.cpp', 'wb') as f:
+            f.write('#include "a.h"\n')
+        with open('a.h', 'wb') as f:
+            f.write('#define A 1\n')
+        source = BrocObject.SourceCache(FakeSource('a.cpp', set(['a.h'])))
+        header = BrocObject.HeaderCache('a.h', False)
+        source.AddDep(header)
+        # hash of header file is unknown
+        self.assertEqual(None, source.ArtifactKey())
+        header.Update()
+        key = source.ArtifactKey()
+        self.assertNotEqual(None, key)
+        self.assertEqual(key, source.ArtifactKey())
+        with open('a.h', 'wb') as f:
+            f.write('#define A 2\n')
+        header.Update()
+        self.assertNotEqual(key, source.ArtifactKey())
+        # missing header file is marked in key
+        key = source.ArtifactKey()
+        missing = BrocObject.HeaderCache('windows.h', False)
+        source.AddDep(missing)
+        self.assertNotEqual(None, source.ArtifactKey())
+        self.assertNotEqual(key, source.ArtifactKey())
+        key = source.ArtifactKey()
+        with open('windows.h', 'wb') as f:
+            f.write('#define WIN32 1\n')
+        self.assertEqual(None, source.ArtifactKey())
+        missing.Update()
+        self.assertNotEqual(key, source.ArtifactKey())
+
+    def test_DepHeaders(self):
+        """
+        test parsing depfile written by compiler
+        """
+        source = BrocObject.SourceCache(FakeSource('a.cpp', set()), False)
+        self.assertEqual(None, source.ArtifactKey())
+        self.assertEqual(None, source.DepHeaders())
+        Function.Mkdir('broc_out')
+        with open(source.DepFile(), 'wb') as f:
+            f.write('broc_out/a.cpp.o: a.cpp ./inc/a.h \\\n %s/inc/b.h inc/with\\ space.h\n' 
+                    % os.getcwd())
+        self.assertEqual(set(['inc/a.h', 'inc/b.h', 'inc/with space.h']), source.DepHeaders())
+
+    def test_HeaderFanOut(self):
+        """
+        benchmark of check stage, all source files include one header file
+        """
+        num = 20000
+        with open('config.h', 'wb') as f:
+            f.write('#define BROC 1\n')
+        master = BrocObjectMaster.BrocObjectMaster('broc.cache', self._tmp_dir, Log.Log())
+        target_cache = BrocObject.LibCache('libfoo.a', None, False)
+        master._cache['libfoo.a'] = target_cache
+        begin = time.time()
+        for i in xrange(0, num):
+            source = FakeSource('src_%d.cpp' % i, set(['config.h']))
+            master._add_source_cache(source, target_cache)
+        end = time.time()
+        Log.Log().LevPrint('MSG', 'add %d source caches including config.h in %.3fs'
+                           % (num, end - begin))
+        self.assertEqual(num, len(master._cache['config.h'].ReverseDeps()))
+        self.assertEqual(num, len(target_cache.Deps()))
+
+    def test_PropagateBuild(self):
+        """
+        benchmark of setting reversed dependent caches to build, every source file includes
+        all header files and every library is linked by all applications
+        """
+        headers = [BrocObject.HeaderCache('inc_%d.h' % i, False) for i in xrange(0, 50)]
+        libs = [BrocObject.LibCache('lib_%d.a' % i, None, False) for i in xrange(0, 20)]
+        apps = [BrocObject.LibCache('app_%d' % i, None, False) for i in xrange(0, 20)]
+        caches = headers + libs + apps
+        for i in xrange(0, 2000):
+            source = BrocObject.SourceCache(FakeSource('src_%d.cpp' % i, set()))
+            for header in headers:
+                source.AddDep(header)
+                header.AddReverseDep(source)
+            source.AddReverseDep(libs[i % len(libs)])
+            caches.append(source)
+        for lib in libs:
+            for app in apps:
+                lib.AddReverseDep(app)
+        for cache in caches:
+            cache.DisableBuild()
+        begin = time.time()
+        for header in headers:
+            header.EnableBuild()
+        self.assertFalse(libs[0].Build())
+        visited = BrocObject.PropagateBuild(filter(lambda x: x.notify, caches))
+        end = time.time()
+        Log.Log().LevPrint('MSG', 'set %d caches to build from %d header files in %.3fs'
+                           % (visited, len(headers), end - begin))
+        self.assertEqual(len(caches), visited)
+        self.assertEqual([], filter(lambda x: not x.Build() or x.notify, caches))
+
+    def test_DoBuild(self):
+        """
+        test running build cmd without shell
+        """
+        cache = BrocObject.BrocObject('out.txt', False)
+        # the argument list is not interpreted by shell
+        cache.UpdateBuildCmd('printf "%s" $HOME > out.txt', ['printf', '%s', '$HOME'])
+        result = cache.DoBuild()
+        self.assertTrue(result['ret'])
+        self.assertTrue(result['msg'].endswith('$HOME'))
+        self.assertFalse(os.path.exists('out.txt'))
+        self.assertTrue(result['usage']['cpu'] >= 0)
+        cache.UpdateBuildCmd('printf "%s" $HOME > out.txt')
+        self.assertTrue(cache.DoBuild()['ret'])
+        self.assertTrue(os.path.exists('out.txt'))
+        cache.UpdateBuildCmd('false', ['false'])
+        self.assertFalse(cache.DoBuild()['ret'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,583 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2015 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+test case for BrocObjectMaster
+"""
+
+import os
+import sys
+import json
+import time
+import cPickle
+import copy_reg
+import tempfile
+import unittest
+
+broc_path = os.path.realpath(os.path.join(os.path.realpath(__file__), '..', '..'))
+sys.path.insert(0, broc_path)
+from dependency import BrocObject
+from dependency import Builder
+from dependency import BrocObjectMaster
+from dependency import Target
+from util import Function
+from util import Log
+
+class FakeSource(object):
+    """
+    the Source.Source object whose header files are calculated slowly
+    """
+    def __init__(self, infile):
+        """
+        """
+        self._infile = infile
+        self._headers = set()
+
+    def InFile(self):
+        """
+        """
+        return self._infile
+
+    def OutFile(self):
+        """
+        """
+        return self._infile + '.o'
+
+    def GetBuildCmd(self):
+        """
+        """
+        return 'g++ -c -o %s %s' % (self.OutFile(), self._infile)
+
+    def GetBuildArgv(self):
+        """
+        """
+        return self.GetBuildCmd().split()
+
+    def CalcHeaderFiles(self, fallback=True):
+        """
+        """
+        time.sleep(0.2)
+        self._headers = set(['a.h'])
+        return True
+
+    def GetHeaderFiles(self):
+        """
+        """
+        return self._headers
+
+    def SetHeaderFiles(self, headers):
+        """
+        """
+        self._headers = headers
+
+
+class FakeLibrary(Target.StaticLibrary):
+    """
+    the Target.StaticLibrary object without BROC file
+    """
+    def __init__(self, outfile, sources):
+        """
+        """
+        self._outfile = outfile
+        self._sources = sources
+
+    def OutFile(self):
+        """
+        """
+        return self._outfile
+
+    def Sources(self):
+        """
+        """
+        return self._sources
+
+    def Objects(self):
+        """
+        """
+        return set(map(lambda x: x.OutFile(), self._sources))
+
+    def Libs(self):
+        """
+        """
+        return set()
+
+    def GetBuildCmd(self):
+        """
+        """
+        return 'ar rcs %s' % self._outfile
+
+    def GetBuildArgv(self):
+        """
+        """
+        return self.GetBuildCmd().split()
+
+
+class OldCache(object):
+    """
+    pickled like the BrocObject of cache version 0.1, whose __dict__ was saved
+    """
+    def __init__(self, cls, state):
+        """
+        Args:
+            cls : the cache class
+            state : the __dict__ of cache of version 0.1
+        """
+        self.cls = cls
+        self.state = state
+
+    def __reduce__(self):
+        """
+        """
+        return (copy_reg._reconstructor, (self.cls, object, None), self.state)
+
+
+class TestBrocObjectMaster(unittest.TestCase):
+    """
+    unit test for BrocObjectMaster
+    """
+    def setUp(self):
+        """
+        """
+        self._cwd = os.getcwd()
+        self._tmp_dir = tempfile.mkdtemp()
+        os.chdir(self._tmp_dir)
+        self._cache_file = os.path.join('broc_out', 'broc_cache', 'broc.cache')
+
+    def tearDown(self):
+        """
+        """
+        os.chdir(self._cwd)
+        Function.DelFiles(self._tmp_dir)
+
+    def test_Journal(self):
+        """
+        test replaying cache journal
+        """
+        with open('libfoo.a', 'wb') as f:
+            f.write('foo')
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master._cache['libfoo.a'] = BrocObject.LibCache('libfoo.a', None, False)
+        master._save_cache()
+        with open('libfoo.a', 'wb') as f:
+            f.write('foo bar')
+        master._handle_update('libfoo.a')
+        master._flush_journal()
+        master._close_journal()
+        self.assertTrue(os.path.exists(self._cache_file + '.journal'))
+
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        self.assertEqual(Function.GetFileHash('libfoo.a'), master._cache['libfoo.a'].Hash())
+        self.assertFalse(master._cache['libfoo.a'].Build())
+
+        # snapshot contains all records of journal
+        master._save_cache()
+        self.assertFalse(os.path.exists(self._cache_file + '.journal'))
+
+    def test_SaveCache(self):
+        """
+        test saving snapshot by renaming temporary file
+        """
+        with open('libfoo.a', 'wb') as f:
+            f.write('foo')
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master._cache['libfoo.a'] = BrocObject.LibCache('libfoo.a', None, False)
+        renames = list()
+        rename = os.rename
+        def _rename(src, dst):
+            renames.append((src, dst, os.path.exists(dst)))
+            rename(src, dst)
+        os.rename = _rename
+        try:
+            master._save_cache()
+            master._save_cache()
+        finally:
+            os.rename = rename
+        self.assertEqual([(self._cache_file + '.tmp', self._cache_file, False),
+                          (self._cache_file + '.tmp', self._cache_file, True)], renames)
+        self.assertFalse(os.path.exists(self._cache_file + '.tmp'))
+        # the old snapshot is kept when writing temporary file fails
+        master._cache['libbar.a'] = BrocObject.LibCache('libbar.a', None, False)
+        Function.Mkdir(self._cache_file + '.tmp')
+        master._save_cache()
+        self.assertFalse(os.path.exists(self._cache_file + '.tmp'))
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        self.assertEqual(['libfoo.a'], master._cache.keys())
+
+    def test_BrokenJournal(self):
+        """
+        test recovering the records before the broken one at the tail of journal
+        """
+        for name in ['libfoo.a', 'libbar.a']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master._cache['libfoo.a'] = BrocObject.LibCache('libfoo.a', None, False)
+        master._cache['libbar.a'] = BrocObject.LibCache('libbar.a', None, False)
+        master._save_cache()
+        master._handle_update('libfoo.a')
+        master._flush_journal()
+        size = os.path.getsize(self._cache_file + '.journal')
+        master._handle_update('libbar.a')
+        master._flush_journal()
+        master._close_journal()
+        # broc was killed when appending the second record
+        with open(self._cache_file + '.journal', 'rb+') as f:
+            f.truncate((size + os.path.getsize(self._cache_file + '.journal')) / 2)
+
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        self.assertEqual(1, master._journal_records)
+        self.assertFalse(master._cache['libfoo.a'].Build())
+        self.assertTrue(master._cache['libbar.a'].Build())
+
+    def test_Migrate(self):
+        """
+        test migrating the cache file of version 0.1
+        """
+        for name in ['a.h', 'a.cpp', 'a.o', 'libfoo.a']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        def _old(cls, pathname, build, build_cmd=''):
+            return OldCache(cls, {'pathname' : pathname, 'initialized' : True,
+                                  'deps' : set(), 'reverse_deps' : set(),
+                                  'hash' : Function.GetFileHash(pathname),
+                                  'modify_time' : os.path.getmtime(pathname),
+                                  'build_cmd' : build_cmd, 'build' : build, 'modified' : False})
+        header = _old(BrocObject.HeaderCache, 'a.h', False)
+        source = _old(BrocObject.SourceCache, 'a.o', False, 'g++ -c a.cpp -o a.o')
+        source.state['src_obj'] = _old(BrocObject.BrocObject, 'a.cpp', False)
+        lib = _old(BrocObject.LibCache, 'libfoo.a', True, 'ar rcs libfoo.a a.o')
+        for cache, dep in [(source, header), (lib, source)]:
+            cache.state['deps'].add(dep)
+            dep.state['reverse_deps'].add(cache)
+        Function.Mkdir(os.path.dirname(self._cache_file))
+        with open(self._cache_file, 'wb') as f:
+            cPickle.dump([0.1, header, source, lib], f)
+
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        self.assertEqual(set(['a.h', 'a.o', 'libfoo.a']), set(master._cache))
+        header = master._cache['a.h']
+        source = master._cache['a.o']
+        lib = master._cache['libfoo.a']
+        self.assertEqual(['a.h'], source.deps.keys())
+        self.assertTrue(source.deps['a.h'] is header)
+        self.assertEqual(['a.o'], header.reverse_deps.keys())
+        self.assertEqual(['a.o'], lib.deps.keys())
+        self.assertTrue(source.reverse_deps['libfoo.a'] is lib)
+        for cache in [header, source, source.src_obj, lib]:
+            self.assertEqual(Function.GetFileHash(cache.Pathname()), cache.Hash())
+        self.assertEqual(Function.CalcHash('g++ -c a.cpp -o a.o'), source.cmd_hash)
+        self.assertEqual(None, source.build_cmd)
+        self.assertEqual([False, False, True], [header.Build(), source.Build(), lib.Build()])
+        self.assertTrue(source.headers_known)
+        self.assertFalse(hasattr(source, '__dict__'))
+        # migrated caches are saved as records
+        master._save_cache()
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        self.assertEqual(['a.h'], master._cache['a.o'].deps.keys())
+        self.assertTrue(master._cache['libfoo.a'].Build())
+
+    def test_Records(self):
+        """
+        test saving and loading cache records
+        """
+        with open('libfoo.a', 'wb') as f:
+            f.write('foo')
+        with open('libbar.a', 'wb') as f:
+            f.write('bar')
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        foo = BrocObject.LibCache('libfoo.a', None, False)
+        bar = BrocObject.LibCache('libbar.a', None, False)
+        foo.AddDep(bar)
+        bar.AddReverseDep(foo)
+        master._cache['libfoo.a'] = foo
+        master._cache['libbar.a'] = bar
+        master._save_cache()
+
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        foo = master._cache['libfoo.a']
+        bar = master._cache['libbar.a']
+        self.assertEqual(['libbar.a'], map(lambda x: x.Pathname(), foo.Deps()))
+        self.assertEqual(['libfoo.a'], map(lambda x: x.Pathname(), bar.ReverseDeps()))
+        self.assertEqual(Function.GetFileHash('libbar.a'), bar.Hash())
+        self.assertFalse(hasattr(foo, '__dict__'))
+
+    def test_SelfCheck(self):
+        """
+        test checking caches in thread pool
+        """
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log(), 3)
+        for i in xrange(0, 10):
+            pathname = 'lib%d.a' % i
+            with open(pathname, 'wb') as f:
+                f.write(pathname)
+            master._cache[pathname] = BrocObject.LibCache(pathname, None, False)
+            master._cache[pathname].Update()
+        with open('lib1.a', 'wb') as f:
+            f.write('changed')
+        Function.DelFiles('lib2.a')
+        master.SelfCheck()
+        self.assertTrue(master._cache['lib1.a'].Build())
+        self.assertFalse('lib2.a' in master._cache)
+        self.assertEqual(9, len(master._cache))
+        self.assertEqual(1, len(filter(lambda x: x.Build(), master._cache.values())))
+
+    def test_Rehash(self):
+        """
+        test rehashing caches when hash method changed
+        """
+        with open('libfoo.a', 'wb') as f:
+            f.write('foo')
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master._cache['libfoo.a'] = BrocObject.LibCache('libfoo.a', None, False)
+        master._cache['libfoo.a'].Update()
+        master._save_cache()
+
+        Function.SetHashMethod('SHA1')
+        try:
+            master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+            master.LoadCache()
+            self.assertEqual(Function.GetFileHash('libfoo.a', 'SHA1'), 
+                             master._cache['libfoo.a'].Hash())
+            self.assertFalse(master._cache['libfoo.a'].Build())
+        finally:
+            Function.SetHashMethod('MD5')
+
+    def test_ScanHeaders(self):
+        """
+        test calculating header files of new sources in thread pool
+        """
+        with open('a.h', 'wb') as f:
+            f.write('#define A 1\n')
+        targets = list()
+        for i in xrange(0, 4):
+            sources = list()
+            for j in xrange(0, 2):
+                pathname = 'src_%d_%d.cpp' % (i, j)
+                with open(pathname, 'wb') as f:
+                    f.write('#include "a.h"\n')
+                sources.append(FakeSource(pathname))
+            targets.append(FakeLibrary('lib%d.a' % i, sources))
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log(), 8)
+        for target in targets:
+            master._handle_check(target)
+        begin = time.time()
+        master._handle_check_done()
+        self.assertTrue(time.time() - begin < 1.0)
+        self.assertEqual(8, len(master._cache['a.h'].ReverseDeps()))
+        self.assertEqual(8, len(filter(lambda x: x.TYPE == BrocObject.BrocObjectType.BROC_SOURCE,
+                                       master.GetChangedCache())))
+
+    def test_Cutoff(self):
+        """
+        test marking target which needs to rebuild only because its source files changed
+        """
+        for name in ['a.cpp', 'b.cpp', 'a.h', 'libfoo.a', 'a.cpp.o', 'b.cpp.o']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        target = FakeLibrary('libfoo.a', [FakeSource('a.cpp'), FakeSource('b.cpp')])
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master._handle_check(target)
+        master._handle_check_done()
+        self.assertFalse(master._cache['libfoo.a'].cutoff)
+        for pathname in ['a.cpp.o', 'b.cpp.o', 'libfoo.a']:
+            master._handle_update(pathname)
+        master._flush_journal()
+        master._close_journal()
+
+        with open('a.cpp', 'wb') as f:
+            f.write('changed')
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        master._handle_check(target)
+        master._handle_check_done()
+        self.assertTrue(master._cache['libfoo.a'].cutoff)
+        self.assertEqual(set(['a.cpp.o', 'libfoo.a']),
+                         set(map(lambda x: x.Pathname(), master.GetChangedCache())))
+
+    def test_ScanFailed(self):
+        """
+        test header files of last build are kept but not trusted if scanning changed source failed
+        """
+        for name in ['a.cpp', 'a.h', 'liba.a', 'a.cpp.o']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        source = FakeSource('a.cpp')
+        target = FakeLibrary('liba.a', [source])
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master._handle_check(target)
+        master._handle_check_done()
+        for pathname in ['a.cpp.o', 'liba.a']:
+            master._handle_update(pathname)
+        master._flush_journal()
+        master._close_journal()
+
+        with open('a.cpp', 'wb') as f:
+            f.write('changed')
+        source = FakeSource('a.cpp')
+        source.CalcHeaderFiles = lambda fallback=True: False
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        master._handle_check(FakeLibrary('liba.a', [source]))
+        # compiler is not run for the sources builtin scanner failed
+        use_scanner = Builder.USE_INCLUDE_SCANNER
+        Builder.USE_INCLUDE_SCANNER = False
+        try:
+            master._handle_check_done()
+        finally:
+            Builder.USE_INCLUDE_SCANNER = use_scanner
+        source_cache = master._cache['a.cpp.o']
+        self.assertTrue(source_cache.Build())
+        self.assertEqual(set(['a.h']), set(source_cache.deps))
+        self.assertFalse(source_cache.headers_known)
+        self.assertEqual(None, source_cache.ArtifactKey())
+
+    def test_HeaderChanged(self):
+        """
+        test scanning the source set to build only because its header file changed again
+        """
+        for name in ['a.cpp', 'a.h', 'b.h', 'liba.a', 'a.cpp.o']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master._handle_check(FakeLibrary('liba.a', [FakeSource('a.cpp')]))
+        master._handle_check_done()
+        for pathname in ['a.cpp.o', 'liba.a']:
+            master._handle_update(pathname)
+        master._flush_journal()
+        master._close_journal()
+
+        # a.h includes b.h now
+        with open('a.h', 'wb') as f:
+            f.write('#include "b.h"\n')
+        for ok in [True, False]:
+            source = FakeSource('a.cpp')
+            def _calc(fallback=True, source=source, ok=ok):
+                source._headers = set(['a.h', 'b.h'])
+                return ok
+            source.CalcHeaderFiles = _calc
+            master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+            master.LoadCache()
+            master._handle_check(FakeLibrary('liba.a', [source]))
+            use_scanner = Builder.USE_INCLUDE_SCANNER
+            Builder.USE_INCLUDE_SCANNER = False
+            try:
+                master._handle_check_done()
+            finally:
+                Builder.USE_INCLUDE_SCANNER = use_scanner
+            master._close_journal()
+            source_cache = master._cache['a.cpp.o']
+            self.assertTrue(source_cache.Build())
+            self.assertEqual(ok, source_cache.headers_known)
+            if ok:
+                self.assertEqual(set(['a.h', 'b.h']), set(source_cache.deps))
+                self.assertTrue(source_cache is master._cache['b.h'].ReverseDeps()[0])
+                self.assertNotEqual(None, source_cache.ArtifactKey())
+            else:
+                self.assertEqual(None, source_cache.ArtifactKey())
+
+    def test_ScanError(self):
+        """
+        test the error raised by scanning one source doesn't stop the check stage
+        """
+        for name in ['a.cpp', 'b.cpp', 'a.h']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        bad = FakeSource('b.cpp')
+        bad.CalcHeaderFiles = lambda fallback=True: 1 / 0
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master._handle_check(FakeLibrary('liba.a', [FakeSource('a.cpp'), bad]))
+        use_scanner = Builder.USE_INCLUDE_SCANNER
+        Builder.USE_INCLUDE_SCANNER = False
+        try:
+            master._handle_check_done()
+        finally:
+            Builder.USE_INCLUDE_SCANNER = use_scanner
+        self.assertTrue(master._event.is_set())
+        self.assertTrue(master._cache['a.cpp.o'].headers_known)
+        self.assertFalse(master._cache['b.cpp.o'].headers_known)
+
+    def test_Dump(self):
+        """
+        test saving dependency relation in text, json and dot
+        """
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        libfoo = BrocObject.LibCache('libfoo.a', None, False)
+        libbar = BrocObject.LibCache('libbar.a', None, False)
+        libbaz = BrocObject.LibCache('libbaz.a', None, False)
+        libbar.DisableBuild()
+        for lib in [libfoo, libbar, libbaz]:
+            master._cache[lib.Pathname()] = lib
+        for lib in [libfoo, libbaz]:
+            lib.AddDep(libbar)
+            libbar.AddReverseDep(lib)
+        for name in ['a.cpp', 'b.cpp']:
+            source = FakeSource(name)
+            source._headers = set(['a.h'])
+            master._add_source_cache(source, libbar)
+        master.Dump()
+        with open('.BROC.FILE.DEPS') as f:
+            self.assertEqual("[libbaz.a]\n\tlibbar.a\n\t\t[a.cpp.o]\n\t\t\t[a.h]\n"
+                             "\t\t[b.cpp.o]\n\t\t\t[a.h]\n[libfoo.a]\n\tlibbar.a ...\n", f.read())
+
+        master.Dump('json')
+        with open('.BROC.FILE.DEPS.json') as f:
+            nodes = json.load(f)
+        self.assertEqual(['a.cpp.o', 'a.h', 'b.cpp.o', 'libbar.a', 'libbaz.a', 'libfoo.a'],
+                         map(lambda x: x['path'], nodes))
+        self.assertEqual({'path' : 'libbar.a', 'type' : 'lib', 'build' : False,
+                          'deps' : ['a.cpp.o', 'b.cpp.o']}, nodes[3])
+
+        master.Dump('dot')
+        with open('.BROC.FILE.DEPS.dot') as f:
+            content = f.read()
+        self.assertTrue(content.startswith('digraph broc {\n'))
+        self.assertTrue('    "libfoo.a" -> "libbar.a";\n' in content)
+
+    def test_HarvestHeaders(self):
+        """
+        test replacing header caches with header files harvested from depfile
+        """
+        for name in ['a.cpp', 'a.h', 'b.h', 'c.h']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        target_cache = BrocObject.LibCache('liba.a', None, False)
+        master._cache['liba.a'] = target_cache
+        source = FakeSource('a.cpp')
+        source._headers = set(['a.h', 'b.h'])
+        master._add_source_cache(source, target_cache, False)
+        master._save_cache()
+        with open('a.cpp.o', 'wb') as f:
+            f.write('object')
+        master._handle_update('a.cpp.o', set(['b.h', 'c.h']))
+        master._flush_journal()
+        master._close_journal()
+        source_cache = master._cache['a.cpp.o']
+        self.assertEqual(set(['b.h', 'c.h']), set(source_cache.deps))
+        self.assertEqual(0, len(master._cache['a.h'].ReverseDeps()))
+        self.assertTrue(source_cache.headers_known)
+        self.assertEqual(Function.GetFileHash('c.h'), master._cache['c.h'].Hash())
+
+        # header caches are restored from journal
+        master = BrocObjectMaster.BrocObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        source_cache = master._cache['a.cpp.o']
+        self.assertEqual(set(['b.h', 'c.h']), set(source_cache.deps))
+        self.assertTrue(source_cache is master._cache['c.h'].ReverseDeps()[0])
+        self.assertEqual(Function.GetFileHash('c.h'), master._cache['c.h'].Hash())
+        self.assertFalse(master._cache['c.h'].Build())
+
+
+if __name__ == "__main__":
+    unittest.main()
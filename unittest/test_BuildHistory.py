@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2016 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+test case for BuildHistory
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+broc_path = os.path.realpath(os.path.join(os.path.realpath(__file__), '..', '..'))
+sys.path.insert(0, broc_path)
+from dependency import BuildHistory
+from dependency import BrocObject
+from util import Function
+from util import Log
+
+class TestBuildHistory(unittest.TestCase):
+    """
+    unit test for BuildHistory
+    """
+    def setUp(self):
+        """
+        """
+        self._tmp_dir = tempfile.mkdtemp()
+        self._db_file = os.path.join(self._tmp_dir, 'broc_out', 'broc_history.db')
+
+    def tearDown(self):
+        """
+        """
+        Function.DelFiles(self._tmp_dir)
+
+    def test_History(self):
+        """
+        test recording builds and querying the slowest files
+        """
+        source = BrocObject.BrocObjectType.BROC_SOURCE
+        lib = BrocObject.BrocObjectType.BROC_LIB
+        history = BuildHistory.BuildHistory(self._db_file, Log.Log())
+        self.assertEqual(dict(), history.Durations())
+        self.assertEqual([], history.Builds(10))
+        history.Start('baidu/broc')
+        history.AddPhase('planish', 0.5)
+        history.AddTask('a.o', source, 2.0, {'cpu' : 1.5, 'max_rss' : 1024})
+        history.AddTask('b.o', source, 1.0, None)
+        history.AddTask('libfoo.a', lib, 0.5, {'cpu' : 0.1, 'max_rss' : 512})
+        history.Finish(True)
+        history.Start('baidu/broc')
+        history.AddTask('a.o', source, 4.0, {'cpu' : 3.5, 'max_rss' : 2048})
+        history.Finish(False)
+
+        self.assertEqual({'a.o' : 4.0, 'b.o' : 1.0, 'libfoo.a' : 0.5}, history.Durations())
+        self.assertEqual({'a.o' : 2048, 'libfoo.a' : 512}, history.PeakRSS())
+        builds = history.Builds(10)
+        self.assertEqual([2, 1], map(lambda x: x[0], builds))
+        self.assertEqual([0, 1], map(lambda x: x[4], builds))
+        self.assertEqual([('planish', 0.5)], builds[1][5])
+        slowest = history.Slowest([source], 10, 10)
+        self.assertEqual([('a.o', 2, 3.0, 4.0, 2.5, 2048), ('b.o', 1, 1.0, 1.0, None, None)],
+                         slowest)
+        self.assertEqual(['a.o'], map(lambda x: x[0], history.Slowest([source], 1, 10)))
+        self.assertEqual(['libfoo.a'], map(lambda x: x[0], history.Slowest([lib], 10, 10)))
+
+    def test_Prune(self):
+        """
+        test deleting the old builds
+        """
+        history = BuildHistory.BuildHistory(self._db_file, Log.Log())
+        history.MAX_BUILDS = 3
+        for i in xrange(0, 5):
+            history.Start('baidu/broc')
+            history.AddTask('%d.o' % i, BrocObject.BrocObjectType.BROC_SOURCE, 1.0, None)
+            history.Finish(True)
+        self.assertEqual([5, 4, 3], map(lambda x: x[0], history.Builds(10)))
+        self.assertEqual(set(['2.o', '3.o', '4.o']), set(history.Durations()))
+
+    def test_Corrupt(self):
+        """
+        test reading corrupt build history
+        """
+        Function.Mkdir(os.path.dirname(self._db_file))
+        with open(self._db_file, 'wb') as f:
+            f.write('not a database' * 100)
+        history = BuildHistory.BuildHistory(self._db_file, Log.Log())
+        self.assertEqual([], history.Builds(10))
+        self.assertEqual([], history.Slowest([BrocObject.BrocObjectType.BROC_SOURCE], 10, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -42,12 +42,16 @@ class TestBuilder(unittest.TestCase):
         dep_libs = ['broc_out/a/b/d/output/lib/libfun.a', 'broc_out/a/b/d/output/lib/libutil.a']
         dep_links = ['-DBROC', '-Werror', '-Wpublick=private']
         compiler = '/usr/bin/g++'
-        right_cmd = "mkdir -p broc_out/a/b/c && /usr/bin/g++ \\\n\t-DBROC \\\n\t-o \
+        right_cmd = "/usr/bin/g++ \\\n\t-DBROC \\\n\t-o \
 \\\n\tbroc_out/a/b/c/test \\\n\ta/b/c/fun.o \\\n\ta/b/c/util.o \\\n\t-DBROC \\\n\t-Werror \
 \\\n\t-Wpublick=private \\\n\t-Xlinker \\\n\t\"-(\" \\\n\t\tbroc_out/a/b/d/output/lib/libfun.a \
 \\\n\t\tbroc_out/a/b/d/output/lib/libutil.a \\\n\t-Xlinker \\\n\t\"-)\""
         builder = Builder.BinBuilder(obj, dep_objs, dep_libs, dep_links, compiler, '.')          
         self.assertEqual(right_cmd, builder.GetBuildCmd()) 
+        self.assertEqual(['/usr/bin/g++', '-DBROC', '-o', 'broc_out/a/b/c/test', 'a/b/c/fun.o', 
+                          'a/b/c/util.o', '-DBROC', '-Werror', '-Wpublick=private', '-Xlinker', '-(',
+                          'broc_out/a/b/d/output/lib/libfun.a', 'broc_out/a/b/d/output/lib/libutil.a',
+                          '-Xlinker', '-)'], builder.GetBuildArgv())
 
     def test_LibBiilder(self):
         """
@@ -57,12 +61,15 @@ class TestBuilder(unittest.TestCase):
         dep_objs = ['a/b/c/fun.o', 'a/b/c/util.o']
         dep_libs = ['broc_out/a/b/d/output/lib/libfun.a', 'broc_out/a/b/d/output/lib/libutil.a']
         compiler = 'ar'
-        right_cmd = "mkdir -p broc_out/a/b/c && ar \\\n\trcs \\\n\tbroc_out/a/b/c/test \
+        right_cmd = "ar \\\n\trcs \\\n\tbroc_out/a/b/c/test \
 \\\n\ta/b/c/fun.o \\\n\ta/b/c/util.o \\\n\tbroc_out/a/b/d/output/lib/libfun.a \
 \\\n\tbroc_out/a/b/d/output/lib/libutil.a"
         builder = Builder.LibBuilder(obj, dep_objs, dep_libs, compiler, '.')          
 
         self.assertEqual(right_cmd, builder.GetBuildCmd()) 
+        self.assertEqual(['ar', 'rcs', 'broc_out/a/b/c/test'] + dep_objs + dep_libs, 
+                         builder.GetBuildArgv())
+
     def test_ObjBuilder(self):
         """
         test ObjBuilder
@@ -71,13 +78,18 @@ class TestBuilder(unittest.TestCase):
         obj = "broc_out/a/b/c/test.o"
         infile = 'a/b/c/test.cpp'
         includes = ['/usr/include', '/usr/local/include', 'a/b/c']
-        opts = ['-DBROC', '-DVERSION=1.0.0']
+        opts = ['-DBROC', '-DVERSION=1.0.0', '-DNAME=\\"broc\\" -g']
         compiler = '/usr/bin/g++'
         builder = Builder.ObjBuilder(obj, infile, includes, opts, compiler, now_dir)
-        right_cmd = "mkdir -p broc_out/a/b/c && /usr/bin/g++ \\\n\t-c \
-\\\n\t-DBROC \\\n\t-DVERSION=1.0.0 \\\n\t-I/usr/include \\\n\t-I/usr/local/include \
+        right_cmd = "/usr/bin/g++ \\\n\t-c \
+\\\n\t-MMD -MF broc_out/a/b/c/test.o.d \
+\\\n\t-DBROC \\\n\t-DVERSION=1.0.0 \\\n\t-DNAME=\\\"broc\\\" -g \\\n\t-I/usr/include \\\n\t-I/usr/local/include \
 \\\n\t-Ia/b/c \\\n\t-o \\\n\tbroc_out/a/b/c/test.o \\\n\ta/b/c/test.cpp"
         self.assertEqual(right_cmd, builder.GetBuildCmd())
+        self.assertEqual(['/usr/bin/g++', '-c', '-MMD', '-MF', 'broc_out/a/b/c/test.o.d', '-DBROC',
+                          '-DVERSION=1.0.0', '-DNAME="broc"', '-g', '-I/usr/include', 
+                          '-I/usr/local/include', '-Ia/b/c', '-o', 'broc_out/a/b/c/test.o', infile],
+                         builder.GetBuildArgv())
         builder.CalcHeaderFiles()
 
     def test_GetHeaderFiles(self):
@@ -123,7 +135,42 @@ int main()\n\
         Function.DelFiles('get_header_files.cpp')
         Function.DelFiles('hello.h')
         Function.DelFiles('world.h')
-        
+
+    def test_CalcHeaderFilesBatch(self):
+        """
+        test calculating header files of many sources by one command
+        """
+        now_dir = os.getcwd()
+        files = {'batch_a.h' : '#include "batch_b.h"\n',
+                 'batch_b.h' : '',
+                 'batch_a.cpp' : '#include "batch_a.h"\n',
+                 'batch_b.cpp' : '#include <stdio.h>\n#include "batch_b.h"\n#include "gen.h"\n',
+                 'batch_c.cpp' : '#include "batch_a.h"\n'}
+        for name, content in files.iteritems():
+            with open(name, 'wb') as f:
+                f.write(content)
+        builders = list()
+        for name in ['batch_a.cpp', 'batch_b.cpp', 'batch_c.cpp', 'batch_d.cpp']:
+            includes = ['/usr/include'] if name != 'batch_c.cpp' else []
+            builders.append(Builder.ObjBuilder(name + '.o', name, includes, None,
+                                               '/usr/bin/g++', now_dir))
+        batches = Builder.GroupHeaderBuilders(builders)
+        self.assertEqual(2, len(batches))
+        batches.sort(key=len)
+        self.assertEqual([builders[2]], batches[0])
+        self.assertEqual(builders[:2] + builders[3:], batches[1])
+
+        results = Builder.CalcHeaderFilesBatch(builders[:2])
+        self.assertEqual([True, True], map(lambda x: x['ret'], results))
+        self.assertEqual(set(['batch_a.h', 'batch_b.h']), results[0]['headers'])
+        self.assertEqual(set(['batch_b.h', 'gen.h']), results[1]['headers'])
+        # missing batch_d.cpp fails the command, the sources are calculated one by one
+        results = Builder.CalcHeaderFilesBatch(batches[1])
+        self.assertEqual([True, True, False], map(lambda x: x['ret'], results))
+        self.assertEqual(set(['batch_b.h', 'gen.h']), results[1]['headers'])
+        for name in files:
+            Function.DelFiles(name)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2015 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+test case for IncludeScanner
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+broc_path = os.path.realpath(os.path.join(os.path.realpath(__file__), '..', '..'))
+sys.path.insert(0, broc_path)
+from dependency import IncludeScanner
+from util import Function
+
+class TestIncludeScanner(unittest.TestCase):
+    """
+    unit test for IncludeScanner
+    """
+    def setUp(self):
+        """
+        """
+        self._cwd = os.getcwd()
+        self._tmp_dir = tempfile.mkdtemp()
+        os.chdir(self._tmp_dir)
+        self._files = {'sys/vector.h' : '#include "hidden.h"\n',
+                       'a/foo.cpp' : '#include <vector.h>\n'
+                                     '#include "foo.h"\n'
+                                     '#ifdef USE_BAR\n'
+                                     '#  include <bar/bar.h>\n'
+                                     '#endif\n',
+                       'a/foo.h' : '#include "bar/bar.h"\n#include "foo.h"\n',
+                       'inc/bar/bar.h' : '#include "baz.h"\n#include "gen.pb.h"\n',
+                       'inc/bar/baz.h' : '#include "bar/bar.h"\n',
+                       'a/macro.cpp' : '#include "foo.h"\n#include MACRO_H\n'}
+        for name, content in self._files.iteritems():
+            Function.Mkdir(os.path.dirname(name))
+            with open(name, 'wb') as f:
+                f.write(content)
+        self._scanner = IncludeScanner.IncludeScanner()
+        self._scanner._system_dirs[('g++', 'c++')] = (os.path.realpath('sys'),)
+
+    def tearDown(self):
+        """
+        """
+        os.chdir(self._cwd)
+        Function.DelFiles(self._tmp_dir)
+
+    def test_Scan(self):
+        """
+        test following #include directives
+        """
+        headers = self._scanner.Scan('a/foo.cpp', ['inc', 'sys'], 'g++', self._tmp_dir)
+        self.assertEqual(set(['a/foo.h', 'inc/bar/bar.h', 'inc/bar/baz.h', 'gen.pb.h']), headers)
+        # the headers of foo.h are memoized, -I path of system directory is ignored
+        with open('a/foo.h', 'wb') as f:
+            f.write('')
+        self.assertEqual(headers, self._scanner.Scan('a/foo.cpp', ['inc'], 'g++', self._tmp_dir))
+        # absolute path in workspace is returned as cvs path
+        headers = self._scanner.Scan('a/foo.cpp', [os.path.join(self._tmp_dir, 'inc')], 
+                                     'g++', self._tmp_dir)
+        self.assertTrue('inc/bar/bar.h' in headers)
+
+    def test_SaveLoad(self):
+        """
+        test reusing the header files included by each header saved by last build
+        """
+        headers = self._scanner.Scan('a/foo.cpp', ['inc'], 'g++', self._tmp_dir)
+        self._scanner.Save('include.cache')
+        # touching file without changing its content keeps saved closures
+        os.utime('inc/bar/baz.h', (0, 0))
+        scanner = IncludeScanner.IncludeScanner()
+        scanner._system_dirs[('g++', 'c++')] = (os.path.realpath('sys'),)
+        scanner.Load('include.cache')
+        self.assertEqual(headers, scanner.Scan('a/foo.cpp', ['inc'], 'g++', self._tmp_dir))
+        self.assertEqual((2, 0), (scanner._hits, scanner._misses))
+        # the closures containing changed header are invalidated
+        with open('inc/bar/baz.h', 'wb') as f:
+            f.write('#include "qux.h"\n')
+        scanner = IncludeScanner.IncludeScanner()
+        scanner._system_dirs[('g++', 'c++')] = (os.path.realpath('sys'),)
+        scanner.Load('include.cache')
+        self.assertEqual(set(['a/foo.h', 'inc/bar/bar.h', 'inc/bar/baz.h', 'gen.pb.h', 'qux.h']),
+                         scanner.Scan('a/foo.cpp', ['inc'], 'g++', self._tmp_dir))
+        # the closures of other search paths are not reused
+        scanner.Load('include.cache')
+        scanner._closures.clear()
+        self.assertTrue('inc/bar/bar.h' not in scanner.Scan('a/foo.cpp', [], 'g++', self._tmp_dir))
+
+    def test_SavePrune(self):
+        """
+        test only the closures used by last build are saved, and unchanged file is not rewritten
+        """
+        self._scanner.Scan('a/foo.cpp', ['inc'], 'g++', self._tmp_dir)
+        self._scanner.Save('include.cache')
+        self.assertEqual(2, len(self._scanner._saved))
+        # all closures reused, or nothing scanned
+        os.utime('include.cache', (0, 0))
+        scanner = IncludeScanner.IncludeScanner()
+        scanner._system_dirs[('g++', 'c++')] = (os.path.realpath('sys'),)
+        scanner.Load('include.cache')
+        scanner.Save('include.cache')
+        self.assertEqual(0, os.path.getmtime('include.cache'))
+        scanner.Scan('a/foo.cpp', ['inc'], 'g++', self._tmp_dir)
+        scanner.Save('include.cache')
+        self.assertEqual(0, os.path.getmtime('include.cache'))
+        # the closures of old search paths are dropped
+        scanner = IncludeScanner.IncludeScanner()
+        scanner._system_dirs[('g++', 'c++')] = (os.path.realpath('sys'),)
+        scanner.Load('include.cache')
+        scanner.Scan('a/foo.cpp', ['inc', 'gen'], 'g++', self._tmp_dir)
+        scanner.Save('include.cache')
+        scanner = IncludeScanner.IncludeScanner()
+        scanner.Load('include.cache')
+        self.assertEqual(2, len(scanner._saved))
+        self.assertEqual(set(['a/foo.h', 'inc/bar/bar.h']),
+                         set(map(lambda x: x[0], scanner._saved)))
+        self.assertEqual(1, len(set(map(lambda x: x[1], scanner._saved))))
+
+    def test_LoadNewHeaders(self):
+        """
+        test the saved closures are invalidated by headers appearing in earlier search paths
+        """
+        headers = self._scanner.Scan('a/foo.cpp', ['gen', 'inc'], 'g++', self._tmp_dir)
+        self.assertTrue('gen.pb.h' in headers)
+        self._scanner.Save('include.cache')
+        # generated header which was missing
+        Function.Mkdir('gen')
+        with open('gen/gen.pb.h', 'wb') as f:
+            f.write('#include "x.h"\n')
+        with open('gen/x.h', 'wb') as f:
+            f.write('')
+        scanner = IncludeScanner.IncludeScanner()
+        scanner._system_dirs[('g++', 'c++')] = (os.path.realpath('sys'),)
+        scanner.Load('include.cache')
+        headers = scanner.Scan('a/foo.cpp', ['gen', 'inc'], 'g++', self._tmp_dir)
+        self.assertEqual(set(['a/foo.h', 'inc/bar/bar.h', 'inc/bar/baz.h', 'gen/gen.pb.h', 'gen/x.h']),
+                         headers)
+        self.assertEqual(0, scanner._hits)
+        scanner.Save('include.cache')
+        # header shadowing the one found in later search path
+        Function.Mkdir('gen/bar')
+        with open('gen/bar/bar.h', 'wb') as f:
+            f.write('')
+        scanner = IncludeScanner.IncludeScanner()
+        scanner._system_dirs[('g++', 'c++')] = (os.path.realpath('sys'),)
+        scanner.Load('include.cache')
+        self.assertEqual(set(['a/foo.h', 'gen/bar/bar.h']),
+                         scanner.Scan('a/foo.cpp', ['gen', 'inc'], 'g++', self._tmp_dir))
+
+    def test_IncludeNext(self):
+        """
+        test #include_next searching the -I paths after the one containing including file
+        """
+        Function.Mkdir('wrap/bar')
+        with open('wrap/bar/bar.h', 'wb') as f:
+            f.write('#include_next <bar/bar.h>\n')
+        with open('a/next.cpp', 'wb') as f:
+            f.write('#include "bar/bar.h"\n')
+        self.assertEqual(set(['wrap/bar/bar.h', 'inc/bar/bar.h', 'inc/bar/baz.h', 'gen.pb.h']),
+                         self._scanner.Scan('a/next.cpp', ['wrap', 'inc'], 'g++', self._tmp_dir))
+        # the including file not found in -I paths is handled as #include
+        with open('a/next.h', 'wb') as f:
+            f.write('#include_next <bar/bar.h>\n')
+        with open('a/next.cpp', 'wb') as f:
+            f.write('#include "next.h"\n')
+        self._scanner = IncludeScanner.IncludeScanner()
+        self._scanner._system_dirs[('g++', 'c++')] = (os.path.realpath('sys'),)
+        self.assertEqual(set(['a/next.h', 'inc/bar/bar.h', 'inc/bar/baz.h', 'gen.pb.h']),
+                         self._scanner.Scan('a/next.cpp', ['inc'], 'g++', self._tmp_dir))
+
+    def test_Computed(self):
+        """
+        test falling back to compiler when #include is computed
+        """
+        self.assertEqual(None, self._scanner.Scan('a/macro.cpp', ['inc'], 'g++', self._tmp_dir))
+        self.assertEqual(None, self._scanner.Scan('a/macro.cpp', ['inc'], 'nocompiler', self._tmp_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
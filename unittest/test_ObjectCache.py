@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2015 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+test case for ObjectCache
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+broc_path = os.path.realpath(os.path.join(os.path.realpath(__file__), '..', '..'))
+sys.path.insert(0, broc_path)
+from dependency import ObjectCache
+from util import Function
+from util import Log
+
+class TestObjectCache(unittest.TestCase):
+    """
+    unit test for ObjectCache
+    """
+    def setUp(self):
+        """
+        """
+        self._cwd = os.getcwd()
+        self._tmp_dir = tempfile.mkdtemp()
+        os.chdir(self._tmp_dir)
+        self._root = os.path.join(self._tmp_dir, 'objcache')
+
+    def tearDown(self):
+        """
+        """
+        os.chdir(self._cwd)
+        Function.DelFiles(self._tmp_dir)
+
+    def test_FetchStore(self):
+        """
+        test saving object file into cache and installing it into another workspace
+        """
+        cache = ObjectCache.ObjectCache(self._root, 1024 * 1024, Log.Log())
+        Function.Mkdir('ws1')
+        with open('ws1/a.o', 'wb') as f:
+            f.write('object a')
+        self.assertFalse(cache.Fetch('abcdef', 'ws2/a.o'))
+        cache.Store('abcdef', 'ws1/a.o')
+        self.assertTrue(os.path.exists(os.path.join(self._root, 'ab', 'abcdef')))
+        self.assertTrue(cache.Fetch('abcdef', 'ws2/a.o'))
+        with open('ws2/a.o', 'rb') as f:
+            self.assertEqual('object a', f.read())
+        self.assertEqual(1, cache._hits)
+        self.assertEqual(1, cache._misses)
+        self.assertEqual(1, cache._stores)
+        # the results in workspaces are not shared with store
+        st = os.stat('ws1/a.o')
+        self.assertTrue(cache.Fetch('abcdef', 'ws3/a.o'))
+        self.assertEqual(st.st_ctime, os.stat('ws1/a.o').st_ctime)
+        self.assertEqual(1, os.stat('ws3/a.o').st_nlink)
+
+    def test_Trim(self):
+        """
+        test evicting the least recently used object files
+        """
+        cache = ObjectCache.ObjectCache(self._root, 250, Log.Log())
+        for i in xrange(0, 3):
+            pathname = '%d.o' % i
+            with open(pathname, 'wb') as f:
+                f.write('x' * 100)
+            key = 'key%d' % i
+            cache.Store(key, pathname)
+            os.utime(cache._path(key), (1000 + i, 1000 + i))
+        # the temporary file of other build is not counted or evicted
+        tmp = cache._path('key3') + '.1.2.tmp'
+        with open(tmp, 'wb') as f:
+            f.write('x' * 1000)
+        cache.Trim()
+        self.assertFalse(os.path.exists(cache._path('key0')))
+        self.assertTrue(os.path.exists(cache._path('key1')))
+        self.assertTrue(os.path.exists(cache._path('key2')))
+        self.assertTrue(os.path.exists(tmp))
+
+        # store is not walked until the size recorded plus the size stored is over max size
+        cache = ObjectCache.ObjectCache(self._root, 250, Log.Log())
+        Function.DelFiles(cache._path('key1'))
+        cache.Trim()
+        self.assertEqual(200, cache._read_size())
+        with open('3.o', 'wb') as f:
+            f.write('x' * 40)
+        cache.Store('key3', '3.o')
+        cache.Trim()
+        self.assertEqual(240, cache._read_size())
+        cache.Store('key4', '3.o')
+        cache.Trim()
+        self.assertEqual(180, cache._read_size())
+
+
+if __name__ == "__main__":
+    unittest.main()
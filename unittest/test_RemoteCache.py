@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2015 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+test case for RemoteCache
+"""
+
+import os
+import sys
+import socket
+import httplib
+import tempfile
+import threading
+import unittest
+
+broc_path = os.path.realpath(os.path.join(os.path.realpath(__file__), '..', '..'))
+sys.path.insert(0, broc_path)
+sys.path.insert(0, os.path.join(broc_path, 'tools'))
+import cache_server
+from dependency import RemoteCache
+from util import Function
+from util import Log
+
+class BrokenHandler(cache_server.CacheHandler):
+    """
+    send truncated content
+    """
+    def do_GET(self):
+        """
+        """
+        self.send_response(200)
+        self.send_header('Content-Length', '100')
+        self.send_header(RemoteCache.DIGEST_HEADER, '0' * 32)
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write('x' * 10)
+
+
+class TestRemoteCache(unittest.TestCase):
+    """
+    unit test for RemoteCache
+    """
+    def setUp(self):
+        """
+        """
+        self._cwd = os.getcwd()
+        self._tmp_dir = tempfile.mkdtemp()
+        os.chdir(self._tmp_dir)
+        self._server = cache_server.CacheServer(('127.0.0.1', 0), 
+                                                os.path.join(self._tmp_dir, 'store'))
+        self._url = 'http://127.0.0.1:%d/cache' % self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def tearDown(self):
+        """
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        os.chdir(self._cwd)
+        Function.DelFiles(self._tmp_dir)
+
+    def test_GetPut(self):
+        """
+        test uploading and downloading results
+        """
+        cache = RemoteCache.RemoteCache(self._url, 2, Log.Log())
+        with open('a.o', 'wb') as f:
+            f.write('object a')
+        self.assertFalse(cache.Get('abcdef', 'ws/a.o'))
+        self.assertTrue(cache.Put('abcdef', 'a.o'))
+        self.assertTrue(cache.Get('abcdef', 'ws/a.o'))
+        with open('ws/a.o', 'rb') as f:
+            self.assertEqual('object a', f.read())
+        self.assertEqual(['a.o'], os.listdir('ws'))
+
+        # large file is sent in chunks, and sent again when pooled connection failed
+        content = ''.join(chr(i % 251) for i in xrange(0, 3 * RemoteCache.CHUNK_SIZE + 7))
+        with open('b.o', 'wb') as f:
+            f.write(content)
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        cache._pool.put(httplib.HTTPConnection('127.0.0.1', sock.getsockname()[1]))
+        sock.close()
+        self.assertTrue(cache.Put('123456', 'b.o'))
+        self.assertTrue(cache.Get('123456', 'ws/b.o'))
+        with open('ws/b.o', 'rb') as f:
+            self.assertEqual(content, f.read())
+
+    def test_Prefetch(self):
+        """
+        test downloading results in parallel
+        """
+        cache = RemoteCache.RemoteCache(self._url, 3, Log.Log())
+        items = list()
+        for i in xrange(0, 10):
+            pathname = '%d.o' % i
+            with open(pathname, 'wb') as f:
+                f.write(pathname)
+            key = 'key%d' % i
+            if i % 2 == 0:
+                cache.Put(key, pathname)
+            items.append((key, os.path.join('ws', pathname)))
+        cache.Prefetch(items)
+        for i in xrange(0, 10):
+            self.assertEqual(i % 2 == 0, cache.Fetched('key%d' % i))
+            self.assertEqual(i % 2 == 0, os.path.exists(os.path.join('ws', '%d.o' % i)))
+
+    def test_Partial(self):
+        """
+        test partial download is not installed
+        """
+        self._server.RequestHandlerClass = BrokenHandler
+        cache = RemoteCache.RemoteCache(self._url, 1, Log.Log())
+        self.assertFalse(cache.Get('abcdef', 'ws/a.o'))
+        self.assertEqual([], os.listdir('ws'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2015 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+test case for SqliteObjectMaster
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+broc_path = os.path.realpath(os.path.join(os.path.realpath(__file__), '..', '..'))
+sys.path.insert(0, broc_path)
+from dependency import BrocObject
+from dependency import SqliteObjectMaster
+from util import Function
+from util import Log
+
+class TestSqliteObjectMaster(unittest.TestCase):
+    """
+    unit test for SqliteObjectMaster
+    """
+    def setUp(self):
+        """
+        """
+        self._cwd = os.getcwd()
+        self._tmp_dir = tempfile.mkdtemp()
+        os.chdir(self._tmp_dir)
+        self._cache_file = os.path.join('broc_out', 'broc_cache', 'broc.db')
+        for name in ['libfoo.a', 'libbar.a', 'libbaz.a']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        master = self._master()
+        foo = BrocObject.LibCache('libfoo.a', None, False)
+        bar = BrocObject.LibCache('libbar.a', None, False)
+        baz = BrocObject.LibCache('libbaz.a', None, False)
+        foo.AddDep(bar)
+        bar.AddReverseDep(foo)
+        for cache in [foo, bar, baz]:
+            cache.Update()
+            master._cache[cache.Pathname()] = cache
+        master._save_cache()
+        master._close_journal()
+
+    def tearDown(self):
+        """
+        """
+        os.chdir(self._cwd)
+        Function.DelFiles(self._tmp_dir)
+
+    def _master(self):
+        """
+        return a SqliteObjectMaster object opening database
+        """
+        master = SqliteObjectMaster.SqliteObjectMaster(self._cache_file, self._tmp_dir, Log.Log())
+        master.LoadCache()
+        return master
+
+    def test_Lazy(self):
+        """
+        test loading caches when they are looked up
+        """
+        master = self._master()
+        self.assertEqual(0, len(master._cache))
+        self.assertFalse(master.IsModified('libfoo.a'))
+        # dependent cache is loaded with cache
+        self.assertEqual(set(['libfoo.a', 'libbar.a']), set(master._cache.keys()))
+        self.assertTrue(master._cache['libbar.a'] is master._cache['libfoo.a'].Deps()[0])
+        self.assertEqual(Function.GetFileHash('libbar.a'), master._cache['libbar.a'].Hash())
+        self.assertTrue(master.IsModified('libnone.a'))
+        self.assertFalse('libnone.a' in master._cache)
+        # the cache of missing file is deleted
+        Function.DelFiles('libbaz.a')
+        self.assertFalse('libbaz.a' in master._cache)
+        master._close_journal()
+        master = self._master()
+        self.assertEqual(None, master._db.execute("SELECT * FROM nodes WHERE pathname = 'libbaz.a'")
+                                         .fetchone())
+
+    def test_Update(self):
+        """
+        test writing updated caches and marking unloaded reverse dependent caches
+        """
+        master = self._master()
+        self.assertTrue('libbar.a' in master._cache)
+        self.assertEqual(['libbar.a'], master._cache.keys())
+        with open('libbar.a', 'wb') as f:
+            f.write('changed')
+        master._handle_update('libbar.a')
+        master._flush_journal()
+        master._close_journal()
+
+        master = self._master()
+        self.assertFalse(master._cache['libbar.a'].Build())
+        self.assertEqual(Function.GetFileHash('libbar.a'), master._cache['libbar.a'].Hash())
+        self.assertTrue(master._cache['libfoo.a'].Build())
+        self.assertFalse(master._cache['libbaz.a'].Build())
+        master._close_journal()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -704,7 +704,7 @@ class TestSyntax(unittest.TestCase):
         os.chdir(now_dir)
         
         #check result
-        proto_cmd = """mkdir -p broc_out/baidu/broc && protoc \
+        proto_cmd = """protoc \
 --cpp_out=broc_out/baidu/broc  -I=baidu/broc \
 -I=. baidu/broc/*.proto\n"""
         self.assertEqual(' '.join(protos.__str__().split()), ' '.join(proto_cmd.split()))
@@ -733,14 +733,15 @@ class TestSyntax(unittest.TestCase):
         Syntax.PUBLISH("conf/a.conf", "$OUT/conf")
         dst = os.path.join(self._env.OutputPath(), "conf")
         src = os.path.join(self._module.module_cvspath, "conf/a.conf")
-        self.assertTrue("mkdir -p %s && cp -rf %s %s" % (dst, src, dst))
+        self.assertTrue("cp -rf %s %s" % (src, dst))
+        self.assertEqual(set([dst]), self._env.PublishDirs())
         
         #src has more files
         Syntax.PUBLISH("conf/a1.conf conf/a2.conf", "$OUT/conf")
         dst = os.path.join(self._env.OutputPath(), "conf")
         for s in "conf/a1.conf conf/a2.conf".split(' '):
             src = os.path.join(self._module.module_cvspath, s)
-            self.assertTrue("mkdir -p %s && cp -rf %s %s" % (dst, src, dst))
+            self.assertTrue("cp -rf %s %s" % (src, dst))
 
         #out_dir doesn't start with $OUT
         flag = False
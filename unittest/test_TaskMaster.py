@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+#
+# Copyright (c) 2016 Baidu.com, Inc. All Rights Reserved
+#
+################################################################################
+"""
+test case for TaskMaster
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+
+broc_path = os.path.realpath(os.path.join(os.path.realpath(__file__), '..', '..'))
+sys.path.insert(0, broc_path)
+sys.path.insert(0, os.path.join(broc_path, 'client'))
+import TaskMaster
+from dependency import BrocObject
+from util import Function
+
+SOURCE = BrocObject.BrocObjectType.BROC_SOURCE
+LIB = BrocObject.BrocObjectType.BROC_LIB
+APP = BrocObject.BrocObjectType.BROC_APP
+
+
+class FakeTask(object):
+    """
+    the BrocObject object whose building is only recorded
+    """
+    def __init__(self, pathname, _type, built, ok=True, content=None):
+        """
+        Args:
+            pathname : the path of file
+            _type : the type of BrocObject
+            built : the list of (path, pool of thread) of tasks built
+            ok : whether building successfully
+            content : the content of file written by building, None means not writing file
+        """
+        self.TYPE = _type
+        self.cutoff = False
+        self._pathname = pathname
+        self._built = built
+        self._ok = ok
+        self._content = content
+        self._deps = list()
+        self._reverse_deps = list()
+
+    def AddDep(self, dep):
+        """
+        """
+        self._deps.append(dep)
+        dep._reverse_deps.append(self)
+
+    def Pathname(self):
+        """
+        """
+        return self._pathname
+
+    def Deps(self):
+        """
+        """
+        return self._deps
+
+    def ReverseDeps(self):
+        """
+        """
+        return self._reverse_deps
+
+    def Build(self):
+        """
+        """
+        return True
+
+    def BuildCmd(self):
+        """
+        """
+        return 'build %s' % self._pathname
+
+    def Hash(self):
+        """
+        """
+        if self._content is None or not os.path.exists(self._pathname):
+            return None
+        return Function.GetFileHash(self._pathname)
+
+    def DepHeaders(self):
+        """
+        """
+        return None
+
+    def DoBuild(self):
+        """
+        """
+        self._built.append((self._pathname, threading.current_thread().Pool()))
+        if self._content is not None:
+            with open(self._pathname, 'wb') as f:
+                f.write(self._content)
+        if not self._ok:
+            return {'ret' : False, 'msg' : 'build %s failed' % self._pathname}
+        return {'ret' : True, 'msg' : ''}
+
+
+class FakeCacheMaster(object):
+    """
+    the BrocObjectMaster object recording caches updated
+    """
+    def __init__(self):
+        """
+        """
+        self.updated = list()
+
+    def UpdateCache(self, pathname, headers=None):
+        """
+        """
+        self.updated.append(pathname)
+
+
+class FakeHistory(object):
+    """
+    the BuildHistory object of last build
+    """
+    def __init__(self, durations, peak):
+        """
+        Args:
+            durations : the dict of {file path : seconds}
+            peak : the dict of {file path : peak RSS in KB}
+        """
+        self._durations = durations
+        self._peak = peak
+
+    def Durations(self):
+        """
+        """
+        return self._durations
+
+    def PeakRSS(self):
+        """
+        """
+        return self._peak
+
+    def AddTask(self, pathname, _type, wall, usage):
+        """
+        """
+        pass
+
+
+class FakeLogger(object):
+    """
+    the Log.Log object recording messages
+    """
+    def __init__(self):
+        """
+        """
+        self.messages = list()
+
+    def LevPrint(self, level, msg, prefix=True):
+        """
+        """
+        self.messages.append((level, msg))
+
+
+class TestTaskMaster(unittest.TestCase):
+    """
+    unit test for TaskMaster
+    """
+    def setUp(self):
+        """
+        """
+        self._cwd = os.getcwd()
+        self._tmp_dir = tempfile.mkdtemp()
+        os.chdir(self._tmp_dir)
+        self._built = list()
+        self._logger = FakeLogger()
+
+    def tearDown(self):
+        """
+        """
+        os.chdir(self._cwd)
+        Function.DelFiles(self._tmp_dir)
+
+    def _task(self, pathname, _type, ok=True, content=None):
+        """
+        create FakeTask recording into self._built
+        """
+        return FakeTask(pathname, _type, self._built, ok, content)
+
+    def test_Priority(self):
+        """
+        test queueing tasks on the longest critical path first
+        """
+        a_o = self._task('a.o', SOURCE)
+        b_o = self._task('b.o', SOURCE)
+        c_o = self._task('c.o', SOURCE)
+        liba = self._task('liba.a', LIB)
+        app = self._task('app', APP)
+        for obj in [a_o, b_o, c_o]:
+            liba.AddDep(obj)
+        app.AddDep(liba)
+        tasks = [a_o, b_o, c_o, liba, app]
+        master = TaskMaster.TaskMaster(1, FakeCacheMaster(), tasks, False, self._logger)
+        master._durations = {'a.o' : 1.0, 'b.o' : 3.0, 'liba.a' : 0.5}
+        master._calc_priority(dict(map(lambda x: (x.Pathname(), x), tasks)))
+        # c.o is estimated by the average of sources, app uses the default weight
+        self.assertEqual({'a.o' : 1.0, 'b.o' : 3.0, 'c.o' : 2.0, 'liba.a' : 0.5, 'app' : 1.0},
+                         master._estimated)
+        self.assertEqual({'a.o' : 2.5, 'b.o' : 4.5, 'c.o' : 3.5, 'liba.a' : 1.5, 'app' : 1.0},
+                         master._priority)
+        for obj in [a_o, b_o, c_o]:
+            master.AddTask(obj)
+        order = list()
+        while True:
+            task = master.FetchTask()
+            if not task:
+                break
+            order.append(task.Pathname())
+        self.assertEqual(['b.o', 'c.o', 'a.o'], order)
+
+    def test_KeepGoing(self):
+        """
+        test building the tasks not depending on failed tasks
+        """
+        a_o = self._task('a.o', SOURCE, False)
+        b_o = self._task('b.o', SOURCE)
+        c_o = self._task('c.o', SOURCE, False)
+        liba = self._task('liba.a', LIB)
+        libb = self._task('libb.a', LIB)
+        app = self._task('app', APP)
+        liba.AddDep(a_o)
+        libb.AddDep(b_o)
+        libb.AddDep(c_o)
+        app.AddDep(liba)
+        tasks = [a_o, b_o, c_o, liba, libb, app]
+        master = TaskMaster.TaskMaster(2, FakeCacheMaster(), tasks, False, self._logger,
+                                       keep_going=True)
+        master.Start()
+        self.assertFalse(master.BuildOK())
+        self.assertEqual(set(['a.o', 'b.o', 'c.o']), set(map(lambda x: x[0], self._built)))
+        self.assertEqual(3, master._blocked)
+        errors = map(lambda x: x[1], filter(lambda x: x[0] == 'ERROR', self._logger.messages))
+        self.assertTrue('build a.o failed' in errors)
+        self.assertTrue('build c.o failed' in errors)
+        summary = filter(lambda x: 'tasks failed' in x, errors)[0]
+        self.assertTrue(summary.startswith('2 tasks failed: '))
+        self.assertTrue('a.o' in summary and 'c.o' in summary)
+        self.assertTrue('3 tasks not built, their dependent files failed' in errors)
+
+        # all tasks are stopped after the first failure without keep going
+        del self._built[:]
+        a_o = self._task('a.o', SOURCE, False)
+        liba = self._task('liba.a', LIB)
+        liba.AddDep(a_o)
+        master = TaskMaster.TaskMaster(1, FakeCacheMaster(), [a_o, liba], False, self._logger)
+        master.Start()
+        self.assertFalse(master.BuildOK())
+        self.assertEqual([('a.o', 'compile')], self._built)
+
+    def test_Cutoff(self):
+        """
+        test skipping the task whose rebuilt dependent files are not changed
+        """
+        for name in ['a.o', 'b.o']:
+            with open(name, 'wb') as f:
+                f.write(name)
+        # (content of a.o, content of b.o, whether a.o built successfully, libx.a built)
+        for a_content, b_content, ok, built in [('a.o', 'b.o', True, False),
+                                                ('a.o', 'changed', True, True),
+                                                ('a.o', 'b.o', False, False)]:
+            del self._built[:]
+            a_o = self._task('a.o', SOURCE, ok, a_content)
+            b_o = self._task('b.o', SOURCE, True, b_content)
+            libx = self._task('libx.a', LIB)
+            libx.cutoff = True
+            libx.AddDep(a_o)
+            libx.AddDep(b_o)
+            cache_master = FakeCacheMaster()
+            master = TaskMaster.TaskMaster(2, cache_master, [a_o, b_o, libx], False,
+                                           self._logger, keep_going=True)
+            master.Start()
+            self.assertEqual(ok, master.BuildOK())
+            self.assertEqual(built, ('libx.a', 'archive') in self._built)
+            # the task skipped is updated as built
+            self.assertEqual(ok and not built, master._skipped == 1)
+            self.assertEqual(ok, 'libx.a' in cache_master.updated)
+            for name in ['a.o', 'b.o']:
+                with open(name, 'wb') as f:
+                    f.write(name)
+
+    def test_Pools(self):
+        """
+        test building libs and apps in their own pools
+        """
+        objs = map(lambda x: self._task('%s.o' % x, SOURCE), ['a', 'b', 'c'])
+        libs = map(lambda x: self._task('lib%s.a' % x, LIB), ['a', 'b'])
+        apps = map(lambda x: self._task(x, APP), ['app', 'test'])
+        libs[0].AddDep(objs[0])
+        libs[1].AddDep(objs[1])
+        for app in apps:
+            app.AddDep(objs[2])
+            for lib in libs:
+                app.AddDep(lib)
+        master = TaskMaster.TaskMaster(2, FakeCacheMaster(), objs + libs + apps, False,
+                                       self._logger, archive_jobs=1, link_jobs=2)
+        master.Start()
+        self.assertTrue(master.BuildOK())
+        self.assertEqual(7, len(self._built))
+        pools = dict(self._built)
+        self.assertEqual(['compile'] * 3, map(lambda x: pools[x.Pathname()], objs))
+        self.assertEqual(['archive'] * 2, map(lambda x: pools[x.Pathname()], libs))
+        self.assertEqual(['link'] * 2, map(lambda x: pools[x.Pathname()], apps))
+
+        # the pools without tasks don't block the others, and pool of 0 jobs has one thread
+        del self._built[:]
+        objs = map(lambda x: self._task('%s.o' % x, SOURCE), ['a', 'b'])
+        lib = self._task('liba.a', LIB)
+        lib.AddDep(objs[0])
+        master = TaskMaster.TaskMaster(2, FakeCacheMaster(), objs + [lib], False, self._logger,
+                                       archive_jobs=0, link_jobs=0)
+        self.assertEqual(4, len(master._workers))
+        master.Start()
+        self.assertTrue(master.BuildOK())
+        self.assertEqual(set([('a.o', 'compile'), ('b.o', 'compile'), ('liba.a', 'archive')]),
+                         set(self._built))
+
+    def test_Admission(self):
+        """
+        test holding back tasks by load average and memory estimated by last build
+        """
+        tasks = map(lambda x: self._task('%s.o' % x, SOURCE), ['a', 'b', 'c'])
+        a_o, b_o, c_o = tasks
+        history = FakeHistory(dict(), {'a.o' : 3072, 'b.o' : 1024})
+        master = TaskMaster.TaskMaster(2, FakeCacheMaster(), tasks, False, self._logger,
+                                       history=history, max_load=4, max_mem=4)
+        master._calc_memory(dict(map(lambda x: (x.Pathname(), x), tasks)))
+        # the files never built are estimated by the average of the same type
+        self.assertEqual({'a.o' : 3072, 'b.o' : 1024, 'c.o' : 2048}, master._memory)
+
+        load = [8.0]
+        available = [None]
+        get_load_average = Function.GetLoadAverage
+        get_available_memory = Function.GetAvailableMemory
+        Function.GetLoadAverage = lambda: load[0]
+        Function.GetAvailableMemory = lambda: available[0]
+        try:
+            # one task is always admitted when nothing is running
+            self.assertEqual((True, ''), master._can_admit(a_o))
+            self.assertTrue(master._admit(a_o))
+            self.assertEqual({'a.o' : 3072}, master._admitted)
+            self.assertEqual((False, 'load average 8.00'), master._can_admit(b_o))
+            load[0] = 1.0
+            self.assertEqual((True, ''), master._can_admit(b_o))
+            self.assertEqual((False, 'estimated memory 5MB of running tasks'),
+                             master._can_admit(c_o))
+            available[0] = 512
+            self.assertEqual((False, 'available memory 0MB'), master._can_admit(b_o))
+            # unknown load average and available memory are not limits
+            load[0] = None
+            available[0] = None
+            self.assertEqual((True, ''), master._can_admit(b_o))
+
+            # the task held back starts when running task is done
+            thread = threading.Thread(target=master._admit, args=(c_o,))
+            thread.start()
+            for i in xrange(0, 100):
+                if master._held:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(1, master._held)
+            with master._admission:
+                master._admitted.pop('a.o')
+                master._admission.notify_all()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual({'c.o' : 2048}, master._admitted)
+        finally:
+            Function.GetLoadAverage = get_load_average
+            Function.GetAvailableMemory = get_available_memory
+
+
+if __name__ == "__main__":
+    unittest.main()
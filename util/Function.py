@@ -12,10 +12,15 @@ Authors: zhousongsong(doublesongsong@gmail.com)
 Date:    2015/09/09 17:23:06
 """
 import os
+import mmap
+import errno
 import shutil
 import hashlib
 import subprocess
 
+# the default number of threads checking caches, it is the default of --check-jobs too
+CHECK_JOBS = 8
+
 # for target's naming 
 DIGITS = [str(x) for x in xrange(0, 10)] 
 ALPHABETS = []
@@ -52,6 +57,7 @@ def DelFiles(path):
         if os.path.islink(path):
             os.remove(path)
         elif os.path.isdir(path):
+            _forget_dirs(path)
             shutil.rmtree(path)
         else:
             os.remove(path)
@@ -77,21 +83,81 @@ def MoveFiles(src, dst):
     return (True, '')
 
 
+# the absolute paths of directories created or found in this run, see Mkdir()
+MADE_DIRS = set()
+
+def _forget_dirs(path):
+    """
+    remove directory and its sub directories from MADE_DIRS before deleting it
+    """
+    path = os.path.abspath(path)
+    for dir_name in filter(lambda x: x == path or x.startswith(path + os.sep), list(MADE_DIRS)):
+        MADE_DIRS.discard(dir_name)
+
+
 def Mkdir(target_dir):
     """
-    try to create a directory
+    try to create a directory, the directory and its parent directories are
+    remembered, so that creating them again in this run does not touch file system
     """
-    if os.path.exists(target_dir):
+    path = os.path.abspath(target_dir)
+    if path in MADE_DIRS:
         return True
+    if not os.path.exists(target_dir):
+        try:
+            os.makedirs(target_dir)
+        except BaseException:
+            pass
+        # check again after mkdir
+        if not os.path.exists(target_dir):
+            return False
+    while path not in MADE_DIRS:
+        MADE_DIRS.add(path)
+        path = os.path.dirname(path)
+    return True
+
+
+def MakeDirs(dirs):
+    """
+    create many directories in one pass, the duplicated directories and the ones created
+    before are skipped
+    Args:
+        dirs : the iterable of directories, empty strings are ignored
+    Returns:
+        return the sorted list of directories failed to create
+    """
+    return sorted(filter(lambda x: not Mkdir(x), set(filter(None, dirs))))
+
+
+# hash methods of file content, BLAKE2B is available when hashlib or pyblake2 supports it
+HASH_METHODS = {'MD5' : hashlib.md5,
+                'SHA1' : hashlib.sha1}
+if hasattr(hashlib, 'blake2b'):
+    HASH_METHODS['BLAKE2B'] = lambda: hashlib.blake2b(digest_size=16)
+else:
     try:
-        os.makedirs(target_dir)
-    except BaseException:
+        import pyblake2
+        HASH_METHODS['BLAKE2B'] = lambda: pyblake2.blake2b(digest_size=16)
+    except ImportError:
         pass
-    # check again after mkdir
-    if os.path.exists(target_dir):
-        return True
-    else:
+
+HASH_METHOD = 'MD5'             # the hash method of file content
+HASH_CHUNK_SIZE = 1024 * 1024   # read file chunk by chunk
+HASH_MMAP_SIZE = 64 * 1024 * 1024   # files larger than it are mapped into memory
+
+def SetHashMethod(method):
+    """
+    set the hash method of file content
+    Args:
+        method : the name of hash method, see HASH_METHODS
+    Returns:
+        return True if method is supported, otherwise return False
+    """
+    global HASH_METHOD
+    if method.upper() not in HASH_METHODS:
         return False
+    HASH_METHOD = method.upper()
+    return True
 
 
 def CalcHash(data, method='MD5'):
@@ -99,37 +165,100 @@ def CalcHash(data, method='MD5'):
     calculate hash value of data
     Args: 
         data : the data to calculate
+        method : the name of hash method, see HASH_METHODS
     Returns:
-        return md5 of data, if fail to calculate return None 
+        return hash value of data, if fail to calculate return None 
     """
     try:
-        md5 = hashlib.md5()
-        md5.update(data)
-        return md5.hexdigest()
+        h = HASH_METHODS[method]()
+        h.update(data)
+        return h.hexdigest()
     except BaseException:
         return None
 
 
-def GetFileHash(path, method='MD5'):
+def GetFileHash(path, method=None):
     """
-    calculate the hash of file
+    calculate the hash of file, file is read chunk by chunk or mapped into memory
+    so that large file is not read into memory at once
     Args: 
         path : the path of file to calculate
+        method : the name of hash method, the default is HASH_METHOD
     Return:
-        return md5 of file, if fail to calculate return None
+        return hash value of file, if fail to calculate return None
     """
     try:
         if not os.path.exists(path):
             return None
 
-        h = open(path, "rb")
-        data = h.read()
-        h.close()
-        return CalcHash(data, method)
+        h = HASH_METHODS[method or HASH_METHOD]()
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size >= HASH_MMAP_SIZE:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    h.update(m)
+                finally:
+                    m.close()
+            else:
+                while True:
+                    data = f.read(HASH_CHUNK_SIZE)
+                    if not data:
+                        break
+                    h.update(data)
+        return h.hexdigest()
     except BaseException:
         return None
 
 
+def GetFileFingerprint(path):
+    """
+    return the stat fingerprint of file, if fingerprint is not changed, the content of file is regarded as not changed
+    Args:
+        path : the path of file
+    Returns:
+        return (size, mtime, inode, ctime), mtime and ctime are in nanoseconds if os.stat supports
+    Raises:
+        OSError if failed to stat file
+    """
+    st = os.stat(path)
+    return (st.st_size, 
+            getattr(st, 'st_mtime_ns', st.st_mtime), 
+            st.st_ino, 
+            getattr(st, 'st_ctime_ns', st.st_ctime))
+
+
+def GetLoadAverage():
+    """
+    return the system load average over the last minute, None if it is not supported
+    """
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+def GetAvailableMemory():
+    """
+    return the memory available for starting new processes in KB, read from /proc/meminfo
+    Returns:
+        return MemAvailable, or MemFree + Cached on old kernels, None if it is unknown
+    """
+    try:
+        info = dict()
+        with open('/proc/meminfo') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2:
+                    info[fields[0].rstrip(':')] = int(fields[1])
+    except (IOError, ValueError):
+        return None
+    if 'MemAvailable' in info:
+        return info['MemAvailable']
+    if 'MemFree' in info:
+        return info['MemFree'] + info.get('Cached', 0)
+    return None
+
+
 def RunCommand(cmd, ignore_stderr_when_ok=False):
     """
     run shell command in subprocess
@@ -166,6 +295,46 @@ def RunCommand(cmd, ignore_stderr_when_ok=False):
     return (retcode, msg)
 
 
+def RunCommandWithUsage(cmd):
+    """
+    run command in subprocess like RunCommand(), and collect its resource usage by wait4
+    Args:
+        cmd : shell command, or the argument list of command executed without shell
+    Return :
+        (shell_cmd_retcode, shell_cmd_msg, usage), the stdout and stderr mix together in
+        shell_cmd_msg. usage is { cpu : user and system cpu seconds, max_rss : peak RSS in KB }
+        of the command and its children, it is None if failed to run command
+    """
+    try:
+        t = subprocess.Popen(cmd,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT,
+                             shell=not isinstance(cmd, list)
+                            )
+        msg = t.stdout.read()
+        t.stdout.close()
+        while True:
+            try:
+                _, status, rusage = os.wait4(t.pid, 0)
+                break
+            except OSError as err:
+                if err.errno != errno.EINTR:
+                    raise
+        if os.WIFSIGNALED(status):
+            retcode = -os.WTERMSIG(status)
+        else:
+            retcode = os.WEXITSTATUS(status)
+        # the process has been reaped, Popen object must not wait it again
+        t.returncode = retcode
+        usage = {'cpu' : rusage.ru_utime + rusage.ru_stime, 'max_rss' : rusage.ru_maxrss}
+    except BaseException as e:
+        retcode = -1
+        msg = 'run_shell_cmd_in_subprocess Exception for %s: %s' % (str(cmd), e)
+        usage = None
+
+    return (retcode, msg, usage)
+
+
 def RunCommand_tty(cmd):
     """
     run shell command in tty 